@@ -0,0 +1,403 @@
+"""
+数据处理流程的基准测试: 生成与 data/raw/sample_raw_data.csv 同结构的合成数据集,
+在独立进程中逐阶段测量耗时、CPU 时间、峰值内存和吞吐量, 输出 JSON 并与基线比较
+
+用法:
+    python benchmarks/bench_pipeline.py --sizes small,100000x20 --output results.json
+    python benchmarks/bench_pipeline.py --sizes small --save-baseline
+    python benchmarks/bench_pipeline.py --sizes small --baseline benchmarks/baseline.json --fail-on-regression
+
+数据集规模写作 行数x列数, 或预设名: small(1万x5)、medium(100万x50)、
+large(1000万x100)、huge(5000万x500)。生成的数据缓存在 --data-dir 中复用
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import functools
+import subprocess
+import threading
+import multiprocessing
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+import numpy as np
+import pandas as pd
+
+PRESETS = {
+    'small': (10000, 5),
+    'medium': (1000000, 50),
+    'large': (10000000, 100),
+    'huge': (50000000, 500),
+}
+
+N_YEAR_FILES = 5
+FIRST_YEAR = 2015
+
+def parse_size(text):
+    if text in PRESETS:
+        return PRESETS[text]
+    rows, columns = text.lower().split('x')
+    return int(float(rows)), int(columns)
+
+def dataset_name(rows, columns):
+    return f"{rows}x{columns}"
+
+# ---------------------------------------------------------------- 数据生成
+
+def generate_dataset(directory, rows, columns, seed=0):
+    """
+    生成 N_YEAR_FILES 个按年份划分的原始 CSV(id, feature1..N, target, date),
+    以及按列拆开、以 id 为键的 left.csv / right.csv。已存在时直接复用
+    """
+    marker = os.path.join(directory, 'COMPLETE')
+    if os.path.exists(marker):
+        return
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+
+    rng = np.random.default_rng(seed)
+    features = [f'feature{i + 1}' for i in range(columns)]
+    left_columns = ['id'] + features[:(columns + 1) // 2]
+    right_columns = ['id'] + features[(columns + 1) // 2:] + ['target']
+    # 每块约 2000 万个数值, 生成大数据集时内存占用有上限
+    chunk_rows = max(1000, 20000000 // (columns + 2))
+    rows_per_file = -(-rows // N_YEAR_FILES)
+    weights = rng.normal(size=columns)
+
+    written = {'left.csv': False, 'right.csv': False}
+    for i in range(N_YEAR_FILES):
+        start_id, end_id = i * rows_per_file, min(rows, (i + 1) * rows_per_file)
+        year_path = os.path.join(directory, f'raw_{FIRST_YEAR + i}.csv')
+        for start in range(start_id, end_id, chunk_rows):
+            n = min(chunk_rows, end_id - start)
+            values = rng.normal(loc=3.0, scale=1.0, size=(n, columns)).round(4)
+            values[rng.random(size=values.shape) < 0.01] = np.nan
+            df = pd.DataFrame(values, columns=features)
+            df.insert(0, 'id', np.arange(start, start + n))
+            score = np.nan_to_num(values - 3.0) @ weights + rng.normal(size=n)
+            df['target'] = (score > 0).astype(np.int64)
+            days = rng.integers(0, 365, size=n)
+            df['date'] = (pd.Timestamp(f'{FIRST_YEAR + i}-01-01') + pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d')
+            df.to_csv(year_path, mode='a', header=start == start_id, index=False)
+            for name, cols in (('left.csv', left_columns), ('right.csv', right_columns)):
+                df[cols].to_csv(os.path.join(directory, name), mode='a', header=not written[name], index=False)
+                written[name] = True
+    open(marker, 'w').close()
+
+# ---------------------------------------------------------------- 测量
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return float('nan')
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB, macOS 上为字节
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+STAGES = OrderedDict()
+
+def stage(name):
+    """
+    注册一个阶段: 函数完成不计时的准备工作, 返回计时的 work(); work 返回处理的行数
+    """
+    def register(func):
+        STAGES[name] = func
+        return func
+    return register
+
+def _raw_files(ctx):
+    return [os.path.join(ctx['data_dir'], f'raw_{FIRST_YEAR + i}.csv') for i in range(N_YEAR_FILES)]
+
+def _features(ctx):
+    return [f'feature{i + 1}' for i in range(ctx['columns'])]
+
+def _ensure(path, build):
+    if not os.path.exists(path):
+        build()
+    return path
+
+def _merged_by_year(ctx):
+    from data.data_preprocessing import merge_files_by_year
+    path = os.path.join(ctx['work_dir'], 'merged_by_year.parquet')
+    return _ensure(path, lambda: merge_files_by_year(_raw_files(ctx), path))
+
+def _merged_by_variable(ctx):
+    from data.data_preprocessing import merge_files_by_variable
+    path = os.path.join(ctx['work_dir'], 'merged_by_variable.parquet')
+    inputs = [os.path.join(ctx['data_dir'], name) for name in ('left.csv', 'right.csv')]
+    return _ensure(path, lambda: merge_files_by_variable(inputs, path, key='id'))
+
+def _processed(ctx):
+    from data.data_preprocessing import preprocess_data
+    path = os.path.join(ctx['work_dir'], 'processed.parquet')
+    return _ensure(path, lambda: preprocess_data(_merged_by_year(ctx), path, _features(ctx), chunksize=100000))
+
+def _training_frame(ctx):
+    from data.storage import read_dataset
+    df = read_dataset(_processed(ctx))
+    return df.head(ctx['train_rows']) if ctx['train_rows'] else df
+
+def _trained_model(ctx):
+    from models.model import BigDataModel
+    path = os.path.join(ctx['work_dir'], 'model.joblib')
+    if not os.path.exists(path):
+        df = _training_frame(ctx)
+        model = BigDataModel()
+        model.train(df.drop(columns='target'), df['target'], plot=False)
+        model.save(path)
+    return BigDataModel.from_file(path)
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def _serve(directory):
+    """在后台线程中用 HTTP 提供目录下的文件, 返回根 URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+@stage('fetch_data')
+def _fetch_data(ctx):
+    from data.data_acquisition import fetch_data
+    url = _serve(ctx['data_dir']) + f'/raw_{FIRST_YEAR}.csv'
+    # 每次使用新的缓存目录, 测量完整下载而不是 304 复用
+    cache_dir = os.path.join(ctx['work_dir'], 'downloads')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def work():
+        return len(fetch_data(url, cache_dir))
+    return work
+
+@stage('save_data')
+def _save_data(ctx):
+    from data.data_acquisition import save_data
+    from data.storage import read_dataset, dataset_path
+    df = read_dataset(_raw_files(ctx)[0])
+
+    def work():
+        save_data(df, dataset_path(ctx['work_dir'], 'saved'))
+        return len(df)
+    return work
+
+@stage('merge_files_by_year')
+def _merge_by_year(ctx):
+    from data.data_preprocessing import merge_files_by_year
+
+    def work():
+        merge_files_by_year(_raw_files(ctx), os.path.join(ctx['work_dir'], 'merged_by_year.parquet'))
+        return ctx['rows']
+    return work
+
+@stage('merge_files_by_variable')
+def _merge_by_variable(ctx):
+    from data.data_preprocessing import merge_files_by_variable
+    inputs = [os.path.join(ctx['data_dir'], name) for name in ('left.csv', 'right.csv')]
+
+    def work():
+        merge_files_by_variable(inputs, os.path.join(ctx['work_dir'], 'merged_by_variable.parquet'), key='id')
+        return ctx['rows']
+    return work
+
+@stage('preprocess_data')
+def _preprocess(ctx):
+    from data.data_preprocessing import preprocess_data
+    input_path = _merged_by_year(ctx)
+
+    def work():
+        preprocess_data(input_path, os.path.join(ctx['work_dir'], 'processed.parquet'), _features(ctx),
+                        chunksize=100000)
+        return ctx['rows']
+    return work
+
+@stage('train')
+def _train(ctx):
+    from models.model import BigDataModel
+    df = _training_frame(ctx)
+    X, y = df.drop(columns='target'), df['target']
+
+    def work():
+        BigDataModel().train(X, y, plot=False)
+        return len(df)
+    return work
+
+@stage('visualize_merge_by_year')
+def _visualize_by_year(ctx):
+    from pipeline import _build_merge_by_year
+    path = _merged_by_year(ctx)
+
+    def work():
+        _build_merge_by_year(path)
+        return ctx['rows']
+    return work
+
+@stage('visualize_merge_by_variable')
+def _visualize_by_variable(ctx):
+    from pipeline import _build_merge_by_variable
+    path = _merged_by_variable(ctx)
+
+    def work():
+        _build_merge_by_variable(path)
+        return ctx['rows']
+    return work
+
+@stage('generate_visualizations')
+def _generate_visualizations(ctx):
+    from pipeline import generate_visualizations
+    model = _trained_model(ctx)
+    df = _training_frame(ctx)
+
+    def work():
+        generate_visualizations(df, _features(ctx), model)
+        return len(df)
+    return work
+
+def _run_stage(name, ctx, queue):
+    """在独立进程中执行一个阶段, 峰值内存不受其他阶段影响"""
+    result = {'dataset': dataset_name(ctx['rows'], ctx['columns']), 'stage': name}
+    try:
+        os.chdir(ctx['work_dir'])
+        work = STAGES[name](ctx)
+        setup_rss = _current_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        rows = work()
+        seconds = time.perf_counter() - wall
+        result.update(seconds=seconds, cpu_seconds=time.process_time() - cpu,
+                      setup_rss_mb=setup_rss, peak_rss_mb=_peak_rss_mb(),
+                      rows=int(rows), rows_per_sec=rows / seconds if seconds > 0 else None)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    queue.put(result)
+
+def run_stage(name, ctx, timeout=None):
+    mp = multiprocessing.get_context('spawn')
+    queue = mp.Queue()
+    process = mp.Process(target=_run_stage, args=(name, ctx, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        return {'dataset': dataset_name(ctx['rows'], ctx['columns']), 'stage': name, 'error': 'timeout'}
+    if queue.empty():
+        return {'dataset': dataset_name(ctx['rows'], ctx['columns']), 'stage': name,
+                'error': f'exit code {process.exitcode}'}
+    return queue.get()
+
+# ---------------------------------------------------------------- 结果和基线
+
+def environment():
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                'sklearn': sklearn.__version__}
+    try:
+        import pyarrow
+        versions['pyarrow'] = pyarrow.__version__
+    except ImportError:
+        pass
+    return {'commit': commit, 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'versions': versions}
+
+def compare(results, baseline, threshold=0.2, min_seconds=0.1):
+    """
+    与基线逐项比较, 返回 [(结果, 耗时比, 内存比, 是否退化)]
+
+    耗时在 min_seconds 以下的阶段噪声较大, 只比较内存
+    """
+    base = {(r['dataset'], r['stage']): r for r in baseline['results'] if 'error' not in r}
+    rows = []
+    for r in results:
+        b = base.get((r['dataset'], r['stage']))
+        if b is None or 'error' in r:
+            rows.append((r, None, None, 'error' in r))
+            continue
+        time_ratio = r['seconds'] / b['seconds'] if b['seconds'] else None
+        memory_ratio = r['peak_rss_mb'] / b['peak_rss_mb'] if b['peak_rss_mb'] else None
+        slower = (time_ratio is not None and time_ratio > 1 + threshold
+                  and max(r['seconds'], b['seconds']) >= min_seconds)
+        larger = memory_ratio is not None and memory_ratio > 1 + threshold
+        rows.append((r, time_ratio, memory_ratio, slower or larger))
+    return rows
+
+def print_results(results, comparison=None):
+    ratios = {(r['dataset'], r['stage']): (t, m, bad) for r, t, m, bad in (comparison or [])}
+    print(f"{'dataset':<16}{'stage':<30}{'seconds':>10}{'peak MB':>10}{'rows/s':>14}{'vs baseline':>22}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['dataset']:<16}{r['stage']:<30}  ERROR {r['error']}")
+            continue
+        t, m, bad = ratios.get((r['dataset'], r['stage']), (None, None, False))
+        versus = f"{t:.2f}x time {m:.2f}x mem" if t is not None and m is not None else ''
+        print(f"{r['dataset']:<16}{r['stage']:<30}{r['seconds']:>10.3f}{r['peak_rss_mb']:>10.1f}"
+              f"{r['rows_per_sec'] or 0:>14,.0f}{versus:>22}{'  REGRESSION' if bad else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='small', help="逗号分隔的规模, 例如 small,100000x20")
+    parser.add_argument('--stages', default='all', help=f"逗号分隔的阶段, 可选: {', '.join(STAGES)}")
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, '.data'))
+    parser.add_argument('--output', help="结果 JSON 的输出路径")
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--threshold', type=float, default=0.2, help="耗时或内存增加超过该比例视为退化")
+    parser.add_argument('--train-rows', type=int, default=1000000, help="训练阶段最多使用的行数, 0 表示全部")
+    parser.add_argument('--timeout', type=float, default=None, help="单个阶段的超时秒数")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    stages = list(STAGES) if args.stages == 'all' else args.stages.split(',')
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    results = []
+    for rows, columns in (parse_size(s) for s in args.sizes.split(',')):
+        name = dataset_name(rows, columns)
+        data_dir = os.path.join(args.data_dir, name)
+        print(f"preparing {name} ...", flush=True)
+        generate_dataset(data_dir, rows, columns)
+        work_dir = os.path.join(args.data_dir, 'work', name)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+        ctx = {'rows': rows, 'columns': columns, 'data_dir': os.path.abspath(data_dir),
+               'work_dir': os.path.abspath(work_dir), 'train_rows': args.train_rows}
+        for stage_name in stages:
+            results.append(run_stage(stage_name, ctx, args.timeout))
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {'environment': environment(), 'threshold': args.threshold, 'results': results}
+    comparison = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            comparison = compare(results, json.load(f), args.threshold)
+    print_results(results, comparison)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    if args.fail_on_regression and comparison and any(bad for *_, bad in comparison):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+并行多文件读取的基准测试: 生成若干 CSV 文件, 比较逐个 pd.read_csv 与不同进程数下
+read_files 的耗时
+
+用法: python benchmarks/bench_reader.py --files 50 --rows 200000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from data.reader import csv_engine, read_files
+
+def make_files(directory, n_files, n_rows, n_columns):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n_files):
+        df = pd.DataFrame(rng.normal(size=(n_rows, n_columns)),
+                          columns=[f'feature{j}' for j in range(n_columns)])
+        df['date'] = pd.Timestamp(f'{2000 + i % 50}-01-01').strftime('%Y-%m-%d')
+        df['target'] = rng.integers(0, 2, size=n_rows)
+        path = os.path.join(directory, f'data_{i}.csv')
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--memory-limit', type=int, default=2 * 1024 ** 3)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({w for w in (1, 2, 4, 8, 16, 32) if w <= cpus} | {cpus})
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = make_files(tmpdir, args.files, args.rows, args.columns)
+        total_mb = sum(os.path.getsize(p) for p in paths) / 1024 ** 2
+        print(f"{args.files} files, {total_mb:.1f} MB, engine={csv_engine()}, cpus={cpus}")
+
+        baseline = timed(lambda: [pd.read_csv(p) for p in paths], args.repeat)
+        print(f"{'sequential pd.read_csv':>24}: {baseline:7.2f}s  {total_mb / baseline:7.1f} MB/s")
+        for workers in worker_counts:
+            elapsed = timed(lambda: read_files(paths, max_workers=workers, memory_limit=args.memory_limit),
+                            args.repeat)
+            print(f"{f'read_files workers={workers}':>24}: {elapsed:7.2f}s  {total_mb / elapsed:7.1f} MB/s"
+                  f"  speedup {baseline / elapsed:5.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+启动基准测试: 在全新的解释器中测量导入各入口模块的耗时、常驻内存和加载了哪些重量级依赖,
+并启动 gunicorn 测量 worker 就绪时间和每个 worker 的内存(RSS/PSS/私有内存)
+
+PSS 把共享页面按共享进程数分摊, 预加载时 worker 的 PSS 应明显小于 RSS。
+结果写成 JSON, 保存基线后再次运行会与基线比较
+
+用法: python benchmarks/bench_startup.py --repeat 5 --workers 2,4 --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+# 服务启动时不应加载的重量级依赖
+HEAVY_MODULES = ['pandas', 'pyarrow', 'sklearn', 'scipy', 'plotly', 'matplotlib', 'seaborn']
+
+TARGETS = ['app', 'main', 'pipeline']
+
+_IMPORT_SNIPPET = r'''
+import sys, time, json, importlib
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+module = importlib.import_module({target!r})
+seconds = time.perf_counter() - start
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+result = {{'seconds': seconds, 'rss_mb': rss_mb(),
+          'heavy_modules': [m for m in {heavy!r} if m in sys.modules]}}
+if {target!r} == 'app':
+    start = time.perf_counter()
+    status = module.app.test_client().get('/').status_code
+    result.update(first_request_seconds=time.perf_counter() - start, first_request_status=status,
+                  rss_after_request_mb=rss_mb())
+print(json.dumps(result))
+'''
+
+def measure_import(target, work_dir):
+    """在新的解释器中导入 target 一次, 返回耗时和内存"""
+    snippet = _IMPORT_SNIPPET.format(src=SRC_DIR, target=target, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', snippet], cwd=work_dir, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        return {'target': target, 'error': proc.stderr.strip().splitlines()[-1]}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result.update(target=target, process_seconds=wall)
+    return result
+
+def bench_imports(targets, repeat, work_dir):
+    """每个入口重复 repeat 次, 取导入耗时最短的一次"""
+    results = []
+    for target in targets:
+        runs = [measure_import(target, work_dir) for _ in range(repeat)]
+        ok = [r for r in runs if 'error' not in r]
+        results.append(min(ok, key=lambda r: r['seconds']) if ok else runs[0])
+    return results
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def _memory_mb(pid):
+    """从 smaps_rollup 读取 RSS、PSS 和私有内存(MB)"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss_mb': fields.get('Rss', 0.0), 'pss_mb': fields.get('Pss', 0.0),
+            'private_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)}
+
+def measure_gunicorn(workers, preload, work_dir, timeout=60):
+    """
+    启动 gunicorn, 等待 / 返回 200 后测量主进程和各 worker 的内存, 然后关闭
+    """
+    port = _free_port()
+    env = dict(os.environ, BIGDATA_PRELOAD_APP='1' if preload else '0', GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT_DIR, 'gunicorn.conf.py')],
+                            cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    result = {'workers': workers, 'preload': preload}
+    try:
+        deadline = start + timeout
+        while True:
+            if proc.poll() is not None:
+                result['error'] = proc.stderr.read().decode(errors='replace').strip().splitlines()[-1]
+                return result
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                pass
+            if time.perf_counter() > deadline:
+                result['error'] = f'not ready after {timeout}s'
+                return result
+            time.sleep(0.05)
+        result['ready_seconds'] = time.perf_counter() - start
+
+        # 等所有 worker 启动完成后再测量
+        while len(_children(proc.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        master = _memory_mb(proc.pid)
+        worker_memory = [_memory_mb(pid) for pid in _children(proc.pid)]
+        result.update(master=master, worker_memory=worker_memory,
+                      worker_rss_mb=sum(w['rss_mb'] for w in worker_memory) / len(worker_memory),
+                      worker_pss_mb=sum(w['pss_mb'] for w in worker_memory) / len(worker_memory),
+                      total_pss_mb=master['pss_mb'] + sum(w['pss_mb'] for w in worker_memory))
+        return result
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stderr.close()
+
+def _key(result):
+    if 'target' in result:
+        return f"import {result['target']}"
+    return f"gunicorn workers={result['workers']} preload={result['preload']}"
+
+def _metrics(result):
+    """参与基线比较的 (耗时, 内存)"""
+    if 'target' in result:
+        return result['seconds'], result['rss_mb']
+    return result['ready_seconds'], result['total_pss_mb']
+
+def compare(results, baseline, threshold=0.2, min_seconds=0.05):
+    """与基线比较, 返回 {键: (耗时比, 内存比, 是否退化)}"""
+    base = {_key(r): r for r in baseline['results'] if 'error' not in r}
+    comparison = {}
+    for r in results:
+        b = base.get(_key(r))
+        if b is None or 'error' in r:
+            continue
+        (seconds, memory), (base_seconds, base_memory) = _metrics(r), _metrics(b)
+        time_ratio = seconds / base_seconds if base_seconds else None
+        memory_ratio = memory / base_memory if base_memory else None
+        slower = time_ratio is not None and time_ratio > 1 + threshold and max(seconds, base_seconds) >= min_seconds
+        larger = memory_ratio is not None and memory_ratio > 1 + threshold
+        comparison[_key(r)] = (time_ratio, memory_ratio, slower or larger)
+    return comparison
+
+def print_results(results, comparison=None):
+    comparison = comparison or {}
+    print(f"{'':<34}{'seconds':>10}{'memory MB':>12}  details")
+    for r in results:
+        if 'error' in r:
+            print(f"{_key(r):<34}  ERROR {r['error']}")
+            continue
+        seconds, memory = _metrics(r)
+        if 'target' in r:
+            details = f"rss; heavy: {', '.join(r['heavy_modules']) or '-'}"
+            if 'first_request_seconds' in r:
+                details += f"; GET / {r['first_request_status']} in {r['first_request_seconds']:.3f}s"
+        else:
+            details = (f"total pss; per worker rss {r['worker_rss_mb']:.1f} MB, pss {r['worker_pss_mb']:.1f} MB, "
+                       f"master rss {r['master']['rss_mb']:.1f} MB")
+        t, m, bad = comparison.get(_key(r), (None, None, False))
+        if t is not None and m is not None:
+            details += f"; vs baseline {t:.2f}x time {m:.2f}x mem"
+        print(f"{_key(r):<34}{seconds:>10.3f}{memory:>12.1f}  {details}{'  REGRESSION' if bad else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', default=','.join(TARGETS), help="逗号分隔的入口模块")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', default='2', help="逗号分隔的 gunicorn worker 数, 为空时不测 gunicorn")
+    parser.add_argument('--output', help="结果 JSON 的输出路径")
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'startup_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--threshold', type=float, default=0.2, help="耗时或内存增加超过该比例视为退化")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    from bench_pipeline import environment
+
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        results = bench_imports([t for t in args.targets.split(',') if t], args.repeat, work_dir)
+        worker_counts = [int(w) for w in args.workers.split(',') if w]
+        if worker_counts and shutil.which('gunicorn') is None:
+            print("gunicorn is not installed, skipping worker measurements")
+            worker_counts = []
+        for workers in worker_counts:
+            for preload in (True, False):
+                results.append(measure_gunicorn(workers, preload, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {'environment': environment(), 'threshold': args.threshold, 'results': results}
+    comparison = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            comparison = compare(results, json.load(f), args.threshold)
+    print_results(results, comparison)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    if args.fail_on_regression and comparison and any(bad for *_, bad in comparison.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+gunicorn 配置: 主进程导入应用和重量级依赖后再 fork worker, worker 以写时复制方式共享这些模块
+
+用法: gunicorn -c gunicorn.conf.py
+"""
+import gc
+import os
+import importlib
+
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+wsgi_app = "app:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+# 多线程 worker: 每个 worker 同时处理多个请求, /predict 的并发请求才能合并成批量预测
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# 在主进程中加载应用; BIGDATA_PRELOAD_APP=0 时每个 worker 各自导入(用于启动基准测试对比)
+preload_app = os.environ.get("BIGDATA_PRELOAD_APP", "1") != "0"
+
+# 预先导入的模块: 预测、上传和后台任务用到的依赖, 不包括只在命令行绘图时使用的 matplotlib/seaborn。
+# 后台任务进程由 worker fork 出来, 同样继承这些模块
+PRELOAD_MODULES = [name for name in os.environ.get(
+    "BIGDATA_PRELOAD_MODULES",
+    "numpy,pandas,pyarrow.parquet,sklearn.ensemble,joblib,plotly.express,"
+    "data.ingest,data.transform,models.model,pipeline").split(",") if name]
+
+def on_starting(server):
+    # 在主进程中配置根日志, fork 出的 worker 和后台任务进程沿用同一配置输出阶段日志
+    from utils.helpers import setup_logging
+    setup_logging()
+    if not preload_app:
+        return
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    server.log.info(f"Preloaded {len(PRELOAD_MODULES)} modules")
+
+def pre_fork(server, worker):
+    # 把已有对象移出垃圾回收的跟踪范围, 避免 worker 中的回收扫描写入共享页面触发复制
+    if preload_app:
+        gc.freeze()
+
+def worker_exit(server, worker):
+    # 退出的 worker 的指标快照不再计入 /metrics
+    from utils import metrics
+    metrics.discard_snapshot(worker.pid)
@@ -27,6 +27,7 @@ setup(
     python_requires=">=3.7",
     install_requires=[
         "pandas>=1.3.3",
+        "pyarrow>=5.0.0",
         "scikit-learn>=0.24.2",
         "joblib>=1.0.1",
     ],
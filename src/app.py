@@ -1,17 +1,94 @@
 import os
-from flask import Flask, request, jsonify, render_template, send_from_directory
-from werkzeug.utils import secure_filename
-from data.data_preprocessing import preprocess_data, merge_files_by_year, merge_files_by_variable
-from models.model import BigDataModel
-from utils.helpers import setup_logging, get_timestamp, create_directory_if_not_exists
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
+import re
 import json
+import time
+import uuid
+import logging
+from flask import Flask, Response, g, request, jsonify, render_template, send_from_directory
+from werkzeug.utils import secure_filename
+from data.catalog import Catalog
+from data.storage import dataset_size, read_schema
+from models.registry import ModelRegistry, MicroBatcher, PredictionTimeout
+from utils import metrics
+from utils.helpers import setup_logging
+from utils.jobs import JobQueue, JobQueueFull
+from utils.payload import compress
 
-app = Flask(__name__)
+# 模板目录在仓库根目录, 与 src/ 同级
+app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                   'templates'))
+app.config['DATA_ROOT'] = 'data'  # 客户端传入的数据集路径必须位于此目录下
 app.config['UPLOAD_FOLDER'] = 'data/raw'
 app.config['ALLOWED_EXTENSIONS'] = {'csv', 'txt'}
+app.config['STAGING_FOLDER'] = 'data/uploads'
+# 上传文件的大小上限; 分块上传按客户端声明的大小检查, 其他请求由 Flask 按请求体大小检查
+app.config['MAX_UPLOAD_SIZE'] = 10 * 1024 ** 3
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_UPLOAD_SIZE']
+app.config['PREPROCESS_CHUNKSIZE'] = 100000
+app.config['JOB_FOLDER'] = 'data/jobs'
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_MAX_PENDING'] = 16  # 每个 gunicorn worker 的上限, 不是全局上限
+app.config['MERGE_WORKERS'] = None  # 默认使用全部 CPU 核
+app.config['MERGE_MEMORY_LIMIT'] = 512 * 1024 ** 2
+app.config['PREVIEW_SAMPLE_SIZE'] = 100000  # 预览模式训练用的分层样本行数
+app.config['SCREEN_MAX_FEATURES'] = 100  # 特征筛选默认保留的特征数
+app.config['TUNE_WORKERS'] = None  # 超参数搜索并行试验的进程数, 默认使用全部 CPU 核
+
+app.config['MODEL_FOLDER'] = 'data/models'
+app.config['MAX_LOADED_MODELS'] = 4
+app.config['PREDICT_TIMEOUT'] = 30  # 批量预测的最长等待秒数, 超时返回 503
+app.config['CATALOG_PATH'] = 'data/catalog.db'
+app.config['METRICS_ENABLED'] = os.environ.get('BIGDATA_METRICS', '1') != '0'
+app.config['METRICS_FOLDER'] = 'data/metrics'
+
+# 各 gunicorn worker 和任务进程把指标快照写到同一目录, /metrics 汇总输出
+metrics.configure(enabled=app.config['METRICS_ENABLED'], directory=app.config['METRICS_FOLDER'])
+
+# 按配置创建的目录也传给后台任务, 任务登记的数据集和模型与 /catalog 查询的是同一个数据库
+catalog = Catalog(app.config['CATALOG_PATH'])
+
+# 预测请求复用常驻内存的模型, 并发请求合并成批量预测
+model_registry = ModelRegistry(app.config['MODEL_FOLDER'], max_models=app.config['MAX_LOADED_MODELS'],
+                               catalog=catalog)
+predictor = MicroBatcher(model_registry, timeout=app.config['PREDICT_TIMEOUT'])
+
+# 长时间运行的合并和训练放到后台进程池, 请求线程只负责提交和查询
+job_queue = JobQueue(app.config['JOB_FOLDER'], max_workers=app.config['JOB_WORKERS'],
+                     max_pending=app.config['JOB_MAX_PENDING'])
+
+@app.before_request
+def start_request_trace():
+    # 沿用调用方传入的 X-Request-ID, 便于跨服务关联日志; 提交的后台任务也会带上该 id
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.trace_token = metrics.set_context(request_id=g.request_id)
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def finish_request_trace(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    if metrics.enabled() and 'request_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        registry = metrics.registry()
+        registry.inc(f"{metrics.PREFIX}_http_requests_total", method=request.method, endpoint=endpoint,
+                     status=response.status_code)
+        registry.observe(f"{metrics.PREFIX}_http_request_seconds", time.perf_counter() - g.request_start,
+                         endpoint=endpoint)
+        metrics.flush(force=False)
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        metrics.reset_context(token)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# pandas、scikit-learn 和 plotly 只在用到它们的请求中导入, 后台任务按 "模块:函数" 提交,
+# 由任务进程导入 pipeline; 这样 worker 启动和只访问页面、目录的请求都不加载这些依赖。
+# 用 gunicorn.conf.py 启动时主进程预先导入它们, 各 worker 以写时复制方式共享
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -22,23 +99,134 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
+    from data.ingest import IngestError, ingest_stream
     uploaded_files = request.files.getlist("file")
     if not uploaded_files:
         return jsonify({"status": "error", "message": "No files uploaded"}), 400
     
     file_paths = []
+    schemas = {}
+    catalog_jobs = {}
     for file in uploaded_files:
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            create_directory_if_not_exists(app.config['UPLOAD_FOLDER'])
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            try:
+                # 上传的 CSV 直接从请求流分块转换为列式数据集, 同时写出 schema 和统计信息
+                with metrics.stage("ingest") as timer:
+                    file_path, schemas[file_path] = ingest_stream(
+                        file.stream, os.path.join(app.config['UPLOAD_FOLDER'], os.path.splitext(filename)[0]))
+                    timer.add(rows=schemas[file_path]['row_count'], bytes_written=dataset_size(file_path))
+            except IngestError as e:
+                return jsonify({"status": "error", "message": f"{filename}: {e}"}), 422
+            catalog_jobs[file_path] = register_upload(file_path, file.filename)
             file_paths.append(file_path)
     
     if not file_paths:
         return jsonify({"status": "error", "message": "No valid files uploaded"}), 400
     
-    return jsonify({"status": "success", "message": "Files uploaded successfully", "paths": file_paths}), 200
+    return jsonify({"status": "success", "message": "Files uploaded successfully",
+                    "paths": file_paths, "schemas": schemas, "catalog_jobs": catalog_jobs}), 200
+
+def register_upload(path, filename):
+    """
+    在后台任务中把上传的数据集登记到目录, 返回任务 id; 扫描统计不阻塞请求线程。
+    队列已满时跳过, 合并和训练任务会登记它们用到的数据集
+    """
+    try:
+        return job_queue.submit("pipeline:run_register", path, "raw", metadata={"filename": filename},
+                                catalog=catalog)
+    except JobQueueFull:
+        logging.warning(f"Job queue full, skipped catalog registration of {path}")
+        return None
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    from data.ingest import UploadSession, UploadTooLarge
+    filename = secure_filename(request.json.get('filename', ''))
+    size = request.json.get('size')
+    if not filename or not allowed_file(filename):
+        return jsonify({"status": "error", "message": "Invalid file name"}), 400
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({"status": "error", "message": "Invalid file size"}), 400
+    
+    try:
+        session = UploadSession.create(app.config['STAGING_FOLDER'], filename, size, app.config['UPLOAD_FOLDER'],
+                                       max_size=app.config['MAX_UPLOAD_SIZE'])
+    except UploadTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+    return jsonify({"status": "success", "upload_id": session.upload_id,
+                    "upload_url": f"/uploads/{session.upload_id}"}), 201
+
+def get_upload_session(upload_id):
+    from data.ingest import UploadSession
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+        raise KeyError(upload_id)
+    session = UploadSession(app.config['STAGING_FOLDER'], upload_id)
+    session.status()
+    return session
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    try:
+        return jsonify(get_upload_session(upload_id).status()), 200
+    except KeyError:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    上传一个字节块, 位置由 Content-Range(bytes start-end/total) 或 offset 参数指定;
+    字节块可以并发、乱序上传, 中断后按 GET 返回的 received 补传缺失部分
+    """
+    from data.ingest import IngestError
+    content_range = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', request.headers.get('Content-Range', ''))
+    offset = int(content_range.group(1)) if content_range else request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({"status": "error", "message": "Missing Content-Range or offset"}), 400
+    try:
+        status = get_upload_session(upload_id).write_chunk(offset, request.get_data())
+    except KeyError:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+    except IngestError as e:
+        return jsonify({"status": "error", "message": str(e)}), 416
+    if status['state'] == 'complete':
+        status = dict(status, catalog_job=register_upload(status['path'], status['filename']))
+    return jsonify(status), 422 if status['state'] == 'failed' else 200
+
+@app.route('/catalog', methods=['GET'])
+def list_catalog():
+    return jsonify(catalog.list(request.args.get('kind'))), 200
+
+@app.route('/catalog/entry', methods=['GET'])
+def catalog_entry():
+    path = request.args.get('path', '')
+    entry = catalog.get(path)
+    if entry is None:
+        return jsonify({"status": "error", "message": "Not found in catalog"}), 404
+    entry['column_stats'] = catalog.column_stats(path)
+    entry['lineage'] = catalog.lineage(path)
+    if entry['kind'] != 'model':
+        entry['latest_model'] = catalog.latest_model(path)
+    return jsonify(entry), 200
+
+def in_data_root(*paths):
+    """客户端传入的路径在解析 .. 和符号链接后是否都位于 DATA_ROOT 下"""
+    root = os.path.realpath(app.config['DATA_ROOT'])
+    return all(isinstance(path, str) and path and
+               os.path.commonpath([root, os.path.realpath(path)]) == root for path in paths)
+
+def invalid_path():
+    return jsonify({"status": "error", "message": "Path must be inside the data directory"}), 400
+
+@app.route('/datasets/schema', methods=['GET'])
+def dataset_schema():
+    path = request.args.get('path', '')
+    if not in_data_root(path):
+        return invalid_path()
+    schema = read_schema(path)
+    if schema is None:
+        return jsonify({"status": "error", "message": "Schema not found"}), 404
+    return jsonify(schema), 200
 
 @app.route('/merge', methods=['POST'])
 def merge_files():
@@ -47,61 +235,18 @@ def merge_files():
     
     if not file_paths:
         return jsonify({"status": "error", "message": "No file paths provided"}), 400
+    if not in_data_root(*file_paths):
+        return invalid_path()
+    if merge_type not in ('by_year', 'by_variable'):
+        return jsonify({"status": "error", "message": "Invalid merge type"}), 400
     
-    try:
-        if merge_type == 'by_year':
-            merged_file_path = merge_files_by_year(file_paths)
-            visualizations = visualize_merge_by_year(merged_file_path)
-        elif merge_type == 'by_variable':
-            merged_file_path = merge_files_by_variable(file_paths)
-            visualizations = visualize_merge_by_variable(merged_file_path)
-        else:
-            return jsonify({"status": "error", "message": "Invalid merge type"}), 400
-        
-        return jsonify({
-            "status": "success", 
-            "message": "Files merged successfully",
-            "path": merged_file_path,
-            "visualizations": visualizations
-        }), 200
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-
-def visualize_merge_by_year(file_path):
-    df = pd.read_csv(file_path)
-    visualizations = {}
-    
-    # 创建年度数据总量柱状图
-    fig_yearly_data = px.bar(df.groupby('year').size().reset_index(name='count'), 
-                             x='year', y='count', title='Yearly Data Count')
-    visualizations['yearly_data_count'] = fig_yearly_data.to_json()
-    
-    # 为每个数值列创建年度趋势线图
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    for col in numeric_cols:
-        if col != 'year':
-            fig_trend = px.line(df.groupby('year')[col].mean().reset_index(), 
-                                x='year', y=col, title=f'{col} Yearly Trend')
-            visualizations[f'{col}_yearly_trend'] = fig_trend.to_json()
-    
-    return visualizations
-
-def visualize_merge_by_variable(file_path):
-    df = pd.read_csv(file_path)
-    visualizations = {}
-    
-    # 创建变量数据分布箱型图
-    fig_distribution = px.box(df.melt(var_name='Variable', value_name='Value'), 
-                              x='Variable', y='Value', title='Variable Distribution')
-    visualizations['variable_distribution'] = fig_distribution.to_json()
-    
-    # 创建变量间相关性热力图
-    corr = df.corr()
-    fig_heatmap = px.imshow(corr, labels=dict(color="Correlation"), 
-                            x=corr.columns, y=corr.columns, title='Variable Correlation Heatmap')
-    visualizations['correlation_heatmap'] = fig_heatmap.to_json()
-    
-    return visualizations
+    return submit_job("pipeline:run_merge", file_paths, merge_type,
+                      partition_by_year=request.json.get('partition_by_year', False),
+                      key=request.json.get('key'),
+                      max_workers=app.config['MERGE_WORKERS'],
+                      memory_limit=app.config['MERGE_MEMORY_LIMIT'],
+                      preview=bool(request.json.get('preview', False)),
+                      catalog=catalog)
 
 @app.route('/process', methods=['POST'])
 def process_data():
@@ -109,71 +254,149 @@ def process_data():
     selected_variables = request.json.get('selected_variables', [])
     if not file_path:
         return jsonify({"status": "error", "message": "No file path provided"}), 400
+    if not in_data_root(file_path):
+        return invalid_path()
     
+    return submit_job("pipeline:run_process", file_path, selected_variables,
+                      chunksize=app.config['PREPROCESS_CHUNKSIZE'],
+                      fast=request.json.get('fast_training', False),
+                      preview=bool(request.json.get('preview', False)),
+                      screen=bool(request.json.get('screen', False)),
+                      max_features=request.json.get('max_features', app.config['SCREEN_MAX_FEATURES']),
+                      key=request.json.get('key'),
+                      sample_size=app.config['PREVIEW_SAMPLE_SIZE'],
+                      catalog=catalog)
+
+@app.route('/screen', methods=['POST'])
+def screen_features():
+    file_path = request.json.get('file_path')
+    if not file_path:
+        return jsonify({"status": "error", "message": "No file path provided"}), 400
+    if not in_data_root(file_path):
+        return invalid_path()
+
+    return submit_job("pipeline:run_screen", file_path, request.json.get('selected_variables'),
+                      max_features=request.json.get('max_features', app.config['SCREEN_MAX_FEATURES']),
+                      key=request.json.get('key'))
+
+@app.route('/tune', methods=['POST'])
+def tune_model():
+    file_path = request.json.get('file_path')
+    if not file_path:
+        return jsonify({"status": "error", "message": "No file path provided"}), 400
+    if not in_data_root(file_path):
+        return invalid_path()
+
+    # 搜索参数与上次相同的请求从已完成的试验处续跑
+    options = {name: request.json[name] for name in ('space', 'n_candidates', 'min_resource', 'max_resource', 'eta')
+               if name in request.json}
+    return submit_job("pipeline:run_tune", file_path, request.json.get('selected_variables', []),
+                      chunksize=app.config['PREPROCESS_CHUNKSIZE'],
+                      fast=request.json.get('fast_training', False),
+                      max_workers=app.config['TUNE_WORKERS'], catalog=catalog, **options)
+
+@app.route('/retrain', methods=['POST'])
+def retrain_model():
+    file_paths = request.json.get('file_paths')
+    if not file_paths:
+        return jsonify({"status": "error", "message": "No file paths provided"}), 400
+    if not in_data_root(*file_paths):
+        return invalid_path()
+    
+    return submit_job("pipeline:run_incremental", file_paths, model_name=request.json.get('model'),
+                      n_estimators=request.json.get('n_estimators', 50), catalog=catalog)
+
+def submit_job(func, *args, **kwargs):
+    try:
+        job_id = job_queue.submit(func, *args, **kwargs)
+    except JobQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    return jsonify({"status": "accepted", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    status = {k: v for k, v in status.items() if k not in ('result', 'traceback')}
+    return jsonify(status), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    if status['state'] == 'failed':
+        return jsonify({"status": "error", "message": status.get('error')}), 500
+    if status['state'] != 'succeeded':
+        return jsonify({"status": "pending", "state": status['state']}), 409
+    return compressed_json({"status": "success", **status['result']})
+
+def compressed_json(payload, status=200):
+    """
+    返回按 Accept-Encoding 压缩的 JSON 响应, 用于包含图表的大响应
+    """
+    body, encoding = compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'),
+                              request.headers.get('Accept-Encoding'))
+    response = Response(body, status=status, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not job_queue.cancel(job_id):
+        return jsonify({"status": "error", "message": "Job not found or already finished"}), 404
+    return jsonify({"status": "success", "message": "Cancellation requested"}), 200
+
+# 列式请求体的 Content-Type 与存储格式的对应关系
+COLUMNAR_CONTENT_TYPES = {
+    'application/vnd.apache.arrow.stream': 'feather',
+    'application/vnd.apache.arrow.file': 'feather',
+    'application/x-parquet': 'parquet',
+    'text/csv': 'csv',
+}
+
+def read_prediction_batch():
+    """
+    解析预测请求: JSON 的 records(按行) 或 columns(按列), 或者 Arrow/Parquet/CSV 请求体
+    """
+    import pandas as pd
+    from data.storage import read_dataset_buffer
+    if request.mimetype in COLUMNAR_CONTENT_TYPES:
+        df = read_dataset_buffer(request.get_data(), COLUMNAR_CONTENT_TYPES[request.mimetype])
+        return df, request.args.get('model')
+    payload = request.get_json(silent=True) or {}
+    if 'records' in payload:
+        df = pd.DataFrame.from_records(payload['records'])
+    elif 'columns' in payload:
+        df = pd.DataFrame(payload['columns'])
+    else:
+        raise ValueError("Request must contain 'records' or 'columns'")
+    return df, payload.get('model', request.args.get('model'))
+
+@app.route('/predict', methods=['POST'])
+def predict():
     try:
-        # 数据预处理
-        processed_data_dir = "data/processed"
-        create_directory_if_not_exists(processed_data_dir)
-        processed_data_path = os.path.join(processed_data_dir, f"preprocessed_data_{get_timestamp()}.csv")
-        
-        preprocess_data(file_path, processed_data_path, selected_variables)
-        
-        # 模型训练
-        df = pd.read_csv(processed_data_path)
-        X = df.drop("target", axis=1)
-        y = df["target"]
-        
-        model = BigDataModel()
-        model.train(X, y)
-        
-        # 保存模型
-        model_dir = "data/models"
-        create_directory_if_not_exists(model_dir)
-        model_path = os.path.join(model_dir, f"big_data_model_{get_timestamp()}.joblib")
-        model.save(model_path)
-        
-        # 生成可视化
-        visualizations = generate_visualizations(df, selected_variables)
-        
-        return jsonify({
-            "status": "success", 
-            "message": "Data processed and model trained successfully",
-            "visualizations": visualizations
-        }), 200
+        df, model_name = read_prediction_batch()
+        model_name, proba = predictor.predict_proba(df, model_name)
+    except FileNotFoundError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except PredictionTimeout as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
     except Exception as e:
+        logging.exception("Prediction failed")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-def generate_visualizations(df, selected_variables):
-    visualizations = {}
-    
-    # 按年份分组的数据趋势
-    if 'year' in df.columns:
-        for var in selected_variables:
-            if var in df.columns:
-                fig = px.line(df.groupby('year')[var].mean().reset_index(), x='year', y=var)
-                fig.update_layout(title=f'{var} Trend Over Years')
-                visualizations[f'{var}_trend'] = fig.to_json()
-    
-    # 相关性热力图
-    corr = df[selected_variables].corr()
-    fig_heatmap = px.imshow(corr, labels=dict(color="Correlation"), x=corr.columns, y=corr.columns)
-    fig_heatmap.update_layout(title='Feature Correlation Heatmap')
-    visualizations['heatmap'] = fig_heatmap.to_json()
-    
-    # 目标变量分布
-    if 'target' in df.columns:
-        fig_target = px.bar(df['target'].value_counts().reset_index(), x='index', y='target', labels={'index': 'Target', 'target': 'Count'})
-        fig_target.update_layout(title='Target Variable Distribution')
-        visualizations['target_distribution'] = fig_target.to_json()
-    
-    # 特征重要性
-    if hasattr(model.model, 'feature_importances_'):
-        feature_importance = model.model.feature_importances_
-        fig_importance = px.bar(x=df.columns[:-1], y=feature_importance, labels={'x': 'Features', 'y': 'Importance'})
-        fig_importance.update_layout(title='Feature Importance')
-        visualizations['feature_importance'] = fig_importance.to_json()
-    
-    return visualizations
+    return jsonify({
+        "status": "success",
+        "model": model_name,
+        "probabilities": proba.tolist(),
+        "predictions": (proba >= 0.5).astype(int).tolist()
+    }), 200
 
 @app.route('/visualizations/<path:filename>')
 def serve_visualization(filename):
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from .storage import iter_dataset
+
+# 分位数样本(float32)占用内存的上限; 列数很多时按它缩减样本行数
+MAX_SAMPLE_BYTES = 256 * 1024 ** 2
+
+class DatasetSummary:
+    """
+    单遍分块聚合: 一次扫描同时得到计数、均值、最值、分组计数和均值、
+    成对相关系数矩阵, 以及用于分位数的定长均匀行样本
+
+    样本是预先分配的 float32 数组, 行数为 sample_size 和 MAX_SAMPLE_BYTES 允许行数中的较小值,
+    每块只原地替换被选中的行; 总行数不超过样本行数时分位数精确到 float32 精度
+    """
+    def __init__(self, columns=None, group_by=None, value_counts=(), correlation=True,
+                 sample_size=100000, random_state=0):
+        self.columns = list(columns) if columns is not None else None
+        self.group_by = group_by
+        self.value_count_columns = list(value_counts)
+        self.compute_correlation = correlation
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(random_state)
+        self.n_rows = 0
+        self.group_sizes = pd.Series(dtype=np.float64)
+        self._group_sums = None
+        self._group_counts = None
+        self.value_counts = {col: pd.Series(dtype=np.float64) for col in self.value_count_columns}
+        self._initialized = False
+
+    def _initialize(self, chunk):
+        if self.columns is None:
+            excluded = [self.group_by] if self.group_by else []
+            self.columns = [col for col in chunk.select_dtypes(include=[np.number]).columns
+                            if col not in excluded]
+        p = len(self.columns)
+        # 以第一块的均值为平移量累积二阶量, 减少大数相减带来的精度损失
+        first = chunk[self.columns].to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            shift = np.nanmean(first, axis=0) if len(first) else np.zeros(p)
+        self._shift = np.nan_to_num(shift)
+        self._min = np.full(p, np.inf)
+        self._max = np.full(p, -np.inf)
+        if self.compute_correlation:
+            self._pair_n = np.zeros((p, p))
+            self._pair_sx = np.zeros((p, p))
+            self._pair_sxx = np.zeros((p, p))
+            self._pair_sxy = np.zeros((p, p))
+        else:
+            self._n = np.zeros(p)
+            self._sx = np.zeros(p)
+        rows = min(self.sample_size or 0, MAX_SAMPLE_BYTES // (4 * max(p, 1)))
+        self._sample = np.empty((rows, p), dtype=np.float32)
+        # 空位的键为 inf, 总是最先被替换
+        self._sample_keys = np.full(rows, np.inf)
+        self._initialized = True
+
+    def update(self, chunk):
+        """
+        用一个数据块更新所有统计量
+        """
+        if not self._initialized:
+            self._initialize(chunk)
+        self.n_rows += len(chunk)
+        raw = chunk[self.columns].to_numpy(dtype=np.float64)
+        values = raw - self._shift
+        mask = ~np.isnan(values)
+        x = np.where(mask, values, 0.0)
+
+        self._min = np.minimum(self._min, np.where(mask, raw, np.inf).min(axis=0, initial=np.inf))
+        self._max = np.maximum(self._max, np.where(mask, raw, -np.inf).max(axis=0, initial=-np.inf))
+
+        if self.compute_correlation:
+            m = mask.astype(np.float64)
+            self._pair_n += m.T @ m
+            self._pair_sx += x.T @ m
+            self._pair_sxx += (x * x).T @ m
+            self._pair_sxy += x.T @ x
+        else:
+            self._n += mask.sum(axis=0)
+            self._sx += x.sum(axis=0)
+
+        if self.group_by is not None:
+            groups = chunk.groupby(self.group_by, observed=True)
+            sums = groups[self.columns].sum()
+            counts = groups[self.columns].count()
+            self.group_sizes = self.group_sizes.add(groups.size(), fill_value=0)
+            self._group_sums = sums if self._group_sums is None else self._group_sums.add(sums, fill_value=0)
+            self._group_counts = counts if self._group_counts is None else self._group_counts.add(counts, fill_value=0)
+
+        for col in self.value_count_columns:
+            self.value_counts[col] = self.value_counts[col].add(chunk[col].value_counts(), fill_value=0)
+
+        # 给每行一个随机键, 保留键最小的若干行, 即整体的均匀样本; 只比较键,
+        # 新块中入选的行写入被淘汰的位置, 不复制整个样本
+        rows = len(self._sample_keys)
+        if not rows:
+            return self
+        keys = self._rng.random(len(raw))
+        keep = np.argpartition(np.concatenate([self._sample_keys, keys]), rows - 1)[:rows]
+        incoming = keep[keep >= rows] - rows
+        retained = np.zeros(rows, dtype=bool)
+        retained[keep[keep < rows]] = True
+        slots = np.flatnonzero(~retained)
+        self._sample[slots] = raw[incoming]
+        self._sample_keys[slots] = keys[incoming]
+        return self
+
+    @property
+    def count(self):
+        n = np.diag(self._pair_n) if self.compute_correlation else self._n
+        return pd.Series(n, index=self.columns)
+
+    @property
+    def mean(self):
+        n = np.diag(self._pair_n) if self.compute_correlation else self._n
+        sx = np.diag(self._pair_sx) if self.compute_correlation else self._sx
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.Series(sx / n + self._shift, index=self.columns)
+
+    @property
+    def min(self):
+        return pd.Series(np.where(np.isinf(self._min), np.nan, self._min), index=self.columns)
+
+    @property
+    def max(self):
+        return pd.Series(np.where(np.isinf(self._max), np.nan, self._max), index=self.columns)
+
+    @property
+    def group_means(self):
+        """
+        各分组中每列的均值, 行索引为分组值
+        """
+        return (self._group_sums / self._group_counts).sort_index()
+
+    def correlation(self):
+        """
+        成对完整观测的 Pearson 相关系数, 与 DataFrame.corr() 一致
+        """
+        n = self._pair_n
+        sx = self._pair_sx
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self._pair_sxy - sx * sx.T / n
+            var = self._pair_sxx - sx ** 2 / n
+            corr = cov / np.sqrt(var * var.T)
+        corr[n < 2] = np.nan
+        return pd.DataFrame(np.clip(corr, -1, 1), index=self.columns, columns=self.columns)
+
+    def quantiles(self, q):
+        """
+        基于样本计算各列分位数, 行索引为分位点
+        """
+        sample = self._sample[np.isfinite(self._sample_keys)].astype(np.float64)
+        with np.errstate(invalid='ignore'):
+            values = np.nanquantile(sample, q, axis=0) if len(sample) else np.nan
+        return pd.DataFrame(np.atleast_2d(values), index=np.atleast_1d(q), columns=self.columns)
+
+    def box_stats(self):
+        """
+        箱型图所需的统计量: 四分位数、须(1.5 倍四分位距内)、均值
+        """
+        quartiles = self.quantiles([0.25, 0.5, 0.75])
+        q1, median, q3 = (quartiles.iloc[i] for i in range(3))
+        iqr = q3 - q1
+        return pd.DataFrame({
+            'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': np.maximum(self.min, q1 - 1.5 * iqr),
+            'upperfence': np.minimum(self.max, q3 + 1.5 * iqr),
+            'mean': self.mean,
+        })
+
+def summarize_dataset(path, columns=None, group_by=None, value_counts=(), correlation=True,
+                      chunksize=100000, sample_size=100000):
+    """
+    分块扫描一遍数据集, 返回 DatasetSummary
+    """
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns) + [c for c in [group_by, *value_counts] if c and c not in columns]
+    summary = DatasetSummary(columns, group_by=group_by, value_counts=value_counts,
+                             correlation=correlation, sample_size=sample_size)
+    for chunk in iter_dataset(path, columns=read_columns, chunksize=chunksize):
+        summary.update(chunk)
+    return summary
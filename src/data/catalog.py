@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import closing
+import numpy as np
+from .storage import dataset_parts, get_format, iter_dataset
+from utils.cache import file_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    format TEXT,
+    size_bytes INTEGER,
+    mtime REAL,
+    row_count INTEGER,
+    columns TEXT,
+    metadata TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_kind ON entries (kind, created_at);
+CREATE TABLE IF NOT EXISTS parts (
+    dataset TEXT NOT NULL,
+    part TEXT NOT NULL,
+    row_count INTEGER,
+    PRIMARY KEY (dataset, part)
+);
+CREATE TABLE IF NOT EXISTS column_stats (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    dtype TEXT,
+    null_count INTEGER,
+    min REAL,
+    max REAL,
+    mean REAL,
+    PRIMARY KEY (path, name)
+);
+CREATE TABLE IF NOT EXISTS lineage (
+    child TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    PRIMARY KEY (child, parent)
+);
+CREATE INDEX IF NOT EXISTS lineage_parent ON lineage (parent);
+"""
+
+# 本进程中已建表的数据库文件, 建表和 PRAGMA 每个文件只执行一次
+_initialized = set()
+
+def _normalize(path):
+    return os.path.normpath(path)
+
+def _path_signature(path):
+    """数据集的总大小和最新修改时间, 用于判断是否需要重新计算哈希"""
+    paths = dataset_parts(path) if os.path.isdir(path) else [path]
+    stats = [os.stat(p) for p in paths]
+    return sum(s.st_size for s in stats), max((s.st_mtime for s in stats), default=0.0)
+
+def _dataset_format(path):
+    parts = dataset_parts(path)
+    return get_format(parts[0]) if parts else None
+
+def _scan_part(path, chunksize):
+    """
+    分块扫描一个数据文件, 返回行数和每列的类型、缺失值数、最值和均值
+    """
+    # 只有登记新版本的数据集时才需要 pandas, 查询目录的请求不加载它
+    from .aggregation import DatasetSummary
+    summary = DatasetSummary(correlation=False, sample_size=0)
+    dtypes, null_counts = {}, {}
+    for chunk in iter_dataset(path, chunksize=chunksize):
+        for col, dtype in chunk.dtypes.items():
+            dtypes.setdefault(col, str(dtype))
+        for col, n in chunk.isna().sum().items():
+            null_counts[col] = null_counts.get(col, 0) + int(n)
+        summary.update(chunk)
+    stats = {col: {"dtype": dtype, "null_count": null_counts[col], "min": None, "max": None, "mean": None}
+             for col, dtype in dtypes.items()}
+    if summary.columns:
+        for col, lo, hi, mean in zip(summary.columns, summary.min, summary.max, summary.mean):
+            stats[col].update({k: (None if np.isnan(v) else float(v))
+                               for k, v in (("min", lo), ("max", hi), ("mean", mean))})
+    return summary.n_rows, stats
+
+def _combine_stats(part_stats):
+    """把各分区的列统计合并为整个数据集的统计"""
+    combined = {}
+    for n_rows, stats in part_stats:
+        for col, s in stats.items():
+            c = combined.setdefault(col, {"dtype": s["dtype"], "null_count": 0, "min": None, "max": None,
+                                          "mean": None, "_sum": 0.0, "_count": 0})
+            c["null_count"] += s["null_count"]
+            if s["mean"] is not None:
+                count = n_rows - s["null_count"]
+                c["_sum"] += s["mean"] * count
+                c["_count"] += count
+                c["min"] = s["min"] if c["min"] is None else min(c["min"], s["min"])
+                c["max"] = s["max"] if c["max"] is None else max(c["max"], s["max"])
+    for c in combined.values():
+        total, count = c.pop("_sum"), c.pop("_count")
+        if count:
+            c["mean"] = total / count
+    return combined
+
+class Catalog:
+    """
+    data/raw、data/processed 和 data/models 的嵌入式 SQLite 索引
+
+    记录每个数据集和模型的内容哈希、schema、行数、每列的最值和均值、血缘
+    (raw → merged → processed → model) 和时间戳; 分区数据集还记录每个分区的
+    行数。每次操作使用独立连接, 可在多个进程中使用
+    """
+    def __init__(self, db_path="data/catalog.db", chunksize=100000):
+        self.db_path = db_path
+        self.chunksize = chunksize
+
+    def _connect(self):
+        db_path = os.path.abspath(self.db_path)
+        # 数据库文件被删除后重新建表
+        initialize = db_path not in _initialized or not os.path.exists(db_path)
+        if initialize:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if initialize:
+            # WAL 模式记录在数据库文件中, 之后的连接无需再设置
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _initialized.add(db_path)
+        return conn
+
+    def register_dataset(self, path, kind=None, parents=(), metadata=None):
+        """
+        登记数据集; 内容没有变化时不重新扫描, 只更新血缘和元数据
+
+        kind 为空时沿用已登记的类型, 新数据集默认为 raw
+        """
+        path = _normalize(path)
+        size, mtime = _path_signature(path)
+        existing = self.get(path)
+        kind = kind or (existing["kind"] if existing is not None else "raw")
+        if existing is not None and existing["size_bytes"] == size and existing["mtime"] == mtime:
+            content_hash = existing["content_hash"]
+        else:
+            content_hash = file_hash(path)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            if existing is None or existing["content_hash"] != content_hash:
+                parts = [_normalize(p) for p in dataset_parts(path)]
+                part_stats = [_scan_part(part, self.chunksize) for part in parts]
+                combined = _combine_stats(part_stats)
+                conn.execute("DELETE FROM column_stats WHERE path = ? OR path IN "
+                             "(SELECT part FROM parts WHERE dataset = ?)", (path, path))
+                conn.execute("DELETE FROM parts WHERE dataset = ?", (path,))
+                for part, (n_rows, _) in zip(parts, part_stats):
+                    conn.execute("INSERT INTO parts VALUES (?, ?, ?)", (path, part, n_rows))
+                self._insert_column_stats(conn, path, combined)
+                row_count, columns = sum(n for n, _ in part_stats), list(combined)
+            else:
+                row_count, columns = existing["row_count"], existing["columns"]
+            self._upsert(conn, path, kind, content_hash, _dataset_format(path), size, mtime,
+                         row_count, columns, metadata, existing, now)
+            self._set_parents(conn, path, parents)
+        return self.get(path)
+
+    def register_model(self, model_path, parents=(), metadata=None):
+        """
+        登记模型文件, parents 为训练用的数据集(增量训练时还包括上一个模型)
+        """
+        model_path = _normalize(model_path)
+        size, mtime = _path_signature(model_path)
+        existing = self.get(model_path)
+        with closing(self._connect()) as conn, conn:
+            self._upsert(conn, model_path, "model", file_hash(model_path), "joblib", size, mtime,
+                         None, None, metadata, existing, time.time())
+            self._set_parents(conn, model_path, parents)
+        return self.get(model_path)
+
+    def register_matrix(self, matrix, content_hash, parents=(), metadata=None):
+        """
+        登记预处理后的共享特征矩阵(FeatureMatrix), 行数和列名取自矩阵的元数据, 不扫描数据
+
+        矩阵由输入内容和预处理设置决定, content_hash 使用调用方已算好的缓存键, 不再读取一遍矩阵文件
+        """
+        path = _normalize(matrix.directory)
+        size, mtime = sum(os.path.getsize(p) for p in matrix.files), max(os.path.getmtime(p) for p in matrix.files)
+        existing = self.get(path)
+        with closing(self._connect()) as conn, conn:
+            self._upsert(conn, path, "processed", content_hash, "npy", size, mtime, matrix.n_rows,
+                         matrix.columns, metadata, existing, time.time())
+            self._set_parents(conn, path, parents)
+        return self.get(path)
+
+    def _insert_column_stats(self, conn, path, stats):
+        conn.executemany("INSERT INTO column_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(path, col, s["dtype"], s["null_count"], s["min"], s["max"], s["mean"])
+                          for col, s in stats.items()])
+
+    def _upsert(self, conn, path, kind, content_hash, fmt, size, mtime, row_count, columns, metadata,
+                existing, now):
+        if existing is not None and metadata is None:
+            metadata = existing["metadata"]
+        conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, kind, content_hash, fmt, size, mtime, row_count,
+             json.dumps(columns) if columns is not None else None,
+             json.dumps(metadata) if metadata is not None else None,
+             existing["created_at"] if existing is not None else now, now))
+
+    def _set_parents(self, conn, path, parents):
+        conn.executemany("INSERT OR IGNORE INTO lineage VALUES (?, ?)",
+                         [(path, _normalize(parent)) for parent in parents])
+
+    def _entry(self, row):
+        entry = dict(row)
+        entry["columns"] = json.loads(entry["columns"]) if entry["columns"] else None
+        entry["metadata"] = json.loads(entry["metadata"]) if entry["metadata"] else None
+        return entry
+
+    def get(self, path):
+        """查询一个数据集或模型, 未登记时返回 None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM entries WHERE path = ?", (_normalize(path),)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def column_stats(self, path):
+        """返回 {列名: {dtype, null_count, min, max, mean}}"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM column_stats WHERE path = ?", (_normalize(path),)).fetchall()
+        return {row["name"]: {k: row[k] for k in ("dtype", "null_count", "min", "max", "mean")} for row in rows}
+
+    def list(self, kind=None):
+        """按登记时间从新到旧列出条目, kind 可为 raw、merged、processed 或 model"""
+        query, args = "SELECT * FROM entries", ()
+        if kind is not None:
+            query, args = query + " WHERE kind = ?", (kind,)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query + " ORDER BY created_at DESC", args).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def lineage(self, path):
+        """返回所有上游条目的路径, 从近到远"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("""
+                WITH RECURSIVE ancestors(path, depth) AS (
+                    SELECT parent, 1 FROM lineage WHERE child = ?
+                    UNION SELECT l.parent, a.depth + 1 FROM lineage l JOIN ancestors a ON l.child = a.path
+                )
+                SELECT path, MIN(depth) AS depth FROM ancestors GROUP BY path ORDER BY depth, path
+            """, (_normalize(path),)).fetchall()
+        return [row["path"] for row in rows]
+
+    def children(self, path):
+        """直接以 path 为上游的条目路径"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT child FROM lineage WHERE parent = ? ORDER BY child",
+                                (_normalize(path),)).fetchall()
+        return [row["child"] for row in rows]
+
+    def latest_model(self, dataset=None):
+        """
+        最新登记的模型; 指定 dataset 时只在由该数据集(直接或间接)训练出的模型中查找
+
+        已被删除的模型文件会从目录中移除
+        """
+        with closing(self._connect()) as conn:
+            if dataset is None:
+                rows = conn.execute("SELECT path FROM entries WHERE kind = 'model' "
+                                    "ORDER BY created_at DESC").fetchall()
+            else:
+                rows = conn.execute("""
+                    WITH RECURSIVE descendants(path) AS (
+                        SELECT ?
+                        UNION SELECT l.child FROM lineage l JOIN descendants d ON l.parent = d.path
+                    )
+                    SELECT e.path FROM entries e JOIN descendants d ON e.path = d.path
+                    WHERE e.kind = 'model' ORDER BY e.created_at DESC
+                """, (_normalize(dataset),)).fetchall()
+        for row in rows:
+            if os.path.exists(row["path"]):
+                return row["path"]
+            self.remove(row["path"])
+        return None
+
+    def remove(self, path):
+        path = _normalize(path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM column_stats WHERE path = ? OR path IN "
+                         "(SELECT part FROM parts WHERE dataset = ?)", (path, path))
+            conn.execute("DELETE FROM parts WHERE dataset = ?", (path,))
+            conn.execute("DELETE FROM lineage WHERE child = ?", (path,))
+            conn.execute("DELETE FROM entries WHERE path = ?", (path,))
@@ -1,27 +1,218 @@
+import os
+import json
+import gzip
+import time
+import fcntl
+import hashlib
+import urllib.error
+import urllib.request
+from http.client import HTTPException
+from urllib.parse import urlparse
 import pandas as pd
+from .storage import DatasetWriter, atomic_output, dataset_path, write_dataset
+from utils.metrics import stage
 
-def fetch_data(source_url):
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 下载的源文件按 URL 缓存在该目录, 每个 URL 一个子目录: data(完整文件)、data.partial(未完成的下载)、meta.json
+DEFAULT_CACHE_DIR = "data/downloads"
+
+# 每次从连接读取并写入磁盘的字节数
+CHUNK_SIZE = 1024 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+class FetchError(Exception):
+    """下载失败: 服务器返回不可重试的错误, 或重试次数用完"""
+
+class _Retryable(Exception):
+    """连接失败、中断、超时或服务器 5xx, 可以从已下载的位置续传"""
+
+def _entry_dir(cache_dir, url):
+    return os.path.join(cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest()[:32])
+
+def _read_meta(entry):
+    try:
+        with open(os.path.join(entry, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_meta(entry, meta):
+    path = os.path.join(entry, "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(path + ".tmp", path)
+
+def _parse_content_range(value):
+    """解析 "bytes start-end/total", 返回 (start, total), total 未知时为 None"""
+    try:
+        _, _, spec = value.partition(" ")
+        span, _, total = spec.partition("/")
+        return int(span.split("-")[0]), None if total == "*" else int(total)
+    except (AttributeError, ValueError):
+        return None, None
+
+def _fetch(url, meta, entry, timeout, chunk_size):
     """
-    从给定的URL获取数据
+    发出一次请求并把响应写入 data.partial, 完成后替换 data; 返回本次收到的字节数, 未修改时返回 None
+
+    已有部分下载且记录了 ETag/Last-Modified 时用 Range + If-Range 续传,
+    已有完整文件时用 If-None-Match/If-Modified-Since 条件请求
     """
+    data_path = os.path.join(entry, "data")
+    partial_path = data_path + ".partial"
+    # 压缩的源文件原样保存, 读取时再解压; 不让服务器临时压缩, 否则 Range 的字节位置不稳定
+    headers = {"Accept-Encoding": "identity"}
+    validator = meta.get("etag") or meta.get("last_modified")
+    offset = os.path.getsize(partial_path) if validator and os.path.exists(partial_path) else 0
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+    elif meta.get("complete") and os.path.exists(data_path):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
     try:
-        df = pd.read_csv(source_url)
-        return df
-    except Exception as e:
-        print(f"获取数据时出错: {e}")
-        return None
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        if e.code == 416:
+            # 续传位置超出文件长度, 源文件可能已变短; 丢弃部分下载后重试
+            os.remove(partial_path)
+            raise _Retryable("续传位置无效")
+        if e.code >= 500 or e.code == 429:
+            raise _Retryable(f"HTTP {e.code}")
+        raise FetchError(f"下载 {url} 失败: HTTP {e.code}") from e
+    except (urllib.error.URLError, OSError, HTTPException) as e:
+        raise _Retryable(str(e)) from e
+
+    with response:
+        if response.status == 206:
+            start, total = _parse_content_range(response.headers.get("Content-Range"))
+            if start != offset:
+                os.remove(partial_path)
+                raise _Retryable(f"服务器返回的续传位置 {start} 与本地 {offset} 不一致")
+            mode = "ab"
+        else:
+            # 服务器忽略了 Range, 或者源文件已经变化(If-Range 不匹配), 从头下载
+            length = response.headers.get("Content-Length")
+            offset, total, mode = 0, int(length) if length else None, "wb"
+        meta.update(etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+                     content_encoding=response.headers.get("Content-Encoding"), complete=False)
+        _write_meta(entry, meta)
+
+        received = offset
+        try:
+            with open(partial_path, mode) as f:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+        except (OSError, HTTPException) as e:
+            raise _Retryable(f"连接中断, 已下载 {received} 字节") from e
+        if total is not None and received != total:
+            raise _Retryable(f"连接中断, 已下载 {received}/{total} 字节")
+
+    os.replace(partial_path, data_path)
+    meta.update(complete=True, size=received, fetched_at=time.time())
+    _write_meta(entry, meta)
+    return received - offset
+
+def download(url, cache_dir=DEFAULT_CACHE_DIR, retries=3, backoff=0.5, timeout=30, chunk_size=CHUNK_SIZE,
+             allow_stale=False):
+    """
+    把 URL 流式下载到本地缓存, 返回缓存文件的路径(保持源文件的压缩格式)
+
+    - 按 chunk_size 分块写入磁盘, 内存占用与文件大小无关
+    - 连接失败或中断时最多重试 retries 次, 间隔按 backoff 指数增长, 每次从已下载的位置续传
+    - 已缓存时用 ETag/Last-Modified 向服务器确认, 未变化的源文件不会重新下载
+    - allow_stale 为 True 时, 下载失败但有旧版本的完整缓存则返回旧版本
+
+    同一 URL 的并发下载通过文件锁串行执行
+    """
+    entry = _entry_dir(cache_dir, url)
+    os.makedirs(entry, exist_ok=True)
+    data_path = os.path.join(entry, "data")
+    with open(os.path.join(entry, "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        meta = _read_meta(entry) or {"url": url}
+        with stage("fetch.download") as timer:
+            for attempt in range(retries + 1):
+                try:
+                    received = _fetch(url, meta, entry, timeout, chunk_size)
+                    break
+                except _Retryable as e:
+                    if attempt == retries:
+                        if allow_stale and os.path.exists(data_path):
+                            print(f"下载 {url} 失败({e}), 使用之前缓存的版本")
+                            return data_path
+                        raise FetchError(f"下载 {url} 失败: {e}") from e
+                    print(f"下载 {url} 出错({e}), {attempt + 1}/{retries} 次重试")
+                    time.sleep(backoff * 2 ** attempt)
+            timer.add(bytes_read=received or 0)
+    if received is None:
+        print(f"{url} 未变化, 使用缓存 {data_path}")
+    return data_path
+
+def detect_compression(path):
+    """根据文件头判断压缩格式, 返回 'gzip'、'zstd' 或 None"""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if magic == _ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+def open_decompressed(path):
+    """以二进制流打开文件, gzip 和 zstd 压缩的文件边读边解压"""
+    compression = detect_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("读取 zstd 压缩的文件需要安装 zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def fetch_data(source_url, output_path, cache_dir=DEFAULT_CACHE_DIR, chunksize=100000, **kwargs):
+    """
+    从给定的URL获取 CSV 数据, 分块转换后写入 output_path(格式由扩展名决定), 返回 output_path
+
+    HTTP(S) 地址先经 download 缓存到本地再读取, 其余参数传给 download; 本地路径直接读取。
+    源文件边解压边按 chunksize 行解析, 内存占用与文件大小无关; 下载或解析失败时抛出异常,
+    不会留下写了一半的输出
+    """
+    if urlparse(source_url).scheme in ("http", "https"):
+        path = download(source_url, cache_dir, allow_stale=True, **kwargs)
+    else:
+        path = source_url
+    with atomic_output(output_path) as tmp_path:
+        with open_decompressed(path) as f, DatasetWriter(tmp_path) as writer:
+            for chunk in pd.read_csv(f, chunksize=chunksize):
+                writer.write(chunk)
+    return output_path
 
 def save_data(df, output_path):
     """
-    将数据保存到指定路径
+    将数据保存到指定路径, 存储格式由扩展名决定
     """
-    df.to_csv(output_path, index=False)
+    write_dataset(df, output_path)
     print(f"数据已保存到 {output_path}")
 
 if __name__ == "__main__":
     source_url = "https://example.com/bigdata.csv"
-    output_path = "data/raw/bigdata.csv"
-    
-    df = fetch_data(source_url)
-    if df is not None:
-        save_data(df, output_path)
+    output_path = dataset_path("data/raw", "bigdata")
+
+    fetch_data(source_url, output_path)
+    print(f"数据已保存到 {output_path}")
@@ -1,52 +1,314 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-
-def merge_files_by_year(file_paths):
-    dfs = [pd.read_csv(file_path) for file_path in file_paths]
-    merged_df = pd.concat(dfs, ignore_index=True)
-    merged_df['year'] = pd.to_datetime(merged_df['date']).dt.year  # 假设有一个 'date' 列
-    merged_file_path = 'data/raw/merged_data_by_year.csv'
-    merged_df.to_csv(merged_file_path, index=False)
-    return merged_file_path
-
-def merge_files_by_variable(file_paths):
-    dfs = [pd.read_csv(file_path) for file_path in file_paths]
-    merged_df = pd.concat(dfs, axis=1)
-    merged_file_path = 'data/raw/merged_data_by_variable.csv'
-    merged_df.to_csv(merged_file_path, index=False)
-    return merged_file_path
-
-def preprocess_data(input_path, output_path, selected_variables=None):
-    """
-    对数据进行预处理
-    """
-    # 读取数据
-    df = pd.read_csv(input_path)
-    
-    # 如果提供了选定的变量，只保留这些变量
+from .storage import (dataset_path, dataset_parts, dataset_size, partition_path, read_dataset, read_columns,
+                      iter_dataset, write_dataset, atomic_output, merged_schema, DatasetWriter)
+from .dtypes import format_report, read_optimized
+from .matrix import MatrixWriter, shuffled_positions
+from .reader import DEFAULT_MEMORY_LIMIT, iter_files, read_files
+from .transform import Preprocessor
+from utils.metrics import stage, timed_iter
+
+def merge_files_by_year(file_paths, output_path=None, partition_by_year=False, chunksize=100000,
+                        max_workers=None, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """
+    按行流式合并多个文件并派生 'year' 列
+
+    文件由 max_workers 个进程并行解析, 同时驻留内存的数据不超过 memory_limit 字节;
+    partition_by_year 为真时输出为目录, 每个年份一个文件
+    """
+    # 各文件 schema 的并集, 每个数据块都按它写出: 列一致, 某个文件缺少的列写为该列类型的空值
+    schema = merged_schema(file_paths, [('year', 'int64')])
+    columns = []
+    for file_path in file_paths:
+        columns.extend(col for col in read_columns(file_path) if col not in columns)
+
+    if output_path is None:
+        output_path = dataset_path('data/raw', 'merged_data_by_year')
+
+    with atomic_output(output_path) as tmp_path:
+        if partition_by_year:
+            os.makedirs(tmp_path)
+        writers = {}
+        try:
+            for _, chunk in iter_files(file_paths, max_workers=max_workers, memory_limit=memory_limit,
+                                       chunksize=chunksize):
+                chunk = chunk.reindex(columns=columns)
+                chunk['year'] = pd.to_datetime(chunk['date']).dt.year.astype('Int64')  # 假设有一个 'date' 列
+                if not partition_by_year:
+                    if None not in writers:
+                        writers[None] = DatasetWriter(tmp_path, schema)
+                    writers[None].write(chunk)
+                    continue
+                for year, group in chunk.groupby('year', sort=False, dropna=False):
+                    if year not in writers:
+                        key = int(year) if pd.notna(year) else 'null'
+                        writers[year] = DatasetWriter(partition_path(tmp_path, 'year', key), schema)
+                    writers[year].write(group)
+        finally:
+            for writer in writers.values():
+                writer.close()
+    return output_path
+
+def merge_files_by_variable(file_paths, output_path=None, key=None, memory_limit=DEFAULT_MEMORY_LIMIT,
+                            chunksize=100000, max_workers=None):
+    """
+    按变量(列)合并多个文件, 文件由 max_workers 个进程并行解析
+
+    未指定 key 时按行位置拼接; 指定 key 时按该列做外连接, 输入超过 memory_limit
+    字节时先按 key 的哈希值分区落盘, 再逐个分区连接
+    """
+    if output_path is None:
+        output_path = dataset_path('data/raw', 'merged_data_by_variable')
+    with atomic_output(output_path) as tmp_path:
+        _merge_by_variable(file_paths, tmp_path, key, memory_limit, chunksize, max_workers)
+    return output_path
+
+def _merge_by_variable(file_paths, output_path, key, memory_limit, chunksize, max_workers):
+    """merge_files_by_variable 的实现, 写出到 output_path"""
+    if key is None:
+        dfs = read_files(file_paths, max_workers=max_workers, memory_limit=memory_limit)
+        write_dataset(pd.concat(dfs, axis=1), output_path)
+        return
+
+    # 输出列: 键列在前, 其余列按文件顺序去重
+    columns = [key]
+    for file_path in file_paths:
+        columns.extend(col for col in read_columns(file_path) if col not in columns)
+
+    input_bytes = sum(os.path.getsize(part) for path in file_paths for part in dataset_parts(path))
+    num_partitions = max(1, int(np.ceil(input_bytes / memory_limit)))
+
+    with DatasetWriter(output_path) as writer:
+        if num_partitions == 1:
+            dfs = read_files(file_paths, max_workers=max_workers, memory_limit=memory_limit)
+            writer.write(_join_on_key(dfs, key, columns))
+            return
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            # 各文件独立分区落盘, 可以并行; 每个进程只持有一个数据块
+            args = [(path, key, num_partitions, spill_dir, i, chunksize) for i, path in enumerate(file_paths)]
+            workers = min(max_workers or os.cpu_count() or 1, len(file_paths))
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    spilled = list(executor.map(_spill_partitions, *zip(*args)))
+            else:
+                spilled = [_spill_partitions(*a) for a in args]
+            for partition in range(num_partitions):
+                parts = [read_dataset(files[partition]) for files in spilled if partition in files]
+                if parts:
+                    writer.write(_join_on_key(parts, key, columns))
+
+def _spill_partitions(file_path, key, num_partitions, spill_dir, file_index, chunksize):
+    """
+    将一个文件按 key 的哈希值分区写入临时文件, 返回 {分区号: 文件路径}
+    """
+    writers = {}
+    try:
+        for chunk in iter_dataset(file_path, chunksize=chunksize):
+            hashes = pd.util.hash_pandas_object(chunk[key], index=False).to_numpy()
+            for partition, group in chunk.groupby(hashes % num_partitions):
+                if partition not in writers:
+                    path = dataset_path(spill_dir, f"file{file_index}_part{partition}")
+                    writers[partition] = DatasetWriter(path)
+                writers[partition].write(group)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {partition: writer.path for partition, writer in writers.items()}
+
+def _join_on_key(dfs, key, columns):
+    """
+    按 key 外连接多个数据框; 重名的非键列只保留一列, 缺失值由后面的文件补齐
+    """
+    merged = dfs[0]
+    for df in dfs[1:]:
+        merged = merged.merge(df, on=key, how='outer', suffixes=('', '__dup'))
+        for col in [c for c in merged.columns if c.endswith('__dup')]:
+            base = col[:-len('__dup')]
+            merged[base] = merged[base].combine_first(merged[col])
+            merged = merged.drop(columns=col)
+    merged = merged.reindex(columns=columns)
+
+    # 外连接会引入缺失值, 统一把非键整数列转为浮点, 使各分区的列类型一致
+    int_columns = [col for col in merged.select_dtypes(include=['integer']).columns if col != key]
+    merged = merged.astype({col: np.float64 for col in int_columns})
+    return merged.sort_values(key, ignore_index=True)
+
+def _select_columns(df, selected_variables):
     if selected_variables:
-        df = df[selected_variables + ['target']]
-    
-    # 处理缺失值
-    imputer = SimpleImputer(strategy='mean')
-    df_imputed = pd.DataFrame(imputer.fit_transform(df), columns=df.columns)
+        return df[selected_variables + ['target']]
+    return df
+
+def _new_preprocessor(df):
+    # 目标变量保持原值, 其余数值列参与填充和标准化
+    return Preprocessor(df.drop(columns='target', errors='ignore').select_dtypes(include=[np.number]).columns)
+
+# 标准化后的特征以 float32 保存, 精度足够训练且内存减半
+FEATURE_DTYPE = np.float32
+
+def _apply_preprocessor(df, preprocessor):
+    """
+    删除全部缺失的列, 对其余特征列填充缺失值并标准化
+
+    特征列只转换为一个二维数组并原地变换, 其余列不复制
+    """
+    df = df.drop(columns=[col for col in preprocessor.empty_columns if col in df.columns])
+    columns = preprocessor.fitted_columns
+    values = preprocessor.transform_array(df[columns].to_numpy(dtype=np.float64, copy=True), copy=False)
+    df[columns] = values.astype(FEATURE_DTYPE)
+    return df
+
+def _year_as_category(df, dtype='category'):
+    # 如果存在 'year' 列，将其转换为类别型; 整体和分块处理都经过这里, 输出类型一致
+    if 'year' in df.columns:
+        df['year'] = df['year'].astype(dtype)
+    return df
+
+def _year_dtype(input_path, chunksize, preprocessor):
+    """
+    分块处理时 'year' 列的类别型
+
+    单独读一遍 'year' 列收集取值并按 preprocessor 变换, 各块使用同一组类别(Arrow 文件每列只能有一个字典),
+    与整表处理得到的类别相同
+    """
+    values = pd.concat([chunk['year'].drop_duplicates()
+                        for chunk in iter_dataset(input_path, columns=['year'], chunksize=chunksize)])
+    if 'year' in preprocessor.fitted_columns:
+        i = preprocessor.fitted_columns.index('year')
+        mean, scale = preprocessor.mean[i], preprocessor.scale[i]
+        values = ((values.astype(np.float64).fillna(mean) - mean) / scale).astype(FEATURE_DTYPE)
+    return pd.CategoricalDtype(np.sort(values.dropna().unique()))
+
+def preprocess_frame(df, selected_variables=None, preprocessor=None):
+    """
+    在内存中预处理一个 DataFrame(如预览模式的样本), 返回 (处理后的数据, Preprocessor)
+
+    没有传入 preprocessor 时在 df 上拟合
+    """
+    df = _select_columns(df, selected_variables)
+    if preprocessor is None:
+        with stage("preprocess.fit", rows=len(df)):
+            preprocessor = _new_preprocessor(df).partial_fit(df)
+    with stage("preprocess.transform", rows=len(df)):
+        df = _apply_preprocessor(df, preprocessor)
+    return df, preprocessor
+
+def _preprocess_data_chunked(input_path, output_path, selected_variables, chunksize, preprocessor):
+    """
+    两遍分块处理: 第一遍累积统计量, 第二遍填充、标准化并逐块追加写出
+    """
+    usecols = selected_variables + ['target'] if selected_variables else None
+
+    # 第一遍: 收集每列的均值和方差, 已有拟合好的 preprocessor 时跳过
+    if preprocessor is None:
+        with stage("preprocess.fit"):
+            for chunk in timed_iter("preprocess.read", iter_dataset(input_path, columns=usecols,
+                                                                    chunksize=chunksize)):
+                chunk = _select_columns(chunk, selected_variables)
+                if preprocessor is None:
+                    preprocessor = _new_preprocessor(chunk)
+                preprocessor.partial_fit(chunk)
+        if preprocessor is None:
+            raise ValueError(f"输入文件没有数据: {input_path}")
+
+    year_dtype = 'category'
+    if 'year' in read_columns(input_path) and (not selected_variables or 'year' in selected_variables):
+        year_dtype = _year_dtype(input_path, chunksize, preprocessor)
+
+    # 第二遍: 填充、标准化并追加写出
+    with stage("preprocess.transform") as timer:
+        with DatasetWriter(output_path) as writer:
+            for chunk in timed_iter("preprocess.read", iter_dataset(input_path, columns=usecols,
+                                                                    chunksize=chunksize)):
+                chunk = _apply_preprocessor(_select_columns(chunk, selected_variables), preprocessor)
+                writer.write(_year_as_category(chunk, year_dtype))
+                timer.add(rows=len(chunk))
+        timer.add(bytes_written=dataset_size(output_path))
+    return preprocessor
+
+def preprocess_data(input_path, output_path, selected_variables=None, chunksize=None, preprocessor=None):
+    """
+    对数据进行预处理, 返回拟合好的 Preprocessor 供推理和后续增量更新复用
+
+    指定 chunksize 时按固定行数分块流式处理, 峰值内存只取决于块大小;
+    传入已拟合的 preprocessor 时不再重新拟合, 只做变换
+    """
+    if chunksize:
+        preprocessor = _preprocess_data_chunked(input_path, output_path, selected_variables, chunksize,
+                                                preprocessor)
+        print(f"预处理后的数据已保存到 {output_path}")
+        return preprocessor
+
+    # 读取数据, 提供了选定的变量时只读取这些变量
+    usecols = selected_variables + ['target'] if selected_variables else None
+    with stage("preprocess.read", bytes_read=dataset_size(input_path)) as timer:
+        df, report = read_optimized(input_path, columns=usecols)
+        timer.add(rows=len(df))
+    print(f"{input_path}: {format_report(report)}")
     
-    # 标准化数值特征
-    scaler = StandardScaler()
-    numeric_columns = df_imputed.select_dtypes(include=['float64', 'int64']).columns
-    df_imputed[numeric_columns] = scaler.fit_transform(df_imputed[numeric_columns])
+    # 处理缺失值并标准化数值特征, 目标变量保持原值
+    df_imputed, preprocessor = preprocess_frame(df, selected_variables, preprocessor)
     
-    # 如果存在 'year' 列，将其转换为类别型
-    if 'year' in df_imputed.columns:
-        df_imputed['year'] = df_imputed['year'].astype('category')
+    df_imputed = _year_as_category(df_imputed)
     
     # 保存处理后的数据
-    df_imputed.to_csv(output_path, index=False)
+    with stage("preprocess.write", rows=len(df_imputed)) as timer:
+        write_dataset(df_imputed, output_path)
+        timer.add(bytes_written=dataset_size(output_path))
     print(f"预处理后的数据已保存到 {output_path}")
+    return preprocessor
+
+def preprocess_to_matrix(input_path, directory, selected_variables=None, chunksize=None, preprocessor=None,
+                         dtype=FEATURE_DTYPE, shuffle=True, random_state=42):
+    """
+    预处理数据并直接写成 directory 下的共享特征矩阵(见 FeatureMatrix), 返回 (矩阵, Preprocessor)
+
+    第一遍累积统计量并计数(已有 preprocessor 时只读 target 列计数), 第二遍把变换后的特征块写入预先
+    分配的内存映射文件, 不生成完整的 DataFrame, 也不经过数据集文件往返; 峰值内存只取决于块大小。
+    shuffle=True 时各行写到随机排列的位置, 训练时可以直接用连续的行区间划分留出集和交叉验证的折
+    """
+    chunksize = chunksize or 100000
+    usecols = selected_variables + ['target'] if selected_variables else None
+    fit = preprocessor is None
+    n_rows, target_dtype = 0, None
+    with stage("preprocess.fit"):
+        for chunk in timed_iter("preprocess.read", iter_dataset(
+                input_path, columns=usecols if fit else ['target'], chunksize=chunksize)):
+            if fit:
+                chunk = _select_columns(chunk, selected_variables)
+                if preprocessor is None:
+                    preprocessor = _new_preprocessor(chunk)
+                preprocessor.partial_fit(chunk)
+            n_rows += len(chunk)
+            target_dtype = chunk['target'].dtype if target_dtype is None else np.result_type(
+                target_dtype, chunk['target'].dtype)
+    if preprocessor is None:
+        raise ValueError(f"输入文件没有数据: {input_path}")
+
+    columns = preprocessor.fitted_columns
+    positions = shuffled_positions(n_rows, random_state) if shuffle else None
+    with stage("preprocess.transform") as timer:
+        writer = MatrixWriter(directory, columns, n_rows, dtype=dtype, target_dtype=target_dtype,
+                              positions=positions, source=input_path)
+        try:
+            for chunk in timed_iter("preprocess.read", iter_dataset(input_path, columns=columns + ['target'],
+                                                                    chunksize=chunksize)):
+                values = preprocessor.transform_array(chunk[columns].to_numpy(dtype=np.float64, copy=True),
+                                                      copy=False)
+                writer.write(values, chunk['target'].to_numpy())
+                timer.add(rows=len(chunk))
+        except BaseException:
+            writer.discard()
+            raise
+        matrix = writer.close()
+        timer.add(bytes_written=matrix.nbytes)
+    print(f"预处理后的特征矩阵已保存到 {directory}")
+    return matrix, preprocessor
 
 if __name__ == "__main__":
-    input_path = "data/raw/bigdata.csv"
-    output_path = "data/processed/preprocessed_data.csv"
+    input_path = "data/raw/bigdata.parquet"
+    output_path = dataset_path("data/processed", "preprocessed_data")
     preprocess_data(input_path, output_path)
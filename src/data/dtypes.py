@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from .storage import read_dataset, read_schema
+
+# 字符串列的不同取值超过该数量时不再记录取值, 视为高基数列
+MAX_CATEGORIES = 1000
+
+# float32 能精确表示的最大整数
+_FLOAT32_EXACT_INT = 2 ** 24
+
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+def _kind(series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return 'category'
+    if dtype.kind in 'iu':
+        return 'int'
+    if dtype.kind == 'f':
+        return 'float'
+    if dtype.kind == 'b':
+        return 'bool'
+    if pd.api.types.is_string_dtype(dtype):
+        return 'str'
+    return 'other'
+
+def _merge_kind(a, b):
+    if a is None or a == b:
+        return b
+    if {a, b} == {'int', 'float'}:
+        return 'float'
+    return 'other'
+
+def profile_column(series, profile=None):
+    """
+    累积一列的类型、取值范围、是否全为整数、转为 float32 的最大相对误差和低基数取值集合, 可以逐块调用
+    """
+    if profile is None:
+        profile = {"kind": None, "rows": 0, "count": 0, "min": None, "max": None,
+                   "integral": True, "float32_error": 0.0, "values": []}
+    profile["kind"] = _merge_kind(profile["kind"], _kind(series))
+    profile["rows"] += len(series)
+    values = series.dropna()
+    profile["count"] += len(values)
+    if not len(values):
+        return profile
+
+    if profile["kind"] in ('int', 'float'):
+        array = values.to_numpy()
+        lo, hi = float(array.min()), float(array.max())
+        profile["min"] = lo if profile["min"] is None else min(profile["min"], lo)
+        profile["max"] = hi if profile["max"] is None else max(profile["max"], hi)
+        if profile["integral"] and array.dtype.kind == 'f':
+            profile["integral"] = bool(np.all(np.isfinite(array)) and np.all(np.mod(array, 1) == 0))
+        # 绝对值不超过 2**24 的整数能被 float32 精确表示, 不需要逐个检查
+        if profile.get("float32_error") is not None and (
+                array.dtype.kind == 'f' or max(abs(lo), abs(hi)) > _FLOAT32_EXACT_INT):
+            profile["float32_error"] = max(profile["float32_error"], _float32_error(array))
+    elif profile["kind"] in ('str', 'category') and profile["values"] is not None:
+        seen = set(profile["values"]).union(str(v) for v in values.unique())
+        profile["values"] = sorted(seen) if len(seen) <= MAX_CATEGORIES else None
+    return profile
+
+def _float32_error(array):
+    """取值转为 float32 再转回后的最大相对误差; 超出 float32 范围时为 inf"""
+    array = array.astype(np.float64)
+    array = array[np.isfinite(array)]
+    with np.errstate(over='ignore', invalid='ignore'):
+        diff = np.abs(array.astype(np.float32).astype(np.float64) - array)
+    error = np.divide(diff, np.abs(array), out=np.zeros_like(diff), where=array != 0)
+    return float(error.max()) if len(error) else 0.0
+
+def _smallest_int(lo, hi):
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype).name
+    return 'int64'
+
+def plan_from_profiles(profiles, float_tolerance=0, category_ratio=0.5):
+    """
+    根据列的统计信息决定目标类型, 返回 {列名: dtype}; 不需要改变的列不出现在结果中
+
+    - 整数列降为能容纳取值范围的最小整数类型
+    - 浮点列在实际转换的最大相对误差不超过 float_tolerance 时降为 float32; 默认不允许误差,
+      只有能被 float32 精确表示的列(如取值全为整数且绝对值不超过 2**24)才会降级
+    - 不同取值数不超过非空行数 category_ratio 倍的字符串列转为 category
+    """
+    plan = {}
+    for col, p in profiles.items():
+        if p["kind"] == 'int' and p["min"] is not None:
+            plan[col] = _smallest_int(p["min"], p["max"])
+        elif p["kind"] == 'float' and p["min"] is not None:
+            error = p.get("float32_error")
+            if error is None:
+                # 旧版本生成的统计信息没有记录误差, 只按整数规则判断
+                bound = max(abs(p["min"]), abs(p["max"]))
+                error = 0.0 if p["integral"] and bound <= _FLOAT32_EXACT_INT else float('inf')
+            if error <= float_tolerance:
+                plan[col] = 'float32'
+        elif p["kind"] == 'str' and p["values"] is not None and p["count"]:
+            if len(p["values"]) <= category_ratio * p["count"]:
+                plan[col] = 'category'
+    return plan
+
+def plan_dtypes(df, float_tolerance=0, category_ratio=0.5, exclude=()):
+    """
+    为数据框中的每列规划更紧凑的类型
+    """
+    profiles = {col: profile_column(df[col]) for col in df.columns if col not in exclude}
+    return plan_from_profiles(profiles, float_tolerance, category_ratio)
+
+def apply_dtypes(df, plan):
+    """
+    按计划逐列转换类型; 只替换需要转换的列, 不复制整个数据框
+    """
+    df = df.copy(deep=False)
+    for col, dtype in plan.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        # 计划与数据不符(整数列出现缺失值)时保留原类型
+        if dtype != 'category' and np.dtype(dtype).kind in 'iu' and df[col].isna().any():
+            continue
+        df[col] = df[col].astype(dtype)
+    return df
+
+def memory_usage(df):
+    """数据框占用的内存(字节), 包括字符串对象"""
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+def optimize_dtypes(df, plan=None, **kwargs):
+    """
+    规划并应用紧凑类型, 返回 (新数据框, 内存报告)
+    """
+    before = memory_usage(df)
+    if plan is None:
+        plan = plan_dtypes(df, **kwargs)
+    optimized = apply_dtypes(df, plan)
+    changed = {col: [str(df[col].dtype), str(optimized[col].dtype)] for col in df.columns
+               if df[col].dtype != optimized[col].dtype}
+    after = memory_usage(optimized)
+    return optimized, {"before_bytes": before, "after_bytes": after,
+                "ratio": before / after if after else 1.0, "columns": changed}
+
+def read_optimized(path, columns=None, **kwargs):
+    """
+    读取数据集并转换为紧凑类型, 返回 (数据框, 内存报告)
+
+    数据集有导入时生成的 schema 文件时直接使用其中基于全量数据的类型计划
+    """
+    df = read_dataset(path, columns=columns)
+    schema = read_schema(path)
+    plan = schema.get("dtype_plan") if schema else None
+    if plan is not None:
+        plan = {col: dtype for col, dtype in plan.items() if col in df.columns}
+    return optimize_dtypes(df, plan, **kwargs)
+
+def format_report(report):
+    return (f"内存占用 {report['before_bytes'] / 1024 ** 2:.1f} MB -> "
+            f"{report['after_bytes'] / 1024 ** 2:.1f} MB ({report['ratio']:.1f}x)")
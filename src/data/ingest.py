@@ -0,0 +1,244 @@
+import io
+import os
+import csv
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import numpy as np
+import pandas as pd
+from .dtypes import plan_from_profiles, profile_column
+from .storage import dataset_path, write_dataset, write_schema
+
+_TEXT_DTYPES = ("object", "str", "string")
+
+class IngestError(ValueError):
+    """上传的数据没有通过校验"""
+
+class UploadTooLarge(IngestError):
+    """上传的文件超过大小上限"""
+
+class CsvIngestor:
+    """
+    增量解析 CSV 字节流: 每次只解析到最后一个完整行, 写成一个列式分区文件,
+    并累积 schema(列名、类型)、行数、每列缺失值数和基于全量数据的紧凑类型计划
+
+    列类型由第一段数据推断, 之后的数据按该类型解析; 整数列遇到缺失值时提升为浮点
+    注意: 按换行符切分, 不支持带换行的引号字段
+    """
+    def __init__(self, output_dir, state=None):
+        self.output_dir = output_dir
+        self.state = state or {"columns": None, "dtypes": None, "parsed_offset": 0,
+                               "parts": 0, "row_count": 0, "null_counts": None, "profiles": {}}
+
+    def feed(self, data, final=False):
+        """
+        解析 data(从 parsed_offset 开始的字节), 返回本次消费的字节数
+        """
+        end = len(data) if final else data.rfind(b"\n") + 1
+        if end <= 0:
+            return 0
+        segment = data[:end]
+        if self.state["columns"] is None:
+            df = self._parse_header_segment(segment)
+            if not len(df) and not final:
+                # 只有表头时无法推断类型, 等待更多数据
+                self.state["columns"] = None
+                return 0
+        else:
+            df = self._parse_segment(segment)
+        if len(df):
+            self._write_part(df)
+        self.state["parsed_offset"] += end
+        return end
+
+    def _parse_header_segment(self, segment):
+        try:
+            df = pd.read_csv(io.BytesIO(segment))
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            raise IngestError(f"无法解析 CSV: {e}")
+        # pandas 会自动改名重复和空的列名, 这里按原始表头校验
+        header = next(csv.reader([segment.split(b"\n", 1)[0].decode("utf-8", errors="replace").rstrip("\r")]))
+        if len(set(header)) != len(header) or not all(name.strip() for name in header):
+            raise IngestError(f"CSV 表头包含重复或空的列名: {header}")
+        self.state["columns"] = [str(c) for c in df.columns]
+        self.state["dtypes"] = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        self.state["null_counts"] = {col: 0 for col in self.state["columns"]}
+        return df
+
+    def _parse_segment(self, segment):
+        columns = self.state["columns"]
+        dtypes = self.state["dtypes"]
+        text_columns = {col: str for col in columns if dtypes[col] in _TEXT_DTYPES}
+        try:
+            df = pd.read_csv(io.BytesIO(segment), header=None, names=columns, dtype=text_columns)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            raise IngestError(f"无法解析 CSV: {e}")
+        for col in columns:
+            if col in text_columns or str(df[col].dtype) == dtypes[col]:
+                continue
+            expected = np.dtype(dtypes[col])
+            actual = df[col].dtype
+            if df[col].isna().all() or (expected.kind in "iu" and actual.kind == "f"):
+                # 整数列出现缺失值或小数时提升为浮点
+                if expected.kind != "f":
+                    dtypes[col] = "float64"
+            elif expected.kind in "iuf" and actual.kind not in "iuf":
+                raise IngestError(f"列 {col} 应为数值类型, 但出现了非数值内容")
+            try:
+                df[col] = df[col].astype(dtypes[col])
+            except (TypeError, ValueError) as e:
+                raise IngestError(f"列 {col} 无法转换为 {dtypes[col]}: {e}")
+        return df
+
+    def _write_part(self, df):
+        os.makedirs(self.output_dir, exist_ok=True)
+        write_dataset(df, dataset_path(self.output_dir, f"part-{self.state['parts']:06d}"))
+        self.state["parts"] += 1
+        self.state["row_count"] += len(df)
+        for col, n in df.isna().sum().items():
+            self.state["null_counts"][col] += int(n)
+        for col in df.columns:
+            self.state["profiles"][col] = profile_column(df[col], self.state["profiles"].get(col))
+
+    def schema(self):
+        return {"columns": self.state["columns"], "dtypes": self.state["dtypes"],
+                "row_count": self.state["row_count"], "null_counts": self.state["null_counts"],
+                "dtype_plan": plan_from_profiles(self.state["profiles"])}
+
+def ingest_file(input_path, output_dir, block_size=64 * 1024 ** 2):
+    """
+    分块读取本地 CSV 文件并转换为列式分区数据集, 同时写出 schema 和统计信息
+    """
+    with open(input_path, "rb") as f:
+        return ingest_stream(f, output_dir, block_size)
+
+def ingest_stream(stream, output_dir, block_size=64 * 1024 ** 2):
+    """
+    从二进制流(如上传请求中的文件)分块读取 CSV 并转换为列式分区数据集, 不先把整个文件保存到磁盘
+    """
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    ingestor = CsvIngestor(output_dir)
+    buffer = b""
+    while True:
+        block = stream.read(block_size)
+        buffer += block
+        consumed = ingestor.feed(buffer, final=not block)
+        buffer = buffer[consumed:]
+        if not block:
+            break
+    schema = ingestor.schema()
+    write_schema(output_dir, schema)
+    return output_dir, schema
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+class UploadSession:
+    """
+    可续传、可并行的分块上传
+
+    客户端可以按任意顺序、并发地上传 [offset, offset + len) 的字节块; 已连续到达的
+    前缀会立即解析并转换为列式数据集, 全部到达后写出 schema 文件。
+    会话状态保存在 upload_dir 下, 并用文件锁保证多个 worker 并发写入时的一致性
+    """
+    def __init__(self, upload_dir, upload_id):
+        self.upload_dir = upload_dir
+        self.upload_id = upload_id
+        self.data_path = os.path.join(upload_dir, f"{upload_id}.part")
+        self.state_path = os.path.join(upload_dir, f"{upload_id}.json")
+        self.lock_path = os.path.join(upload_dir, f"{upload_id}.lock")
+
+    @classmethod
+    def create(cls, upload_dir, filename, total_size, output_dir, max_size=None):
+        """
+        创建上传会话并按 total_size 预分配文件; total_size 由客户端提供, 超过 max_size 时拒绝
+        """
+        if max_size is not None and total_size > max_size:
+            raise UploadTooLarge(f"文件大小 {total_size} 字节超过上限 {max_size} 字节")
+        os.makedirs(upload_dir, exist_ok=True)
+        session = cls(upload_dir, uuid.uuid4().hex)
+        with open(session.data_path, "wb") as f:
+            f.truncate(total_size)
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        session._save({"id": session.upload_id, "filename": filename, "total_size": total_size,
+                       "output_path": os.path.join(output_dir, stem), "received": [],
+                       "state": "uploading", "error": None, "ingest": None, "created_at": time.time()})
+        return session
+
+    def _load(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(self.upload_id)
+
+    def _save(self, state):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def status(self):
+        state = self._load()
+        received = sum(end - start for start, end in state["received"])
+        status = {k: state[k] for k in ("id", "filename", "total_size", "received", "state", "error")}
+        status.update(bytes_received=received, path=state["output_path"])
+        if state["ingest"]:
+            status.update(rows_parsed=state["ingest"]["row_count"], parsed_offset=state["ingest"]["parsed_offset"])
+            if state["state"] == "complete":
+                status["schema"] = CsvIngestor(None, state["ingest"]).schema()
+        return status
+
+    def write_chunk(self, offset, data):
+        """
+        写入一个字节块, 然后解析已连续到达的部分, 返回最新状态
+        """
+        state = self._load()
+        if state["state"] != "uploading":
+            raise IngestError(f"上传已结束, 状态为 {state['state']}")
+        if offset < 0 or offset + len(data) > state["total_size"]:
+            raise IngestError("字节块超出文件大小")
+
+        fd = os.open(self.data_path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+
+        with open(self.lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self._load()
+            state["received"] = _merge_ranges(state["received"] + [[offset, offset + len(data)]])
+            try:
+                self._ingest_available(state)
+            except IngestError as e:
+                state["state"], state["error"] = "failed", str(e)
+            self._save(state)
+        return self.status()
+
+    def _ingest_available(self, state):
+        if state["ingest"] is None and os.path.isdir(state["output_path"]):
+            shutil.rmtree(state["output_path"])
+        ingestor = CsvIngestor(state["output_path"], state["ingest"])
+        start = ingestor.state["parsed_offset"]
+        first = state["received"][0] if state["received"] else None
+        if first is None or first[0] != 0 or first[1] <= start:
+            return
+        final = first[1] == state["total_size"]
+        with open(self.data_path, "rb") as f:
+            f.seek(start)
+            ingestor.feed(f.read(first[1] - start), final=final)
+        state["ingest"] = ingestor.state
+        if final:
+            write_schema(state["output_path"], ingestor.schema())
+            state["state"] = "complete"
+            os.remove(self.data_path)
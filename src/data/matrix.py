@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# 共享特征矩阵目录中的文件, 元数据最后写出, 存在即表示矩阵完整
+_FEATURES = "X.npy"
+_TARGET = "y.npy"
+_META = "matrix.json"
+
+class FeatureMatrix:
+    """
+    各流水线阶段共用的特征矩阵: directory 下行优先连续存储的 X.npy、目标 y.npy 和列名等元数据
+
+    以只读内存映射方式打开, 预处理、训练、交叉验证的工作进程和可视化读取的是同一份页缓存,
+    各阶段之间只传递列名和行区间, 不复制数据
+    """
+    def __init__(self, directory, X, y, meta):
+        self.directory = directory
+        self.X = X
+        self.y = y
+        self.meta = meta
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, _META))
+
+    @classmethod
+    def open(cls, directory, mmap_mode="r"):
+        with open(os.path.join(directory, _META), encoding="utf-8") as f:
+            meta = json.load(f)
+        X = np.load(os.path.join(directory, _FEATURES), mmap_mode=mmap_mode)
+        y = np.load(os.path.join(directory, _TARGET), mmap_mode=mmap_mode)
+        return cls(directory, X, y, meta)
+
+    @property
+    def columns(self):
+        return self.meta["columns"]
+
+    @property
+    def n_rows(self):
+        return self.meta["n_rows"]
+
+    @property
+    def shuffled(self):
+        """行是否在写出时随机重排过; 重排过的矩阵可以直接用连续的行区间划分训练集和测试集"""
+        return self.meta.get("shuffled", False)
+
+    @property
+    def files(self):
+        return [os.path.join(self.directory, name) for name in (_FEATURES, _TARGET, _META)]
+
+    @property
+    def nbytes(self):
+        return int(self.X.nbytes + self.y.nbytes)
+
+    def features(self, rows=slice(None)):
+        """特征列的 DataFrame 视图, rows 为切片时不复制数据"""
+        return pd.DataFrame(self.X[rows], columns=self.columns, copy=False)
+
+    def target(self, rows=slice(None)):
+        return pd.Series(self.y[rows], name="target", copy=False)
+
+    def frame(self, rows=slice(None)):
+        """特征列加 target 列的 DataFrame, 特征部分仍是矩阵的视图"""
+        df = self.features(rows)
+        df["target"] = self.y[rows]
+        return df
+
+class MatrixWriter:
+    """
+    分块写出 FeatureMatrix; 给定 positions 时第 i 个输入行写到 positions[i] 行(用于行重排)
+
+    矩阵文件预先按 n_rows 分配, 写入时不在内存中拼接数据块; 文件先写在 directory 旁的临时目录中,
+    close 时才移到 directory, 读取方不会打开写到一半的矩阵
+    """
+    def __init__(self, directory, columns, n_rows, dtype=np.float32, target_dtype=np.int64, positions=None,
+                 **meta):
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        self.directory = directory
+        self.columns = list(columns)
+        self.positions = positions
+        self.meta = meta
+        self.n_rows = n_rows
+        self._tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(directory)}.", dir=parent)
+        self._X = np.lib.format.open_memmap(os.path.join(self._tmp_dir, _FEATURES), mode="w+", dtype=dtype,
+                                            shape=(n_rows, len(self.columns)))
+        self._y = np.lib.format.open_memmap(os.path.join(self._tmp_dir, _TARGET), mode="w+", dtype=target_dtype,
+                                            shape=(n_rows,))
+        self._offset = 0
+
+    def write(self, X, y):
+        """按输入顺序追加一块特征(二维数组)和目标"""
+        end = self._offset + len(X)
+        rows = slice(self._offset, end) if self.positions is None else self.positions[self._offset:end]
+        self._X[rows] = X
+        self._y[rows] = y
+        self._offset = end
+
+    def close(self):
+        if self._offset != self.n_rows:
+            self.discard()
+            raise ValueError(f"写入了 {self._offset} 行, 预期 {self.n_rows} 行")
+        self._X.flush()
+        self._y.flush()
+        self._X = self._y = None
+        meta = dict(self.meta, columns=self.columns, n_rows=int(self.n_rows),
+                    shuffled=self.positions is not None)
+        with open(os.path.join(self._tmp_dir, _META), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        _publish(self._tmp_dir, self.directory)
+        return FeatureMatrix.open(self.directory)
+
+    def discard(self):
+        """放弃写入, 删除临时目录"""
+        self._X = self._y = None
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+def _publish(tmp_dir, directory):
+    """
+    把写完的临时目录移到 directory: 目录不存在(或为空)时整体重命名; 已有其他文件时(如调参目录中的试验记录)
+    先删除旧的元数据, 再逐个替换数据文件, 最后放入新的元数据, 读取方只在元数据存在时打开矩阵
+    """
+    try:
+        os.replace(tmp_dir, directory)
+        return
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    try:
+        os.remove(os.path.join(directory, _META))
+    except FileNotFoundError:
+        pass
+    for name in (_FEATURES, _TARGET, _META):
+        os.replace(os.path.join(tmp_dir, name), os.path.join(directory, name))
+    os.rmdir(tmp_dir)
+
+def shuffled_positions(n_rows, random_state=42):
+    """随机重排的写入位置, 相同的 random_state 得到相同的排列"""
+    return np.random.default_rng(random_state).permutation(n_rows)
@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+from .aggregation import DatasetSummary
+from .sketches import TDigest, HyperLogLog
+from .storage import iter_dataset
+
+# 正态分布 95% 置信水平对应的分位数
+Z_95 = 1.959963984540054
+
+_KEY = "__sample_key"
+_STRATUM = "__stratum"
+
+class StratifiedSample:
+    """
+    单遍流式分层抽样: 每行分配一个随机键, 按分层变量(如 target、year)的各层总行数成比例分配样本量
+
+    各层在流中的比例事先未知, 因此同时保留整体键最小的 size * oversample 行和每层键最小的
+    min_per_stratum 行, 二者并集对每一层都是按键排序的前缀, 取每层键最小的若干行即该层的均匀样本。
+    内存只取决于 size 和层数, 与数据总行数无关
+    """
+    def __init__(self, size, stratify=(), min_per_stratum=10, oversample=1.2, random_state=0):
+        self.size = size
+        self.stratify = list(stratify)
+        self.min_per_stratum = min_per_stratum
+        self.capacity = int(size * oversample) + 1
+        self._rng = np.random.default_rng(random_state)
+        self.n_rows = 0
+        self.strata_sizes = pd.Series(dtype=np.int64)
+        self._pool = None
+        self._threshold = np.inf
+        self._stratum_thresholds = pd.Series(dtype=np.float64)
+
+    def _strata(self, chunk):
+        if not self.stratify:
+            return np.zeros(len(chunk), dtype=np.uint64)
+        return pd.util.hash_pandas_object(chunk[self.stratify], index=False).to_numpy()
+
+    def update(self, chunk):
+        self.n_rows += len(chunk)
+        strata = self._strata(chunk)
+        self.strata_sizes = self.strata_sizes.add(pd.Series(strata).value_counts(), fill_value=0).astype(np.int64)
+        keys = self._rng.random(len(chunk))
+
+        # 键不小于整体阈值且不小于所在层阈值的行不可能进入样本, 先过滤掉再合并
+        thresholds = pd.Series(strata).map(self._stratum_thresholds).fillna(np.inf).to_numpy()
+        keep = keys < np.maximum(self._threshold, thresholds)
+        if not keep.any():
+            return self
+        rows = chunk[keep].assign(**{_KEY: keys[keep], _STRATUM: strata[keep]})
+        pool = rows if self._pool is None else pd.concat([self._pool, rows], ignore_index=True)
+        pool = pool.sort_values(_KEY, ignore_index=True)
+        within = pool.groupby(_STRATUM, sort=False).cumcount().to_numpy()
+        pool = pool[(np.arange(len(pool)) < self.capacity) | (within < self.min_per_stratum)]
+        within = within[pool.index]
+        self._pool = pool.reset_index(drop=True)
+
+        if len(self._pool) >= self.capacity:
+            self._threshold = self._pool[_KEY].iloc[self.capacity - 1]
+        full = self._pool[within == self.min_per_stratum - 1]
+        self._stratum_thresholds = pd.Series(full[_KEY].to_numpy(), index=full[_STRATUM].to_numpy())
+        return self
+
+    def allocation(self, available=None):
+        """
+        各层的样本量: 按层大小成比例(最大余数法取整), 每层至少 min_per_stratum 行, 总数为 size
+
+        available 为各层保留的候选行数; 随机波动使某层候选不足时取其全部候选,
+        差额分给仍有候选的层
+        """
+        sizes = self.strata_sizes
+        if sizes.empty:
+            return sizes
+        available = sizes if available is None else np.minimum(available.reindex(sizes.index, fill_value=0), sizes)
+        total = min(self.size, self.n_rows)
+        exact = sizes * total / self.n_rows
+        alloc = np.floor(exact).astype(np.int64)
+        remainder = int(total - alloc.sum())
+        if remainder > 0:
+            alloc[(exact - alloc).sort_values(ascending=False).index[:remainder]] += 1
+        floor = np.minimum(self.min_per_stratum, available)
+        alloc = np.minimum(np.maximum(alloc, floor), available)
+        # 保底行数和候选不足会使总数偏离 total, 按与精确比例的差距逐行调整
+        diff = int(total - alloc.sum())
+        while diff > 0 and (alloc < available).any():
+            spare = (exact - alloc)[alloc < available].sort_values(ascending=False).index[:diff]
+            alloc[spare] += 1
+            diff -= len(spare)
+        while diff < 0 and (alloc > floor).any():
+            surplus = (alloc - exact)[alloc > floor].sort_values(ascending=False).index[:-diff]
+            alloc[surplus] -= 1
+            diff += len(surplus)
+        return alloc
+
+    def sample(self):
+        """返回样本 DataFrame, 列与输入的数据块相同"""
+        if self._pool is None:
+            return pd.DataFrame()
+        pool = self._pool
+        within = pool.groupby(_STRATUM, sort=False).cumcount().to_numpy()
+        quota = pool[_STRATUM].map(self.allocation(pool[_STRATUM].value_counts())).to_numpy()
+        return pool[within < quota].drop(columns=[_KEY, _STRATUM]).reset_index(drop=True)
+
+class PreviewSummary(DatasetSummary):
+    """
+    快速预览用的近似单遍聚合, 接口与 DatasetSummary 相同, 可直接用于生成图表
+
+    - 计数、均值、最值、分组均值和取值计数仍是精确的流式统计(每行 O(列数))
+    - 分位数来自每列一个 t-digest, 去重计数来自 HyperLogLog
+    - 相关系数在分层样本上计算, 并给出 Fisher z 置信区间, 避免逐块累积 O(列数^2) 的矩阵
+    - 分层样本同时用于在预览模式下训练模型
+
+    distinct 为需要去重计数的列, True 表示所有汇总的数值列
+    """
+    def __init__(self, columns=None, group_by=None, value_counts=(), stratify=(), distinct=(),
+                 sample_size=100000, correlation_rows=20000, compression=200, precision=14, random_state=0):
+        super().__init__(columns, group_by=group_by, value_counts=value_counts, correlation=False,
+                         sample_size=0, random_state=random_state)
+        self.sampler = StratifiedSample(sample_size, stratify, random_state=random_state)
+        self.distinct_columns = distinct if distinct is True else list(distinct)
+        self.correlation_rows = correlation_rows
+        self.compression = compression
+        self.precision = precision
+        self.digests = {}
+        self.sketches = {}
+        self._sample_frame = None
+
+    def _initialize(self, chunk):
+        super()._initialize(chunk)
+        self.digests = {col: TDigest(self.compression) for col in self.columns}
+        if self.distinct_columns is True:
+            self.distinct_columns = list(self.columns)
+        self.sketches = {col: HyperLogLog(self.precision) for col in self.distinct_columns}
+
+    def update(self, chunk):
+        super().update(chunk)
+        for col, digest in self.digests.items():
+            digest.update(chunk[col].to_numpy(dtype=np.float64))
+        for col, sketch in self.sketches.items():
+            sketch.update(chunk[col])
+        self.sampler.update(chunk)
+        self._sample_frame = None
+        return self
+
+    @property
+    def sample(self):
+        if self._sample_frame is None:
+            self._sample_frame = self.sampler.sample()
+        return self._sample_frame
+
+    def _correlation_input(self):
+        # 样本按随机键排序, 前 correlation_rows 行仍是均匀的子样本
+        sample = self.sample.head(self.correlation_rows)
+        if sample.empty:
+            return np.empty((0, len(self.columns)))
+        return sample[self.columns].to_numpy(dtype=np.float64)
+
+    def correlation(self):
+        """在样本上计算的成对完整观测相关系数"""
+        values = self._correlation_input()
+        return pd.DataFrame(values, columns=self.columns).corr()
+
+    def correlation_interval(self, z=Z_95):
+        """相关系数的 Fisher z 置信区间, 返回 (下限, 上限) 两个 DataFrame"""
+        values = self._correlation_input()
+        mask = (~np.isnan(values)).astype(np.float64)
+        n = mask.T @ mask
+        corr = pd.DataFrame(values, columns=self.columns).corr().to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            center = np.arctanh(np.clip(corr, -0.999999, 0.999999))
+            half = z / np.sqrt(n - 3)
+            low, high = np.tanh(center - half), np.tanh(center + half)
+        low[n <= 3], high[n <= 3] = -1.0, 1.0
+        np.fill_diagonal(low, np.diag(corr))
+        np.fill_diagonal(high, np.diag(corr))
+        return (pd.DataFrame(low, index=self.columns, columns=self.columns),
+                pd.DataFrame(high, index=self.columns, columns=self.columns))
+
+    def quantiles(self, q):
+        """基于 t-digest 的各列近似分位数, 行索引为分位点"""
+        q = np.atleast_1d(q)
+        values = {col: self.digests[col].quantile(q) for col in self.columns}
+        return pd.DataFrame(values, index=q, columns=self.columns)
+
+    def distinct_counts(self):
+        """HyperLogLog 估计的各列去重个数"""
+        return pd.Series({col: sketch.count() for col, sketch in self.sketches.items()}, dtype=np.float64)
+
+    def error_bounds(self, z=Z_95):
+        """
+        汇总各近似量的误差: 分位数的秩误差、去重计数的相对误差和相关系数置信区间的最大半宽
+        """
+        q = np.array([0.25, 0.5, 0.75])
+        bounds = {
+            "total_rows": int(self.n_rows),
+            "sample_rows": int(len(self.sample)),
+            "exact": ["count", "mean", "min", "max", "group_means", "value_counts"],
+        }
+        if self.digests:
+            errors = next(iter(self.digests.values())).rank_error(q)
+            bounds["quantile_rank_error"] = {str(p): float(e) for p, e in zip(q, errors)}
+        if self.sketches:
+            bounds["distinct_count_relative_error"] = float(z * 1.04 / np.sqrt(1 << self.precision))
+        if len(self.columns) > 1 and len(self.sample):
+            low, high = self.correlation_interval(z)
+            width = (high - low).to_numpy() / 2
+            bounds["correlation_ci_halfwidth"] = float(np.nanmax(width[~np.eye(len(self.columns), dtype=bool)]))
+        return bounds
+
+def preview_dataset(path, columns=None, group_by=None, value_counts=(), stratify=(), distinct=(),
+                    sample_size=100000, chunksize=100000):
+    """
+    分块扫描一遍数据集, 返回 PreviewSummary
+    """
+    read_columns = None
+    if columns is not None:
+        extra = [group_by, *value_counts, *stratify, *(distinct if distinct is not True else ())]
+        read_columns = list(columns) + list(dict.fromkeys(c for c in extra if c and c not in columns))
+    summary = PreviewSummary(columns, group_by=group_by, value_counts=value_counts, stratify=stratify,
+                             distinct=distinct, sample_size=sample_size)
+    for chunk in iter_dataset(path, columns=read_columns, chunksize=chunksize):
+        summary.update(chunk)
+    return summary
+
+def proportion_interval(p, n, z=Z_95):
+    """比例的 Wilson 置信区间"""
+    if not n:
+        return (0.0, 1.0)
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return (float(max(0.0, center - half)), float(min(1.0, center + half)))
+
+def auc_interval(auc, n_positive, n_negative, z=Z_95):
+    """AUC 的 Hanley-McNeil 置信区间"""
+    if not n_positive or not n_negative:
+        return (0.0, 1.0)
+    q1 = auc / (2 - auc)
+    q2 = 2 * auc * auc / (1 + auc)
+    variance = (auc * (1 - auc) + (n_positive - 1) * (q1 - auc * auc)
+                + (n_negative - 1) * (q2 - auc * auc)) / (n_positive * n_negative)
+    half = z * np.sqrt(max(variance, 0.0))
+    return (float(max(0.0, auc - half)), float(min(1.0, auc + half)))
+
+def model_error_bounds(metrics, z=Z_95):
+    """
+    在样本上训练得到的模型指标的置信区间: 准确率用 Wilson 区间, AUC 用 Hanley-McNeil 区间,
+    交叉验证均值用各折分数的标准误
+    """
+    n_test, n_positive = metrics["n_test"], metrics["n_test_positive"]
+    bounds = {
+        "accuracy": proportion_interval(metrics["accuracy"], n_test, z),
+        "auc": auc_interval(metrics["auc"], n_positive, n_test - n_positive, z),
+    }
+    scores = metrics.get("cv_scores") or []
+    if len(scores) > 1:
+        half = float(z * np.std(scores, ddof=1) / np.sqrt(len(scores)))
+        bounds["cv_mean"] = (float(metrics["cv_mean"]) - half, float(metrics["cv_mean"]) + half)
+    return bounds
@@ -0,0 +1,162 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .storage import get_format, dataset_parts, dataset_size, read_dataset, iter_dataset
+from utils import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# 各格式读入内存后相对文件大小的估计倍数, 用于控制同时解析的数据量
+_EXPANSION = {'csv': 1.5, 'parquet': 4.0, 'feather': 1.0}
+
+DEFAULT_MEMORY_LIMIT = 512 * 1024 ** 2
+
+def csv_engine():
+    """可用的最快 CSV 解析引擎: pyarrow(多线程) 优先, 否则为 pandas 的 C 引擎"""
+    return 'pyarrow' if pa is not None else 'c'
+
+def _widen(a, b):
+    """两个采样类型不一致时取能同时容纳两者的类型"""
+    if a == b:
+        return a
+    if np.dtype(a).kind in 'iuf' and np.dtype(b).kind in 'iuf':
+        return 'float64'
+    return 'object'
+
+def sample_schema(paths, sample_rows=1000):
+    """
+    读取每个 CSV 文件的前 sample_rows 行推断列类型, 合并为统一的 {列名: dtype}
+
+    采样中的整数列在后续行出现缺失值时, 解析结果仍会是浮点
+    """
+    schema = {}
+    for path in paths:
+        if get_format(path) != 'csv' or os.path.isdir(path):
+            continue
+        for col, dtype in pd.read_csv(path, nrows=sample_rows).dtypes.items():
+            dtype = 'object' if dtype.kind not in 'biuf' else dtype.name
+            schema[col] = _widen(schema[col], dtype) if col in schema else dtype
+    return schema
+
+def _arrow_type(dtype):
+    if dtype == 'object':
+        return pa.string()
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+def _read_csv_arrow(path, columns, dtypes):
+    convert = pa_csv.ConvertOptions(
+        column_types={col: _arrow_type(dtype) for col, dtype in (dtypes or {}).items()},
+        include_columns=columns)
+    try:
+        return pa_csv.read_csv(path, convert_options=convert)
+    except pa.ArrowInvalid:
+        # 采样类型与后面的数据不符时退回自动推断
+        return pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(include_columns=columns))
+
+def read_file(path, columns=None, dtypes=None):
+    """
+    读取单个文件; CSV 使用 csv_engine() 并按 dtypes 显式指定列类型
+
+    pyarrow 可用时返回 Arrow 表, 在进程间传递时不经过 pandas 对象的序列化
+    """
+    if get_format(path) != 'csv' or os.path.isdir(path):
+        return read_dataset(path, columns=columns)
+    if pa is not None:
+        return _read_csv_arrow(path, columns, dtypes)
+    dtypes = {col: dtype for col, dtype in (dtypes or {}).items() if np.dtype(dtype).kind not in 'iu'}
+    return pd.read_csv(path, usecols=columns, dtype=dtypes, engine='c')
+
+def _to_pandas(result):
+    if pa is not None and isinstance(result, pa.Table):
+        # split_blocks/self_destruct 边转换边释放 Arrow 内存, 峰值不翻倍
+        return result.to_pandas(split_blocks=True, self_destruct=True)
+    return result
+
+def estimated_memory(path):
+    """估计文件读入内存后的大小(字节)"""
+    return int(sum(os.path.getsize(p) * _EXPANSION[get_format(p)] for p in dataset_parts(path)))
+
+def iter_files(paths, columns=None, max_workers=None, memory_limit=DEFAULT_MEMORY_LIMIT,
+               chunksize=None, sample_rows=1000):
+    """
+    在进程池中并行解析多个文件, 按输入顺序逐个返回 (路径, DataFrame)
+
+    同时在解析或等待取走的数据估计不超过 memory_limit 字节; 单个文件超过上限时
+    在当前进程中按 chunksize 分块流式读取。指定 chunksize 时每个文件按块返回
+    """
+    paths = list(paths)
+    for _, path, chunk in _timed_files(_iter_files(paths, columns, max_workers, memory_limit, chunksize,
+                                                   sample_rows), paths):
+        yield path, chunk
+
+def _timed_files(items, paths):
+    # 读取阶段的指标只统计等待解析结果的时间
+    if not metrics.enabled():
+        return items
+    return metrics.timed_iter("read_files", items, count=lambda item: len(item[2]),
+                              bytes_read=sum(dataset_size(path) for path in paths))
+
+def _iter_files(paths, columns, max_workers, memory_limit, chunksize, sample_rows):
+    paths = list(paths)
+    max_workers = max_workers or os.cpu_count() or 1
+    dtypes = sample_schema(paths, sample_rows)
+    if columns is not None:
+        dtypes = {col: dtype for col, dtype in dtypes.items() if col in columns}
+
+    def split(i, df):
+        if not chunksize:
+            yield i, paths[i], df
+            return
+        for start in range(0, max(len(df), 1), chunksize):
+            yield i, paths[i], df.iloc[start:start + chunksize]
+
+    def stream(i):
+        for chunk in iter_dataset(paths[i], columns=columns, chunksize=chunksize or 100000):
+            yield i, paths[i], chunk
+
+    if max_workers == 1 or len(paths) == 1:
+        for i, path in enumerate(paths):
+            if estimated_memory(path) > memory_limit:
+                yield from stream(i)
+            else:
+                yield from split(i, _to_pandas(read_file(path, columns, dtypes)))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        pending = deque()
+        in_flight = 0
+        remaining = deque(range(len(paths)))
+        while remaining or pending:
+            # 在内存上限内尽量多地提交文件, 至少保证有一个在解析
+            while remaining and (not pending or in_flight + estimated_memory(paths[remaining[0]]) <= memory_limit):
+                i = remaining.popleft()
+                size = estimated_memory(paths[i])
+                if size > memory_limit:
+                    pending.append((i, None, 0))
+                    break
+                pending.append((i, executor.submit(read_file, paths[i], columns, dtypes), size))
+                in_flight += size
+            i, future, size = pending.popleft()
+            if future is None:
+                yield from stream(i)
+                continue
+            df = _to_pandas(future.result())
+            in_flight -= size
+            yield from split(i, df)
+
+def read_files(paths, columns=None, max_workers=None, memory_limit=DEFAULT_MEMORY_LIMIT, sample_rows=1000):
+    """
+    并行读取多个文件, 按输入顺序返回 DataFrame 列表
+    """
+    paths = list(paths)
+    frames = [[] for _ in paths]
+    for i, _, chunk in _timed_files(_iter_files(paths, columns, max_workers, memory_limit, None, sample_rows),
+                                    paths):
+        frames[i].append(chunk)
+    return [pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0] for chunks in frames]
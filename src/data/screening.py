@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+from .storage import iter_dataset, read_columns
+from .transform import RunningStats
+
+# 扫描数据集时每个数据块转换成的 float64 数组的大小上限, 块行数按列数计算
+DEFAULT_BLOCK_BYTES = 64 * 1024 ** 2
+
+# 标识列(如样例数据的 id)每行一个取值, 与目标没有可推广的关系, 不作为候选特征; 按列名匹配, 不区分大小写
+ID_COLUMNS = ('id',)
+
+class FeatureScreen:
+    """
+    宽表特征筛选: 单遍分块扫描, 精确累积每列的缺失率、标准差和与目标的 Pearson 相关系数,
+    同时保留定长的均匀行样本(float32)
+
+    select() 在样本上按 block_size 列一批计算与目标的互信息和主值占比, 剔除缺失过多、近似常量的列,
+    再按得分从高到低贪心剔除与已保留列高度相关的冗余列。内存只取决于数据块大小和
+    sample_size * 列数, 不构造完整的 列数 x 列数 相关矩阵
+    """
+    def __init__(self, target='target', exclude=(), sample_size=10000, n_bins=16, random_state=0):
+        self.target = target
+        self.exclude = list(exclude)
+        self.sample_size = sample_size
+        self.n_bins = n_bins
+        self._rng = np.random.default_rng(random_state)
+        self.features = None
+
+    def _initialize(self, chunk):
+        excluded = {self.target, *self.exclude}
+        self.features = [col for col in chunk.select_dtypes(include=[np.number]).columns
+                         if col not in excluded and str(col).lower() not in ID_COLUMNS]
+        x = chunk[self.features].to_numpy(dtype=np.float64)
+        y = chunk[self.target].to_numpy(dtype=np.float64)
+        p = len(self.features)
+        self.stats = RunningStats(self.features)
+        self._min = np.full(p, np.inf)
+        self._max = np.full(p, -np.inf)
+        # 以第一块的均值为平移量累积二阶量, 减少大数相减的精度损失
+        with np.errstate(invalid='ignore'):
+            self._shift = np.nan_to_num(np.nanmean(x, axis=0)) if len(x) else np.zeros(p)
+            self._y_shift = np.nan_to_num(np.nanmean(y)) if len(y) else 0.0
+        self._n = np.zeros(p)
+        self._sx = np.zeros(p)
+        self._sy = np.zeros(p)
+        self._sxx = np.zeros(p)
+        self._syy = np.zeros(p)
+        self._sxy = np.zeros(p)
+        self._sample = np.empty((0, p), dtype=np.float32)
+        self._sample_y = np.empty(0)
+        self._sample_keys = np.empty(0)
+
+    def update(self, chunk):
+        """
+        用一个数据块更新统计量; 候选特征为第一块中除目标列、标识列和 exclude 以外的数值列
+        """
+        if self.features is None:
+            self._initialize(chunk)
+        x = chunk[self.features].to_numpy(dtype=np.float64)
+        y = chunk[self.target].to_numpy(dtype=np.float64)
+        self.stats.update_array(x)
+        valid = ~np.isnan(x)
+        self._min = np.minimum(self._min, np.where(valid, x, np.inf).min(axis=0, initial=np.inf))
+        self._max = np.maximum(self._max, np.where(valid, x, -np.inf).max(axis=0, initial=-np.inf))
+
+        # 与目标的相关系数只用 x 和 y 都不缺失的行; y 的各项累积量写成向量与掩码的乘积, 不展开成二维数组
+        mask = valid & ~np.isnan(y)[:, None]
+        dx = np.where(mask, x - self._shift, 0.0)
+        dy = np.nan_to_num(y - self._y_shift)
+        self._n += mask.sum(axis=0)
+        self._sx += dx.sum(axis=0)
+        self._sy += dy @ mask
+        self._sxx += np.einsum('ij,ij->j', dx, dx)
+        self._syy += (dy * dy) @ mask
+        self._sxy += dy @ dx
+
+        # 给每行一个随机键, 保留键最小的 sample_size 行
+        keys = self._rng.random(len(x))
+        sample = np.vstack([self._sample, x.astype(np.float32)])
+        sample_y = np.concatenate([self._sample_y, y])
+        sample_keys = np.concatenate([self._sample_keys, keys])
+        if len(sample_keys) > self.sample_size:
+            keep = np.argpartition(sample_keys, self.sample_size)[:self.sample_size]
+            sample, sample_y, sample_keys = sample[keep], sample_y[keep], sample_keys[keep]
+        self._sample, self._sample_y, self._sample_keys = sample, sample_y, sample_keys
+        return self
+
+    def target_correlation(self):
+        n = self._n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self._sxy - self._sx * self._sy / n
+            var_x = self._sxx - self._sx ** 2 / n
+            var_y = self._syy - self._sy ** 2 / n
+            corr = cov / np.sqrt(var_x * var_y)
+        corr[n < 2] = np.nan
+        return np.clip(corr, -1, 1)
+
+    def _binned_statistics(self, block_size):
+        """
+        按列分块把样本离散化为分位数分箱(缺失值单独一箱), 返回与目标的互信息(nats)和最大分箱占比
+        """
+        sample = self._sample[~np.isnan(self._sample_y)]
+        labels, y = np.unique(self._sample_y[~np.isnan(self._sample_y)], return_inverse=True)
+        n, k, n_bins = len(sample), len(labels), self.n_bins
+        p = sample.shape[1]
+        mutual_info = np.full(p, np.nan)
+        top_share = np.full(p, np.nan)
+        if not n:
+            return mutual_info, top_share
+        positions = np.linspace(0, 1, n_bins + 1)[1:-1]
+        for start in range(0, p, block_size):
+            block = sample[:, start:start + block_size]
+            b = block.shape[1]
+            valid = ~np.isnan(block)
+            n_valid = valid.sum(axis=0)
+            # 缺失值排在最后, 按各列非缺失个数取分位点作为分箱边界; 边界重复时对应的箱为空
+            ordered = np.sort(block, axis=0)
+            index = np.floor(positions[:, None] * np.maximum(n_valid - 1, 0)).astype(np.intp)
+            edges = np.take_along_axis(ordered, index, axis=0)
+            codes = (block[:, :, None] > edges.T[None, :, :]).sum(axis=2)
+            codes[~valid] = n_bins
+            flat = ((np.arange(b) * (n_bins + 1) + codes) * k + y[:, None]).ravel()
+            counts = np.bincount(flat, minlength=b * (n_bins + 1) * k).reshape(b, n_bins + 1, k)
+
+            joint = counts / n
+            px = joint.sum(axis=2, keepdims=True)
+            py = joint.sum(axis=1, keepdims=True)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                terms = np.where(joint > 0, joint * np.log(joint / (px * py)), 0.0)
+                mutual_info[start:start + b] = terms.sum(axis=(1, 2))
+                top_share[start:start + b] = counts[:, :n_bins, :].sum(axis=2).max(axis=1) / n_valid
+        return mutual_info, top_share
+
+    def _standardized_sample(self):
+        """均值填充并标准化的样本, 用于计算列间相关系数"""
+        sample = self._sample
+        with np.errstate(invalid='ignore'):
+            mean = np.nan_to_num(np.nanmean(sample, axis=0))
+        z = np.where(np.isnan(sample), mean, sample) - mean
+        std = np.sqrt((z * z).mean(axis=0))
+        std[std == 0] = 1.0
+        return (z / std).astype(np.float32)
+
+    def select(self, max_features=None, max_null_rate=0.5, max_top_share=0.99, redundancy=0.95, block_size=256):
+        """
+        筛选特征, 返回按排名排序的报告 DataFrame(行索引为特征名)
+
+        status 列取值: kept(入选)、high_null(缺失率超过 max_null_rate)、constant(只有一个取值)、
+        near_constant(最大分箱占比不低于 max_top_share)、redundant(与排名更高的 redundant_with 列的
+        相关系数绝对值不低于 redundancy)、below_cutoff(入选数已达 max_features)。
+        得分为与目标的互信息, 相同时按与目标相关系数的绝对值排序
+        """
+        if not self.features:
+            return pd.DataFrame(columns=['null_rate', 'std', 'top_share', 'target_corr', 'mutual_info', 'status',
+                                         'redundant_with', 'rank'], index=pd.Index([], name='feature'))
+        count = self.stats.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.stats.m2 / count)
+        mutual_info, top_share = self._binned_statistics(block_size)
+        report = pd.DataFrame({
+            'null_rate': 1 - count / max(self.stats.n_rows, 1), 'std': std, 'top_share': top_share,
+            'target_corr': self.target_correlation(), 'mutual_info': mutual_info,
+        }, index=pd.Index(self.features, name='feature'))
+        report['status'] = 'kept'
+        report['redundant_with'] = None
+
+        report.loc[top_share >= max_top_share, 'status'] = 'near_constant'
+        report.loc[self._min == self._max, 'status'] = 'constant'
+        report.loc[(report['null_rate'].to_numpy() > max_null_rate) | (count == 0), 'status'] = 'high_null'
+
+        order = np.lexsort((-np.nan_to_num(np.abs(report['target_corr'].to_numpy())),
+                            -np.nan_to_num(report['mutual_info'].to_numpy())))
+        candidates = [i for i in order if report['status'].iat[i] == 'kept']
+        kept = self._prune_redundant(candidates, report, max_features, redundancy, block_size)
+
+        report['rank'] = np.nan
+        report.iloc[kept, report.columns.get_loc('rank')] = np.arange(1, len(kept) + 1)
+        selected = set(kept)
+        ranked = list(kept) + [i for i in order if i not in selected]
+        return report.iloc[ranked]
+
+    def _prune_redundant(self, candidates, report, max_features, redundancy, block_size):
+        """
+        按得分顺序逐批处理候选列: 先与已保留的列比较, 再在批内依次比较, 返回保留列的位置
+        """
+        if not candidates:
+            return []
+        z = self._standardized_sample()
+        n = max(len(z), 1)
+        kept = []
+        kept_z = np.empty((len(z), 0), dtype=np.float32)
+        status = report.columns.get_loc('status')
+        partner = report.columns.get_loc('redundant_with')
+        names = report.index
+        for start in range(0, len(candidates), block_size):
+            if max_features is not None and len(kept) >= max_features:
+                for i in candidates[start:]:
+                    report.iat[i, status] = 'below_cutoff'
+                break
+            block = candidates[start:start + block_size]
+            block_z = z[:, block]
+            against_kept = np.abs(block_z.T @ kept_z) / n if kept else np.zeros((len(block), 0))
+            within = np.abs(block_z.T @ block_z) / n
+            accepted = []
+            for j, i in enumerate(block):
+                if max_features is not None and len(kept) + len(accepted) >= max_features:
+                    report.iat[i, status] = 'below_cutoff'
+                    continue
+                if against_kept.shape[1] and against_kept[j].max() >= redundancy:
+                    report.iat[i, status] = 'redundant'
+                    report.iat[i, partner] = names[kept[int(against_kept[j].argmax())]]
+                    continue
+                clash = [a for a in accepted if within[j, a] >= redundancy]
+                if clash:
+                    report.iat[i, status] = 'redundant'
+                    report.iat[i, partner] = names[block[clash[0]]]
+                    continue
+                accepted.append(j)
+            kept.extend(block[a] for a in accepted)
+            kept_z = np.hstack([kept_z, block_z[:, accepted]])
+        return kept
+
+def screen_features(df, target='target', exclude=(), chunksize=None, sample_size=10000, **select_kwargs):
+    """
+    在内存中的 DataFrame 上筛选特征, 按 DEFAULT_BLOCK_BYTES 限制的行数分块计算, 返回 select() 的报告
+    """
+    screen = FeatureScreen(target, exclude=exclude, sample_size=sample_size)
+    chunksize = chunksize or _block_rows(df.shape[1])
+    for start in range(0, len(df), chunksize):
+        screen.update(df.iloc[start:start + chunksize])
+    return screen.select(**select_kwargs)
+
+def screen_dataset(path, columns=None, target='target', exclude=(), chunksize=None, sample_size=10000,
+                   **select_kwargs):
+    """
+    分块扫描一遍数据集并筛选特征; columns 为候选列(默认全部数值列), 块行数按列数自动确定
+    """
+    if columns is not None:
+        read = list(dict.fromkeys([*columns, target]))
+    else:
+        read = None
+    screen = FeatureScreen(target, exclude=exclude, sample_size=sample_size)
+    chunksize = chunksize or _block_rows(len(read or read_columns(path)))
+    for chunk in iter_dataset(path, columns=read, chunksize=chunksize):
+        screen.update(chunk)
+    if screen.features is None:
+        raise ValueError(f"输入文件没有数据: {path}")
+    return screen.select(**select_kwargs)
+
+def _block_rows(n_columns):
+    return max(1000, DEFAULT_BLOCK_BYTES // (8 * max(n_columns, 1)))
+
+def shortlist(report):
+    """报告中入选的特征, 按排名排序"""
+    return list(report.index[report['status'] == 'kept'])
+
+def report_records(report):
+    """把报告转换为可 JSON 序列化的记录列表, 缺失值为 None"""
+    return [{k: None if isinstance(v, float) and np.isnan(v) else v for k, v in row.items()}
+            for row in report.reset_index().to_dict('records')]
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+class TDigest:
+    """
+    合并式 t-digest 分位数草图: 用不超过约 compression 个质心概括任意多的数值
+
+    质心大小受 k1 尺度函数约束, 两端的质心很小, 因此尾部分位数比中位数更精确;
+    分位点 q 处的秩误差约为 pi * sqrt(q(1-q)) / compression
+    """
+    def __init__(self, compression=200, buffer_size=50000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """加入一批数值, 缺失值被忽略"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """合并另一个草图, 用于汇总各分块或各进程的结果"""
+        other._compress()
+        if other.count:
+            self._compress()
+            self._means = np.concatenate([self._means, other._means])
+            self._weights = np.concatenate([self._weights, other._weights])
+            self.count += other.count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(force=True)
+        return self
+
+    def _compress(self, force=False):
+        if not self._buffered and not force:
+            return
+        values = np.sort(np.concatenate(self._buffer)) if self._buffer else np.empty(0)
+        self._buffer, self._buffered = [], 0
+        # 已有质心本身有序, 只需对新数据排序后按位置插入
+        order = np.argsort(self._means, kind='stable')
+        positions = np.searchsorted(values, self._means[order])
+        means = np.insert(values, positions, self._means[order])
+        weights = np.insert(np.ones(len(values)), positions, self._weights[order])
+
+        # 按每个点累积权重中点所在的 k 尺度整数区间分组, 同组合并成一个质心, 每个质心跨度不超过 1
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / merged_weights
+        self._weights = merged_weights
+
+    @property
+    def centroids(self):
+        self._compress()
+        return len(self._means)
+
+    def quantile(self, q):
+        """返回分位点 q(标量或数组)的近似值, 没有数据时为 NaN"""
+        self._compress()
+        q = np.asarray(q, dtype=np.float64)
+        if not self.count:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        # 质心的累积权重中点对应其均值, 两端以最小值和最大值为锚点线性插值
+        positions = np.cumsum(self._weights) - self._weights / 2
+        xs = np.concatenate([[0.0], positions, [self.count]])
+        ys = np.concatenate([[self.min], self._means, [self.max]])
+        result = np.interp(q * self.count, xs, ys)
+        return result if q.ndim else float(result)
+
+    def rank_error(self, q):
+        """分位点 q 处的近似秩误差(占总数的比例)"""
+        q = np.asarray(q, dtype=np.float64)
+        return np.pi * np.sqrt(q * (1 - q)) / self.compression
+
+class HyperLogLog:
+    """
+    HyperLogLog 去重计数: 2^precision 个寄存器, 内存固定, 相对标准误差约 1.04 / sqrt(2^precision)
+    """
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values):
+        """加入一批值(任意可哈希类型), 缺失值不计入"""
+        values = pd.Series(values) if not isinstance(values, pd.Series) else values
+        values = values.dropna()
+        if values.empty:
+            return self
+        hashes = pd.util.hash_array(values.to_numpy(), categorize=False)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        bits = 64 - self.precision
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # 寄存器记录剩余位中最高位 1 的位置(前导零个数 + 1); rest < 2^50, 转为浮点不丢精度
+        with np.errstate(divide='ignore'):
+            rank = np.where(rest > 0, bits - np.floor(np.log2(rest.astype(np.float64))), bits + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """估计去重后的个数"""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # 基数较小时改用线性计数
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    @property
+    def relative_error(self):
+        """相对标准误差"""
+        return 1.04 / np.sqrt(self.m)
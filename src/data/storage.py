@@ -0,0 +1,332 @@
+import io
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+# pandas 在读取数据时才导入: Web 服务只用到本模块的路径和 schema 函数时不需要加载它
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# 数据集在各处理阶段之间默认使用列式存储, CSV 只用于导入和导出
+DEFAULT_FORMAT = 'parquet' if pa is not None else 'csv'
+
+FORMAT_EXTENSIONS = {
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'csv': '.csv',
+}
+
+def get_format(path):
+    """
+    根据文件扩展名判断存储格式
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext in ('.feather', '.arrow'):
+        return 'feather'
+    return 'csv'
+
+def dataset_path(directory, name, fmt=None):
+    """
+    按存储格式生成数据集文件路径
+    """
+    return os.path.join(directory, name + FORMAT_EXTENSIONS[fmt or DEFAULT_FORMAT])
+
+def partition_path(directory, key, value, fmt=None):
+    """
+    生成分区数据集中某个分区的文件路径, 例如 merged/year=2020.parquet
+    """
+    return dataset_path(directory, f"{key}={value}", fmt)
+
+def dataset_parts(path):
+    """
+    返回数据集包含的文件; 分区数据集是一个目录, 按文件名排序
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if os.path.splitext(name)[1].lower() in FORMAT_EXTENSIONS.values())
+    return [path]
+
+def dataset_size(path):
+    """数据集所有文件的总字节数, 不存在时为 0"""
+    return sum(os.path.getsize(part) for part in dataset_parts(path) if os.path.exists(part))
+
+def _require_arrow(fmt):
+    if pa is None:
+        raise ImportError(f"读写 {fmt} 格式需要安装 pyarrow")
+
+def read_dataset(path, columns=None):
+    """
+    读取数据集, columns 指定时只读取这些列
+    """
+    import pandas as pd
+    if os.path.isdir(path):
+        parts = [read_dataset(part, columns) for part in dataset_parts(path)]
+        return pd.concat(parts, ignore_index=True)
+    fmt = get_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    _require_arrow(fmt)
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+def read_columns(path):
+    """
+    只读取数据集的列名, 列式格式无需读取数据
+    """
+    if os.path.isdir(path):
+        return read_columns(dataset_parts(path)[0])
+    fmt = get_format(path)
+    if fmt == 'csv':
+        import pandas as pd
+        return list(pd.read_csv(path, nrows=0).columns)
+    _require_arrow(fmt)
+    if fmt == 'parquet':
+        return pq.read_schema(path).names
+    return feather.read_table(path, memory_map=True).schema.names
+
+def read_arrow_schema(path, sample_rows=10000):
+    """
+    读取数据集的 Arrow schema; 列式格式只读元数据, CSV 按前 sample_rows 行推断, 分区数据集合并各分区的 schema
+    """
+    _require_arrow('arrow')
+    if os.path.isdir(path):
+        return unify_schemas([read_arrow_schema(part, sample_rows) for part in dataset_parts(path)])
+    fmt = get_format(path)
+    if fmt == 'csv':
+        import pandas as pd
+        return pa.Schema.from_pandas(pd.read_csv(path, nrows=sample_rows), preserve_index=False).remove_metadata()
+    if fmt == 'parquet':
+        return pq.read_schema(path).remove_metadata()
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.remove_metadata()
+
+def unify_schemas(schemas):
+    """
+    合并多个 schema: 列按首次出现的顺序排列; 同名列类型不一致时, 数值类型统一为 float64, 其余统一为字符串,
+    只在部分文件中出现或全为空值的列由其他文件决定类型
+    """
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            types.setdefault(field.name, [])
+            if field.type != pa.null() and field.type not in types[field.name]:
+                types[field.name].append(field.type)
+    fields = []
+    for name, candidates in types.items():
+        if not candidates:
+            field_type = pa.null()
+        elif len(candidates) == 1:
+            field_type = candidates[0]
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in candidates):
+            field_type = pa.float64()
+        else:
+            field_type = pa.string()
+        fields.append(pa.field(name, field_type))
+    return pa.schema(fields)
+
+def merged_schema(paths, extra_fields=()):
+    """
+    多个数据集按行合并后的 Arrow schema, extra_fields 为追加(或替换)的 (列名, 类型名) 派生列;
+    未安装 pyarrow 时返回 None
+    """
+    if pa is None:
+        return None
+    schema = unify_schemas([read_arrow_schema(path) for path in paths])
+    for name, type_name in extra_fields:
+        if name in schema.names:
+            schema = schema.remove(schema.get_field_index(name))
+        schema = schema.append(pa.field(name, pa.type_for_alias(type_name)))
+    return schema
+
+def conform_table(df, schema):
+    """
+    按 schema 把数据块转换为 Arrow 表: 数据块中没有的列填入该类型的空值, 类型不同的列转换为 schema 的类型
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(len(table), field.type))
+            continue
+        column = table.column(field.name)
+        if column.type == field.type:
+            columns.append(column)
+        elif column.null_count == len(column):
+            columns.append(pa.nulls(len(column), field.type))
+        else:
+            columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def read_dataset_buffer(data, fmt):
+    """
+    从内存中的字节读取数据集, feather 格式同时支持 Arrow IPC 文件和流
+    """
+    if fmt == 'csv':
+        import pandas as pd
+        return pd.read_csv(io.BytesIO(data))
+    _require_arrow(fmt)
+    if fmt == 'parquet':
+        return pq.read_table(pa.BufferReader(data)).to_pandas()
+    try:
+        return pa.ipc.open_file(pa.BufferReader(data)).read_pandas()
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(pa.BufferReader(data)).read_pandas()
+
+def iter_dataset(path, columns=None, chunksize=100000):
+    """
+    按固定行数分块读取数据集
+    """
+    if os.path.isdir(path):
+        for part in dataset_parts(path):
+            yield from iter_dataset(part, columns, chunksize)
+        return
+    fmt = get_format(path)
+    if fmt == 'csv':
+        import pandas as pd
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+        return
+    _require_arrow(fmt)
+    if fmt == 'parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        # 解码整个行组的缓冲区释放后仍被 Arrow 的内存池保留, 读完一个文件就归还给操作系统,
+        # 否则后续训练等阶段的峰值内存会叠加上这部分; 较早的 pyarrow(如 requirements.txt 中的 5.0)没有这个方法
+        pool = pa.default_memory_pool()
+        if hasattr(pool, 'release_unused'):
+            pool.release_unused()
+        return
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    for batch in table.to_batches(max_chunksize=chunksize):
+        yield batch.to_pandas()
+
+def write_dataset(df, path):
+    """
+    写出数据集, 格式由扩展名决定
+    """
+    with DatasetWriter(path) as writer:
+        writer.write(df)
+
+class DatasetWriter:
+    """
+    逐块追加写出数据集, Parquet 下每块对应一个 row group
+
+    给定 schema(Arrow schema)时每块都按它写出, 块中缺少的列写为空值; 否则以第一块的 schema 为准
+    """
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.format = get_format(path)
+        if self.format != 'csv':
+            _require_arrow(self.format)
+        self._writer = None
+        self._schema = schema
+        self.rows_written = 0
+
+    def write(self, df):
+        if self.format == 'csv':
+            if self._schema is not None:
+                df = df.reindex(columns=self._schema.names)
+            df.to_csv(self.path, mode='a' if self.rows_written else 'w',
+                      header=not self.rows_written, index=False)
+        else:
+            if self._schema is not None:
+                table = conform_table(df, self._schema)
+            else:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.format == 'parquet':
+                    self._writer = pq.ParquetWriter(self.path, self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.path, self._schema)
+            elif not table.schema.equals(self._schema):
+                table = table.cast(self._schema)
+            self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.format == 'csv' and not os.path.exists(self.path):
+            open(self.path, 'w').close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+@contextmanager
+def atomic_output(path):
+    """
+    在 path 旁的临时路径上写出数据集(文件或分区目录), 成功后再替换到 path, 读取方不会看到写到一半的数据;
+    写出失败时删除临时路径
+    """
+    directory, name = os.path.split(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # 临时文件名保留原扩展名, 写出时按同样的格式
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.{name}")
+    try:
+        yield tmp_path
+    except BaseException:
+        _remove_path(tmp_path)
+        raise
+    if os.path.isdir(tmp_path) or os.path.isdir(path):
+        # 目录不能直接替换非空目录: 先把旧数据集移开, 换入新的后再删除
+        stale_path = tmp_path + '.old'
+        if os.path.exists(path):
+            os.replace(path, stale_path)
+        os.replace(tmp_path, path)
+        _remove_path(stale_path)
+    else:
+        os.replace(tmp_path, path)
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def schema_path(path):
+    """
+    数据集 schema 和统计信息文件的路径, 与数据集并列存放
+    """
+    return path.rstrip('/\\') + '.schema.json'
+
+def write_schema(path, schema):
+    """
+    写出数据集的列名、类型、行数和每列缺失值数
+    """
+    tmp_path = schema_path(path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False)
+    os.replace(tmp_path, schema_path(path))
+
+def read_schema(path):
+    """
+    读取数据集的 schema 文件, 不存在时返回 None
+    """
+    try:
+        with open(schema_path(path), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def convert_dataset(input_path, output_path, chunksize=100000):
+    """
+    分块转换数据集格式, 用于 CSV 的导入和导出
+    """
+    with DatasetWriter(output_path) as writer:
+        for chunk in iter_dataset(input_path, chunksize=chunksize):
+            writer.write(chunk)
+    return output_path
@@ -0,0 +1,139 @@
+import time
+import numpy as np
+import pandas as pd
+import joblib
+
+# 预处理参数文件的格式版本, 格式不兼容地变化时递增
+FORMAT_VERSION = 1
+
+class RunningStats:
+    """
+    按列累积计数、均值和方差(Welford 算法的分块合并形式)
+    """
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.n_rows = 0
+        self.count = np.zeros(len(self.columns))
+        self.mean = np.zeros(len(self.columns))
+        self.m2 = np.zeros(len(self.columns))
+
+    def update(self, chunk):
+        """
+        用一个数据块更新统计量, 缺失值不计入均值和方差
+        """
+        self.update_array(chunk[self.columns].to_numpy(dtype=np.float64))
+
+    def update_array(self, values):
+        """
+        用按 columns 顺序排列的二维数组更新统计量
+        """
+        mask = ~np.isnan(values)
+        chunk_count = mask.sum(axis=0)
+        chunk_sum = np.where(mask, values, 0.0).sum(axis=0)
+        chunk_mean = np.divide(chunk_sum, chunk_count, out=np.zeros_like(chunk_sum), where=chunk_count > 0)
+        chunk_m2 = (np.where(mask, values - chunk_mean, 0.0) ** 2).sum(axis=0)
+
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        weight = np.divide(chunk_count, total, out=np.zeros_like(chunk_sum), where=total > 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + chunk_m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.n_rows += len(values)
+
+    @property
+    def imputed_scale(self):
+        """
+        均值填充后各列的标准差, 与 StandardScaler 一致, 零方差列取 1
+        """
+        var = self.m2 / max(self.n_rows, 1)
+        scale = np.sqrt(var)
+        scale[scale == 0] = 1.0
+        return scale
+
+class Preprocessor:
+    """
+    均值填充加标准化的预处理步骤, 与 SimpleImputer(strategy='mean') 和 StandardScaler 等价
+
+    统计量可以用 partial_fit 按块增量更新, 保存为带版本号的文件后在推理时直接复用
+    """
+    def __init__(self, columns):
+        self.stats = RunningStats(columns)
+        self.revision = 0
+        self.updated_at = None
+
+    @property
+    def fitted_columns(self):
+        """有过非缺失值的列; 全部缺失的列与 SimpleImputer 一致被丢弃"""
+        return [col for col, n in zip(self.stats.columns, self.stats.count) if n > 0]
+
+    @property
+    def empty_columns(self):
+        return [col for col, n in zip(self.stats.columns, self.stats.count) if n == 0]
+
+    @property
+    def mean(self):
+        return self.stats.mean[self.stats.count > 0]
+
+    @property
+    def scale(self):
+        return self.stats.imputed_scale[self.stats.count > 0]
+
+    def partial_fit(self, df):
+        """
+        用一个新数据块增量更新均值和方差
+        """
+        self.stats.update(df)
+        self.revision += 1
+        self.updated_at = time.time()
+        return self
+
+    def transform_array(self, values, copy=True):
+        """
+        向量化变换按 fitted_columns 顺序排列的二维数组, copy=False 时原地修改
+        """
+        values = np.array(values, dtype=np.float64) if copy else np.asarray(values, dtype=np.float64)
+        mean = self.mean
+        missing = np.isnan(values)
+        if missing.any():
+            values[missing] = np.broadcast_to(mean, values.shape)[missing]
+        values -= mean
+        values /= self.scale
+        return values
+
+    def transform(self, df):
+        """
+        变换数据框中的特征列, 返回只含 fitted_columns 的新数据框
+        """
+        columns = self.fitted_columns
+        values = self.transform_array(df[columns].to_numpy(dtype=np.float64, copy=True), copy=False)
+        return pd.DataFrame(values, columns=columns, index=df.index)
+
+    def save(self, path):
+        """
+        以普通字典保存统计量和版本信息, 不依赖类的导入路径
+        """
+        joblib.dump({
+            "format_version": FORMAT_VERSION,
+            "revision": self.revision,
+            "updated_at": self.updated_at,
+            "columns": self.stats.columns,
+            "n_rows": self.stats.n_rows,
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "m2": self.stats.m2,
+        }, path)
+
+    @staticmethod
+    def load(path):
+        state = joblib.load(path)
+        if state.get("format_version", 0) > FORMAT_VERSION:
+            raise ValueError(f"不支持的预处理参数格式版本: {state.get('format_version')}")
+        preprocessor = Preprocessor(state["columns"])
+        preprocessor.stats.n_rows = state["n_rows"]
+        preprocessor.stats.count = np.asarray(state["count"], dtype=np.float64)
+        preprocessor.stats.mean = np.asarray(state["mean"], dtype=np.float64)
+        preprocessor.stats.m2 = np.asarray(state["m2"], dtype=np.float64)
+        preprocessor.revision = state["revision"]
+        preprocessor.updated_at = state["updated_at"]
+        return preprocessor
@@ -1,16 +1,15 @@
 from flask import Flask, jsonify
-from data.data_acquisition import fetch_data, save_data
-from data.data_preprocessing import preprocess_data
-from models.model import BigDataModel
 from utils.helpers import setup_logging, get_timestamp, create_directory_if_not_exists
-import pandas as pd
+from utils.metrics import stage, trace, record_timings
 import logging
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 app = Flask(__name__)
 
+# 相关性热力图只画排名靠前的特征, 特征不多时才在格子里标注数值
+HEATMAP_MAX_FEATURES = 30
+ANNOTATE_MAX_FEATURES = 15
+
 @app.route('/process', methods=['GET'])
 def process_data():
     try:
@@ -21,62 +20,87 @@ def process_data():
 
 def main():
     setup_logging()
-    
+    # 本次运行的日志和阶段指标都带上同一个 job_id
+    with trace(job_id=f"main_{get_timestamp()}"):
+        _run()
+
+def _run():
+    # 数据处理、训练和绘图的依赖在真正运行时才导入, 启动服务和导入本模块时不加载
+    from data.data_acquisition import fetch_data
+    from data.data_preprocessing import preprocess_to_matrix
+    from data.screening import screen_dataset, shortlist
+    from data.storage import dataset_path, dataset_size
+    from models.model import BigDataModel, preprocessor_path
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # 数据获取
     source_url = "https://example.com/bigdata.csv"
     raw_data_dir = "data/raw"
     create_directory_if_not_exists(raw_data_dir)
-    raw_data_path = os.path.join(raw_data_dir, f"bigdata_{get_timestamp()}.csv")
+    raw_data_path = dataset_path(raw_data_dir, f"bigdata_{get_timestamp()}")
     
     logging.info("Fetching data...")
-    df = fetch_data(source_url)
-    if df is not None:
-        save_data(df, raw_data_path)
+    with stage("fetch") as timer:
+        fetch_data(source_url, raw_data_path)
+        timer.add(bytes_written=dataset_size(raw_data_path))
     
-    # 数据预处理
-    processed_data_dir = "data/processed"
-    create_directory_if_not_exists(processed_data_dir)
-    processed_data_path = os.path.join(processed_data_dir, f"preprocessed_data_{get_timestamp()}.csv")
+    # 特征筛选: 在原始数据上剔除缺失过多、近似常量和冗余的列, 得到按排名排序的特征
+    logging.info("Screening features...")
+    with stage("screen"):
+        report = screen_dataset(raw_data_path)
+    features = shortlist(report)
+    if not features:
+        raise ValueError("没有特征通过筛选")
+    logging.info(f"Feature screening kept {len(features)} of {len(report)} columns")
+    
+    # 数据预处理: 结果是内存映射的共享特征矩阵, 可视化和训练都使用它的视图
+    processed_data_path = os.path.join("data/processed", f"preprocessed_data_{get_timestamp()}")
+    model = BigDataModel()
     
     logging.info("Preprocessing data...")
-    preprocess_data(raw_data_path, processed_data_path)
+    matrix, preprocessor = preprocess_to_matrix(raw_data_path, processed_data_path, selected_variables=features,
+                                                dtype=model.input_dtype)
+    df = matrix.frame()
     
     # 数据可视化
     logging.info("Generating data visualizations...")
-    df = pd.read_csv(processed_data_path)
     create_directory_if_not_exists("visualizations")
     
-    # 相关性热力图
-    plt.figure(figsize=(12, 10))
-    sns.heatmap(df.corr(), annot=True, cmap='coolwarm')
-    plt.title('特征相关性热力图')
-    plt.tight_layout()
-    plt.savefig('visualizations/correlation_heatmap.png')
-    plt.close()
-    
-    # 目标变量分布
-    plt.figure(figsize=(8, 6))
-    df['target'].value_counts().plot(kind='bar')
-    plt.title('目标变量分布')
-    plt.xlabel('类别')
-    plt.ylabel('数量')
-    plt.tight_layout()
-    plt.savefig('visualizations/target_distribution.png')
-    plt.close()
+    with stage("visualize"):
+        # 相关性热力图
+        plotted = features[:HEATMAP_MAX_FEATURES]
+        plt.figure(figsize=(12, 10))
+        sns.heatmap(df[plotted].corr(), annot=len(plotted) <= ANNOTATE_MAX_FEATURES, cmap='coolwarm')
+        plt.title('特征相关性热力图')
+        plt.tight_layout()
+        plt.savefig('visualizations/correlation_heatmap.png')
+        plt.close()
+        
+        # 目标变量分布
+        plt.figure(figsize=(8, 6))
+        df['target'].value_counts().plot(kind='bar')
+        plt.title('目标变量分布')
+        plt.xlabel('类别')
+        plt.ylabel('数量')
+        plt.tight_layout()
+        plt.savefig('visualizations/target_distribution.png')
+        plt.close()
     
     # 模型训练
     logging.info("Training model...")
-    X = df.drop("target", axis=1)
-    y = df["target"]
-    
-    model = BigDataModel()
-    model.train(X, y)
+    with stage("train", rows=matrix.n_rows):
+        metrics = model.train(matrix.features(), matrix.target(), shuffled=matrix.shuffled)
+    record_timings("train", metrics["timings"])
+    logging.info(f"Model metrics: {metrics}")
     
     # 保存模型
     model_dir = "data/models"
     create_directory_if_not_exists(model_dir)
     model_path = os.path.join(model_dir, f"big_data_model_{get_timestamp()}.joblib")
-    model.save(model_path)
+    with stage("save_model"):
+        model.save(model_path)
+        preprocessor.save(preprocessor_path(model_path))
     
     logging.info("Process completed successfully.")
 
@@ -0,0 +1,284 @@
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
+try:
+    from sklearn.ensemble import HistGradientBoostingClassifier
+except ImportError:
+    # scikit-learn < 1.0 中直方图梯度提升仍是实验特性
+    from sklearn.experimental import enable_hist_gradient_boosting  # noqa: F401
+    from sklearn.ensemble import HistGradientBoostingClassifier
+from joblib import Parallel, delayed
+import numpy as np
+import joblib
+import json
+import logging
+import math
+import os
+import time
+
+def preprocessor_path(model_path):
+    """
+    与模型文件一起保存的预处理参数文件路径
+    """
+    return os.path.splitext(model_path)[0] + ".preprocessor.joblib"
+
+def _evaluate(model, X_test, y_test):
+    """
+    在测试集上计算各项指标
+    """
+    y_pred = model.predict(X_test)
+    y_pred_proba = model.predict_proba(X_test)[:, 1]
+    return {
+        "accuracy": accuracy_score(y_test, y_pred),
+        "precision": precision_score(y_test, y_pred),
+        "recall": recall_score(y_test, y_pred),
+        "f1": f1_score(y_test, y_pred),
+        "auc": roc_auc_score(y_test, y_pred_proba),
+        "n_test": int(len(y_test)),
+        "n_test_positive": int(np.sum(np.asarray(y_test) == 1)),
+    }
+
+def _shareable(X):
+    """
+    把单一浮点类型的 DataFrame 转为行优先的二维数组和列名, 再交给 joblib 工作进程
+
+    基于内存映射矩阵的 DataFrame 内部保存的是列优先的转置视图, 较新的 joblib(已在 1.6 上确认)按文件引用
+    传递这种视图时会按行优先还原, 数据错位; 行优先的数组则可以正确地共享同一份文件。转换只取视图,
+    不依赖 joblib 的版本, 在 requirements.txt 固定的 1.0 上同样正确
+    """
+    if hasattr(X, "columns") and X.shape[1] and len(set(X.dtypes)) == 1 and X.dtypes.iloc[0].kind == 'f':
+        return X.to_numpy(), list(X.columns)
+    return X, None
+
+def _fit_fold(model, X, y, train_index, test_index, columns=None):
+    """
+    在一个折上训练并评估, 供 joblib 并行调用; 给定 columns 时 X 为 _shareable 转换后的数组
+    """
+    if columns is not None:
+        import pandas as pd
+        X = pd.DataFrame(X, columns=columns, copy=False)
+    start = time.perf_counter()
+    model.fit(X.iloc[train_index], y.iloc[train_index])
+    fit_time = time.perf_counter() - start
+    metrics = _evaluate(model, X.iloc[test_index], y.iloc[test_index])
+    return model, metrics, fit_time
+
+def contiguous_split(n_rows, test_size=0.2):
+    """
+    行已随机重排时的留出集划分, 返回 (训练集切片, 测试集切片); 切片取出的是视图, 不复制数据
+    """
+    n_test = int(math.ceil(n_rows * test_size))
+    return slice(0, n_rows - n_test), slice(n_rows - n_test, n_rows)
+
+def contiguous_folds(n_rows, cv):
+    """
+    行已随机重排时的交叉验证折, 返回 [(训练行下标, 测试行下标)], 测试折是连续的行区间
+
+    各折只传递下标, 工作进程从共享的特征矩阵中取出自己的训练行
+    """
+    bounds = np.linspace(0, n_rows, cv + 1).astype(int)
+    return [(np.r_[0:start, end:n_rows], np.arange(start, end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def lineage_path(model_path):
+    """
+    记录模型版本血缘(父模型、见过的原始文件)的文件路径
+    """
+    return os.path.splitext(model_path)[0] + ".lineage.json"
+
+def save_lineage(model_path, files, parent=None, n_rows=0):
+    """
+    保存模型血缘: files 为 {原始文件路径: 内容哈希}, n_rows 为累计训练行数
+    """
+    lineage = {"model": os.path.basename(model_path), "parent": parent, "files": files,
+               "n_rows": int(n_rows), "created_at": time.time()}
+    with open(lineage_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(lineage, f, indent=2)
+    return lineage
+
+def load_lineage(model_path):
+    """
+    读取模型血缘, 没有记录时返回空血缘
+    """
+    try:
+        with open(lineage_path(model_path), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"model": os.path.basename(model_path), "parent": None, "files": {}, "n_rows": 0}
+
+class BigDataModel:
+    """
+    梯度提升分类模型
+
+    fast=True 时使用带早停的直方图梯度提升, 交叉验证的各折用 joblib 在多核上并行,
+    并直接复用第一折作为留出集, 不再额外训练; params 可覆盖默认超参数。
+    传入内存映射的特征矩阵时, 并行的工作进程由 joblib 按文件引用共享同一份数据
+    """
+    def __init__(self, fast=False, n_jobs=None, **params):
+        self.fast = fast
+        self.n_jobs = -1 if fast and n_jobs is None else n_jobs
+        self.params = dict(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)
+        self.params.update(params)
+        self.model = self._build_estimator()
+
+    def _build_estimator(self):
+        if not self.fast:
+            return GradientBoostingClassifier(**self.params)
+        params = dict(self.params)
+        return HistGradientBoostingClassifier(
+            max_iter=params.pop("n_estimators"), early_stopping=True, validation_fraction=0.1,
+            n_iter_no_change=10, **params)
+    
+    @property
+    def input_dtype(self):
+        """估计器内部使用的特征类型, 特征矩阵按此类型存储时拟合不再转换复制"""
+        return np.float64 if self.fast else np.float32
+
+    def train(self, X, y, cv=5, plot=True, shuffled=False):
+        """
+        训练模型, 返回留出集指标、交叉验证分数和各阶段耗时(秒)
+
+        shuffled=True 表示行已随机重排(如 FeatureMatrix), 留出集和交叉验证的测试折直接取连续的行区间,
+        不再复制出训练集和测试集
+        """
+        if self.fast:
+            metrics = self._train_parallel_folds(X, y, cv, shuffled)
+        else:
+            metrics = self._train_holdout(X, y, cv, shuffled)
+        logging.info(f"模型训练完成: 准确率 {metrics['accuracy']:.2f}, AUC {metrics['auc']:.2f}, "
+                     f"交叉验证分数 {metrics['cv_mean']:.2f} (+/- {metrics['cv_std'] * 2:.2f})")
+        
+        # 特征重要性可视化
+        if plot and hasattr(self.model, "feature_importances_"):
+            self.plot_feature_importance(X.columns)
+        return metrics
+
+    def update(self, X, y, n_estimators=50):
+        """
+        增量训练: 保留已有的树, 只用新数据再训练 n_estimators 轮(warm_start)
+
+        新数据的 20% 用于评估, 返回指标和耗时
+        """
+        timings = {}
+        iterations_param = "max_iter" if isinstance(self.model, HistGradientBoostingClassifier) else "n_estimators"
+        fitted = getattr(self.model, "n_iter_", None) or getattr(self.model, "n_estimators_", 0)
+
+        start = time.perf_counter()
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        self.model.set_params(warm_start=True, **{iterations_param: fitted + n_estimators})
+        self.model.fit(X_train, y_train)
+        timings["fit"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics = _evaluate(self.model, X_test, y_test)
+        timings["evaluate"] = time.perf_counter() - start
+        metrics.update(n_rows=len(X), timings=timings)
+        return metrics
+
+    def _train_holdout(self, X, y, cv, shuffled=False):
+        timings = {}
+        start = time.perf_counter()
+        if shuffled:
+            train, test = contiguous_split(len(X))
+            X_train, X_test, y_train, y_test = X.iloc[train], X.iloc[test], y.iloc[train], y.iloc[test]
+            cv = contiguous_folds(len(X), cv)
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        self.model.fit(X_train, y_train)
+        timings["fit"] = time.perf_counter() - start
+        
+        # 评估模型
+        start = time.perf_counter()
+        metrics = _evaluate(self.model, X_test, y_test)
+        timings["evaluate"] = time.perf_counter() - start
+        
+        # 交叉验证
+        start = time.perf_counter()
+        cv_scores = cross_val_score(self.model, _shareable(X)[0], y, cv=cv, n_jobs=self.n_jobs)
+        timings["cross_validation"] = time.perf_counter() - start
+
+        metrics.update(cv_scores=cv_scores.tolist(), cv_mean=cv_scores.mean(), cv_std=cv_scores.std(),
+                       timings=timings)
+        return metrics
+
+    def _train_parallel_folds(self, X, y, cv, shuffled=False):
+        timings = {}
+        start = time.perf_counter()
+        if shuffled:
+            folds = contiguous_folds(len(X), cv)
+        else:
+            folds = StratifiedKFold(n_splits=cv, shuffle=True,
+                                    random_state=self.params.get("random_state")).split(X, y)
+        values, columns = _shareable(X)
+        results = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_fold)(clone(self.model), values, y, train_index, test_index, columns)
+            for train_index, test_index in folds)
+        timings["cross_validation"] = time.perf_counter() - start
+
+        # 第一折的模型和测试集即留出集的模型和评估结果
+        self.model, metrics, timings["fit"] = results[0]
+        cv_scores = np.array([fold_metrics["accuracy"] for _, fold_metrics, _ in results])
+        metrics = dict(metrics)
+        metrics.update(cv_scores=cv_scores.tolist(), cv_mean=cv_scores.mean(), cv_std=cv_scores.std(),
+                       n_iter=int(getattr(self.model, "n_iter_", self.params["n_estimators"])),
+                       timings=timings)
+        return metrics
+        
+    def plot_feature_importance(self, feature_names):
+        """
+        绘制特征重要性图
+        """
+        # matplotlib 只在命令行训练时用于绘图, Web 服务和后台任务不加载它
+        import matplotlib.pyplot as plt
+
+        importances = self.model.feature_importances_
+        indices = np.argsort(importances)[::-1]
+        
+        plt.figure(figsize=(10, 6))
+        plt.title("特征重要性")
+        plt.bar(range(len(importances)), importances[indices])
+        plt.xticks(range(len(importances)), [feature_names[i] for i in indices], rotation=90)
+        plt.tight_layout()
+        plt.savefig('feature_importance.png')
+        plt.close()
+    
+    def save(self, model_path):
+        """
+        保存模型
+        """
+        joblib.dump(self.model, model_path)
+        print(f"模型已保存到 {model_path}")
+    
+    @classmethod
+    def from_file(cls, model_path):
+        """
+        从已保存的模型文件恢复 BigDataModel, 用于增量训练
+        """
+        estimator = cls.load(model_path)
+        model = cls(fast=isinstance(estimator, HistGradientBoostingClassifier))
+        model.model = estimator
+        return model
+
+    @staticmethod
+    def load(model_path, mmap_mode=None):
+        """
+        加载模型, mmap_mode='r' 时模型中的数组以内存映射方式加载
+        """
+        return joblib.load(model_path, mmap_mode=mmap_mode)
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    # 加载预处理后的数据
+    df = pd.read_parquet("data/processed/preprocessed_data.parquet")
+    
+    # 准备特征和目标变量
+    X = df.drop("target", axis=1)
+    y = df["target"]
+    
+    # 创建并训练模型
+    model = BigDataModel()
+    model.train(X, y)
+    
+    # 保存模型
+    model.save("data/models/big_data_model.joblib")
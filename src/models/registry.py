@@ -0,0 +1,165 @@
+import os
+import glob
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
+
+# models.model(scikit-learn)、data.transform 和 pandas 在第一次预测时才导入, Web 服务启动时不加载
+
+class LoadedModel:
+    """
+    常驻内存的模型及其训练时的预处理参数
+    """
+    def __init__(self, name, model, preprocessor):
+        self.name = name
+        self.model = model
+        self.preprocessor = preprocessor
+
+    def predict_proba(self, df):
+        X = self.preprocessor.transform(df)
+        return self.model.predict_proba(X)[:, 1]
+
+class ModelRegistry:
+    """
+    data/models 中模型的进程内注册表
+
+    最近使用的 max_models 个模型常驻内存(LRU 淘汰), 模型数组以内存映射方式加载;
+    给定 catalog 时最新模型从目录索引中查询, 不扫描模型目录
+    """
+    def __init__(self, model_dir="data/models", max_models=4, mmap_mode="r", catalog=None):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self.mmap_mode = mmap_mode
+        self.catalog = catalog
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list_models(self):
+        """按修改时间从新到旧列出有预处理参数的模型"""
+        from models.model import preprocessor_path
+        paths = glob.glob(os.path.join(self.model_dir, "*.joblib"))
+        paths = [p for p in paths if not p.endswith(".preprocessor.joblib")
+                 and os.path.exists(preprocessor_path(p))]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        return [os.path.basename(p) for p in paths]
+
+    def latest(self):
+        from models.model import preprocessor_path
+        if self.catalog is not None:
+            model_path = self.catalog.latest_model()
+            if model_path is not None and os.path.exists(preprocessor_path(model_path)):
+                return os.path.basename(model_path)
+        models = self.list_models()
+        if not models:
+            raise FileNotFoundError(f"No models found in {self.model_dir}")
+        return models[0]
+
+    def get(self, name=None):
+        """获取模型, 未加载时从磁盘加载并可能淘汰最久未使用的模型"""
+        name = os.path.basename(name) if name else self.latest()
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+
+        # 只加载 list_models 列出的模型, 预处理参数等其他 .joblib 文件不能当作模型加载
+        if name not in self.list_models():
+            raise FileNotFoundError(f"Model not found: {name}")
+        model_path = os.path.join(self.model_dir, name)
+        from data.transform import Preprocessor
+        from models.model import BigDataModel, preprocessor_path
+        loaded = LoadedModel(name, BigDataModel.load(model_path, mmap_mode=self.mmap_mode),
+                             Preprocessor.load(preprocessor_path(model_path)))
+
+        with self._lock:
+            self._models[name] = loaded
+            self._models.move_to_end(name)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return loaded
+
+class PredictionTimeout(Exception):
+    """批量预测没有在限定时间内返回结果"""
+
+class MicroBatcher:
+    """
+    把并发的预测请求合并成一次 predict_proba 调用
+
+    第一个请求到达后, 若还有其他请求正在提交, 最多等待 max_delay 秒或凑满 max_batch_rows 行,
+    再按模型分组批量预测; 没有其他请求时立即预测。需要多线程的 Web worker(见 gunicorn.conf.py)
+    才会有并发的请求可合并
+    """
+    def __init__(self, registry, max_batch_rows=10000, max_delay=0.005, timeout=30):
+        self.registry = registry
+        self.max_batch_rows = max_batch_rows
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._pending = []
+        self._arriving = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def predict_proba(self, df, model_name=None):
+        """
+        提交一批数据并等待对应的预测概率; timeout 秒内没有结果(如批处理线程异常退出)时抛出 PredictionTimeout
+        """
+        with self._cond:
+            self._arriving += 1
+        try:
+            loaded = self.registry.get(model_name)
+            df = df[loaded.preprocessor.fitted_columns]
+        finally:
+            with self._cond:
+                self._arriving -= 1
+                self._cond.notify()
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            self._pending.append((loaded, df, future))
+            self._cond.notify()
+        try:
+            return loaded.name, future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._cond:
+                self._pending = [item for item in self._pending if item[2] is not future]
+            raise PredictionTimeout(f"预测在 {self.timeout} 秒内没有完成")
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_delay
+            # 只有其他请求正在提交时才值得等待
+            while self._arriving and sum(len(df) for _, df, _ in self._pending) < self.max_batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _run(self):
+        import pandas as pd
+        while True:
+            batch = self._take_batch()
+            groups = OrderedDict()
+            for loaded, df, future in batch:
+                groups.setdefault(loaded.name, (loaded, []))[1].append((df, future))
+            for loaded, requests in groups.values():
+                try:
+                    frame = pd.concat([df for df, _ in requests], ignore_index=True)
+                    proba = loaded.predict_proba(frame)
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                offsets = np.cumsum([0] + [len(df) for df, _ in requests])
+                for (_, future), start, end in zip(requests, offsets[:-1], offsets[1:]):
+                    future.set_result(proba[start:end])
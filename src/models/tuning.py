@@ -0,0 +1,141 @@
+import os
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.model_selection import ParameterSampler
+from data.matrix import FeatureMatrix
+from .model import BigDataModel, contiguous_split, _evaluate
+
+# 默认搜索空间, 迭代轮数(n_estimators)作为逐轮加倍的资源, 不在空间内
+SEARCH_SPACE = {
+    "learning_rate": [0.01, 0.03, 0.05, 0.1, 0.2, 0.3],
+    "max_depth": [2, 3, 4, 5, 6],
+    "min_samples_leaf": [1, 5, 20, 50],
+}
+
+def candidates(space=None, n_candidates=27, random_state=42):
+    """从搜索空间中抽取候选超参数, 相同参数下结果固定, 续跑时编号不变"""
+    return list(ParameterSampler(space or SEARCH_SPACE, n_candidates, random_state=random_state))
+
+def halving_schedule(n_candidates, min_resource=10, max_resource=270, eta=3):
+    """
+    逐次减半的各轮 (候选数, 迭代轮数): 每轮只保留得分最高的 1/eta, 资源乘以 eta, 最后一轮用满 max_resource
+    """
+    rounds = int(math.floor(math.log(max_resource / min_resource, eta) + 1e-9)) + 1
+    schedule = []
+    for i in range(rounds):
+        n = max(1, n_candidates // eta ** i)
+        schedule.append((n, min_resource * eta ** i))
+        if n == 1:
+            break
+    schedule[-1] = (schedule[-1][0], max_resource)
+    return schedule
+
+class TrialLog:
+    """
+    每个试验的结果追加写入 JSON Lines 文件, 中断后续跑时跳过已完成的 (候选, 迭代轮数)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写到一半被中断的最后一行
+                        continue
+                    self.trials[(trial["config"], trial["budget"])] = trial
+
+    def get(self, config, budget):
+        return self.trials.get((config, budget))
+
+    def append(self, trial):
+        self.trials[(trial["config"], trial["budget"])] = trial
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trial) + "\n")
+
+# 工作进程中打开的共享特征矩阵, 由进程池的 initializer 设置
+_matrix = None
+
+def _attach(directory):
+    global _matrix
+    _matrix = FeatureMatrix.open(directory)
+
+def _run_trial(fast, params, budget):
+    """在训练行上拟合一组超参数, 在验证行上评估; 两者都是共享矩阵的切片视图"""
+    X, y = _matrix.X, _matrix.y
+    train, valid = contiguous_split(_matrix.n_rows)
+    model = BigDataModel(fast=fast, n_jobs=1, **dict(params, n_estimators=budget))
+    start = time.perf_counter()
+    model.model.fit(X[train], y[train])
+    fit_time = time.perf_counter() - start
+    metrics = _evaluate(model.model, X[valid], y[valid])
+    return dict(metrics, fit_time=fit_time, n_iter=int(getattr(model.model, "n_iter_", budget)))
+
+def successive_halving(directory, fast=False, space=None, n_candidates=27, min_resource=10, max_resource=270,
+                       eta=3, scoring="auc", max_workers=None, random_state=42, progress=None):
+    """
+    在 directory 中的共享特征矩阵(行已随机重排的 FeatureMatrix)上用逐次减半搜索超参数
+
+    试验在 max_workers 个进程中并行, 各进程只以内存映射方式打开一次矩阵, 不随每个试验序列化数据;
+    结果写入 directory/trials.jsonl, 再次调用时已完成的试验直接读取。
+    progress(fraction, message) 在每个试验结束后调用, 可抛出异常中止搜索
+    """
+    configs = candidates(space, n_candidates, random_state)
+    schedule = halving_schedule(len(configs), min_resource, max_resource, eta)
+    log = TrialLog(os.path.join(directory, "trials.jsonl"))
+    total = sum(n for n, _ in schedule)
+    done = resumed = 0
+    survivors = list(range(len(configs)))
+    rounds = []
+    pending = {}
+
+    executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                   initializer=_attach, initargs=(directory,))
+    try:
+        for n, budget in schedule:
+            survivors = survivors[:n]
+            pending = {}
+            for config in survivors:
+                if log.get(config, budget) is None:
+                    pending[executor.submit(_run_trial, fast, configs[config], budget)] = config
+                else:
+                    resumed += 1
+            done += len(survivors) - len(pending)
+            for future in as_completed(pending):
+                config = pending[future]
+                metrics = future.result()
+                log.append({"config": config, "params": configs[config], "budget": budget,
+                            "score": metrics[scoring], "metrics": metrics})
+                done += 1
+                if progress is not None:
+                    progress(done / total, f"Trial {done}/{total}: {metrics[scoring]:.4f} at {budget} iterations")
+
+            # 按得分从高到低排序, 同分时保留编号小的候选, 续跑时结果一致
+            survivors.sort(key=lambda config: (-log.get(config, budget)["score"], config))
+            rounds.append({"budget": budget, "configs": survivors[:],
+                           "scores": [log.get(config, budget)["score"] for config in survivors]})
+    finally:
+        # 中止时取消尚未开始的试验(shutdown 的 cancel_futures 参数需要 Python 3.9)
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    best = log.get(survivors[0], schedule[-1][1])
+    return {"best_params": best["params"], "best_score": best["score"], "best_metrics": best["metrics"],
+            "budget": best["budget"], "scoring": scoring, "rounds": rounds, "n_trials": total,
+            "resumed_trials": resumed}
+
+def fit_best(directory, params, budget, fast=False):
+    """
+    用最优超参数在全部行(训练行和验证行)上重新训练最终模型
+
+    以矩阵的 DataFrame 视图拟合, 模型记录列名, 预测时与预处理输出的列对应
+    """
+    matrix = FeatureMatrix.open(directory)
+    model = BigDataModel(fast=fast, **dict(params, n_estimators=budget))
+    model.model.fit(matrix.features(), matrix.y)
+    return model
@@ -0,0 +1,461 @@
+import os
+from functools import partial
+import pandas as pd
+from data.aggregation import DatasetSummary, summarize_dataset
+from data.catalog import Catalog
+from data.matrix import FeatureMatrix
+from data.data_preprocessing import preprocess_frame, preprocess_to_matrix, merge_files_by_year, merge_files_by_variable
+from data.preview import preview_dataset, model_error_bounds
+from data.reader import DEFAULT_MEMORY_LIMIT, read_files
+from data.screening import screen_dataset, shortlist, report_records
+from data.storage import DEFAULT_FORMAT, FORMAT_EXTENSIONS, dataset_size, read_columns
+from data.transform import Preprocessor
+from models.model import BigDataModel, preprocessor_path, lineage_path, save_lineage, load_lineage
+from models.registry import ModelRegistry
+from models.tuning import fit_best, successive_halving
+from utils.helpers import get_timestamp, create_directory_if_not_exists
+from utils.cache import ResultCache, cache_key, file_hash
+from utils.metrics import stage, record_timings, current_context
+from utils.payload import figure_payload
+
+# 数据集和模型的 schema、统计和血缘索引; Web 服务把按配置创建的目录传给各任务函数, 未传入时使用默认目录
+default_catalog = Catalog("data/catalog.db")
+
+def _artifacts_in_use(catalog, artifacts):
+    """
+    淘汰缓存条目时需要保留的产物: 被条目以外的目录条目引用的产物(如 /retrain 在缓存的模型上训练出的新模型),
+    模型连同它的预处理器和血缘文件一起保留
+    """
+    owned = {os.path.normpath(path) for path in artifacts}
+    kept = set()
+    for path in artifacts:
+        if any(child not in owned for child in catalog.children(path)):
+            kept.add(path)
+            if path.endswith(".joblib"):
+                kept.update([preprocessor_path(path), lineage_path(path)])
+    return kept
+
+def _result_cache(catalog):
+    """预处理和训练结果按输入内容、所选变量和模型超参数缓存, 淘汰时保留 catalog 中仍被引用的产物"""
+    return ResultCache("data/cache", keep=partial(_artifacts_in_use, catalog))
+
+# 预览模式的分层样本行数
+PREVIEW_SAMPLE_SIZE = 100000
+
+# 趋势图、相关性热力图和特征重要性图最多展示的特征数, 更宽的数据只展示排名靠前的特征
+MAX_PLOTTED_FEATURES = 50
+
+# 训练结果的图表按行块聚合, 临时数组的大小只取决于块大小
+SUMMARY_CHUNK_ROWS = 100000
+
+def _report(progress, fraction, message):
+    if progress is not None:
+        progress(fraction, message)
+
+def _new_output_path(directory, prefix, suffix=""):
+    """
+    生成带时间戳的输出路径; 在后台任务中再带上任务 id, 同一秒内并发的任务不会写到同一路径,
+    同名路径已存在时追加序号
+    """
+    create_directory_if_not_exists(directory)
+    job_id = current_context().get("job_id")
+    base = os.path.join(directory, f"{prefix}_{get_timestamp()}" + (f"_{job_id}" if job_id else ""))
+    path, n = base + suffix, 1
+    while os.path.exists(path):
+        path, n = f"{base}_{n}{suffix}", n + 1
+    return path
+
+def _new_model_path(model_dir):
+    return _new_output_path(model_dir, "big_data_model", ".joblib")
+
+def run_merge(file_paths, merge_type, partition_by_year=False, key=None, max_workers=None,
+              memory_limit=DEFAULT_MEMORY_LIMIT, preview=False, catalog=None, progress=None):
+    """
+    合并上传的文件并生成可视化, 文件由 max_workers 个进程并行读取
+
+    preview=True 时图表由草图和样本近似生成(见 preview_merge), 结果附带误差范围; 合并本身总是完整执行
+    """
+    if merge_type not in ('by_year', 'by_variable'):
+        raise ValueError(f"Invalid merge type: {merge_type}")
+    catalog = catalog or default_catalog
+    _report(progress, 0.0, "Merging files")
+    # 每个任务写到自己的输出路径, 并发的合并任务互不覆盖
+    output_path = _new_output_path("data/raw", f"merged_data_{merge_type}", FORMAT_EXTENSIONS[DEFAULT_FORMAT])
+    with stage(f"merge.{merge_type}", bytes_read=sum(dataset_size(path) for path in file_paths)) as timer:
+        if merge_type == 'by_year':
+            merged_file_path = merge_files_by_year(file_paths, output_path, partition_by_year=partition_by_year,
+                                                   max_workers=max_workers, memory_limit=memory_limit)
+        else:
+            merged_file_path = merge_files_by_variable(file_paths, output_path, key=key, max_workers=max_workers,
+                                                       memory_limit=memory_limit)
+        timer.add(bytes_written=dataset_size(merged_file_path))
+
+    _report(progress, 0.6, "Generating visualizations")
+    error_bounds = None
+    with stage("visualize"):
+        if preview:
+            visualizations, error_bounds = preview_merge(merged_file_path, merge_type, catalog=catalog)
+        elif merge_type == 'by_year':
+            visualizations = visualize_merge_by_year(merged_file_path, catalog)
+        else:
+            visualizations = visualize_merge_by_variable(merged_file_path, catalog)
+
+    _report(progress, 0.9, "Updating catalog")
+    with stage("catalog.register"):
+        for path in file_paths:
+            catalog.register_dataset(path)
+        entry = catalog.register_dataset(merged_file_path, "merged", parents=file_paths)
+    return {"path": merged_file_path, "columns": entry["columns"], "visualizations": visualizations,
+            "preview": preview, "error_bounds": error_bounds}
+
+def run_register(file_path, kind=None, metadata=None, catalog=None, progress=None):
+    """
+    把数据集登记到目录(计算内容哈希和各分区、各列的统计); 上传完成后在后台任务中执行, 不占用请求线程
+    """
+    catalog = catalog or default_catalog
+    _report(progress, 0.0, "Registering dataset")
+    with stage("catalog.register", bytes_read=dataset_size(file_path)):
+        entry = catalog.register_dataset(file_path, kind, metadata=metadata)
+    return {"path": entry["path"], "row_count": entry["row_count"], "columns": entry["columns"]}
+
+def run_screen(file_path, selected_variables=None, max_features=None, key=None, progress=None):
+    """
+    在所选变量(未选时为全部数值列)中筛选特征, 返回按排名排序的入选特征和每列的统计量与剔除原因;
+    标识列和合并用的 key 列不参与筛选
+    """
+    _report(progress, 0.0, "Screening features")
+    with stage("screen", bytes_read=dataset_size(file_path)):
+        report = screen_dataset(file_path, columns=selected_variables or None, exclude=[key] if key else (),
+                                max_features=max_features)
+    return {"shortlist": shortlist(report), "features": report_records(report)}
+
+def run_process(file_path, selected_variables, chunksize=None, fast=False, preview=False, screen=False,
+                max_features=None, sample_size=PREVIEW_SAMPLE_SIZE, key=None, catalog=None, progress=None,
+                use_cache=True):
+    """
+    预处理数据、训练并保存模型, 然后生成可视化
+
+    相同输入文件、所选变量和模型超参数的结果直接从缓存返回;
+    preview=True 时只在分层样本上训练, 见 run_preview;
+    screen=True 时先剔除缺失过多、近似常量和冗余的列, 只用排名前 max_features 的特征训练, 结果附带筛选报告
+    """
+    if screen:
+        screening = run_screen(file_path, selected_variables, max_features=max_features, key=key, progress=progress)
+        if not screening["shortlist"]:
+            raise ValueError("没有特征通过筛选")
+        result = run_process(file_path, screening["shortlist"], chunksize=chunksize, fast=fast, preview=preview,
+                             sample_size=sample_size, catalog=catalog, progress=progress, use_cache=use_cache)
+        return dict(result, screening=screening)
+    if preview:
+        return run_preview(file_path, selected_variables, fast=fast, sample_size=sample_size, progress=progress)
+    catalog = catalog or default_catalog
+    result_cache = _result_cache(catalog)
+    model = BigDataModel(fast=fast)
+    input_hash = file_hash(file_path)
+    # key 参数是数据的键列, 缓存键另用一个名字
+    result_key = cache_key(input_hash, sorted(selected_variables), model.model.get_params())
+    if use_cache:
+        cached = result_cache.get(result_key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    # 数据预处理: 直接写成内存映射的共享特征矩阵, 训练、交叉验证和可视化都使用它的视图
+    _report(progress, 0.0, "Preprocessing data")
+    processed_data_path = _new_output_path("data/processed", "preprocessed_data")
+    matrix, preprocessor = preprocess_to_matrix(file_path, processed_data_path, selected_variables,
+                                                chunksize=chunksize, dtype=model.input_dtype)
+
+    # 模型训练
+    _report(progress, 0.3, "Training model")
+    with stage("train", rows=matrix.n_rows):
+        metrics = model.train(matrix.features(), matrix.target(), plot=False, shuffled=matrix.shuffled)
+    record_timings("train", metrics["timings"])
+
+    # 保存模型
+    model_path = _new_model_path("data/models")
+    with stage("save_model") as timer:
+        model.save(model_path)
+        preprocessor.save(preprocessor_path(model_path))
+        save_lineage(model_path, {file_path: input_hash}, n_rows=matrix.n_rows)
+        timer.add(bytes_written=os.path.getsize(model_path))
+    with stage("catalog.register"):
+        catalog.register_dataset(file_path)
+        catalog.register_matrix(matrix, result_key, parents=[file_path],
+                                metadata={"selected_variables": selected_variables})
+        catalog.register_model(model_path, parents=[processed_data_path], metadata={"metrics": metrics})
+
+    # 生成可视化
+    _report(progress, 0.9, "Generating visualizations")
+    with stage("visualize"):
+        visualizations = generate_visualizations(matrix.frame(), selected_variables, model)
+    memory = {"matrix_bytes": matrix.nbytes, "dtype": matrix.X.dtype.name}
+    result = {"processed_path": processed_data_path, "model_path": model_path,
+              "metrics": metrics, "memory": memory, "visualizations": visualizations}
+    if use_cache:
+        result_cache.put(result_key, result, artifacts=[processed_data_path, model_path, preprocessor_path(model_path),
+                                                 lineage_path(model_path)])
+    return dict(result, cached=False)
+
+def run_tune(file_path, selected_variables, chunksize=None, fast=False, space=None, n_candidates=27,
+             min_resource=10, max_resource=270, eta=3, max_workers=None, catalog=None, progress=None):
+    """
+    用逐次减半搜索模型超参数, 最优模型在全部数据上重新训练后保存到 data/models 并登记到目录
+
+    预处理后的共享特征矩阵和每个试验的结果保存在 data/tuning/<键> 下, 键由输入内容、所选变量和
+    搜索设置决定; 任务中断或取消后以相同参数再次提交, 只运行尚未完成的试验
+    """
+    catalog = catalog or default_catalog
+    input_hash = file_hash(file_path)
+    tuning_key = cache_key(input_hash, sorted(selected_variables),
+                           dict(fast=fast, space=space, n_candidates=n_candidates, min_resource=min_resource,
+                                max_resource=max_resource, eta=eta))
+    tuning_dir = os.path.join("data/tuning", tuning_key)
+    create_directory_if_not_exists(tuning_dir)
+    tuning_preprocessor_path = os.path.join(tuning_dir, "preprocessor.joblib")
+
+    if not (FeatureMatrix.exists(tuning_dir) and os.path.exists(tuning_preprocessor_path)):
+        _report(progress, 0.0, "Preprocessing data")
+        _, preprocessor = preprocess_to_matrix(file_path, tuning_dir, selected_variables, chunksize=chunksize,
+                                               dtype=BigDataModel(fast=fast).input_dtype)
+        preprocessor.save(tuning_preprocessor_path)
+    matrix = FeatureMatrix.open(tuning_dir)
+    preprocessor = Preprocessor.load(tuning_preprocessor_path)
+
+    _report(progress, 0.1, "Searching hyperparameters")
+    with stage("tune.search"):
+        search = successive_halving(
+            tuning_dir, fast=fast, space=space, n_candidates=n_candidates, min_resource=min_resource,
+            max_resource=max_resource, eta=eta, max_workers=max_workers,
+            progress=lambda fraction, message: _report(progress, 0.1 + 0.8 * fraction, message))
+
+    _report(progress, 0.9, "Training best model")
+    with stage("tune.fit_best"):
+        model = fit_best(tuning_dir, search["best_params"], search["budget"], fast=fast)
+
+    model_path = _new_model_path("data/models")
+    with stage("save_model") as timer:
+        model.save(model_path)
+        preprocessor.save(preprocessor_path(model_path))
+        save_lineage(model_path, {file_path: input_hash}, n_rows=matrix.n_rows)
+        timer.add(bytes_written=os.path.getsize(model_path))
+    with stage("catalog.register"):
+        catalog.register_dataset(file_path)
+        catalog.register_matrix(matrix, tuning_key, parents=[file_path],
+                                metadata={"selected_variables": selected_variables})
+        catalog.register_model(model_path, parents=[tuning_dir],
+                               metadata={"metrics": search["best_metrics"], "params": search["best_params"],
+                                         "tuning": tuning_dir})
+    return dict(search, model_path=model_path)
+
+def run_preview(file_path, selected_variables, fast=False, sample_size=PREVIEW_SAMPLE_SIZE, progress=None):
+    """
+    快速预览: 扫描一遍数据, 得到精确的流式统计、各列草图和按 target/year 分层的样本,
+    在样本上预处理和训练, 返回带置信区间的指标和近似图表
+
+    预览结果不保存模型、不写缓存也不登记到目录; 确认后以完整模式运行 run_process 得到可提交的模型。
+    图表基于原始(未标准化)的数值
+    """
+    model = BigDataModel(fast=fast)
+    present = selected_variables + ['target'] if selected_variables else read_columns(file_path)
+    group_by = 'year' if 'year' in present else None
+    columns = [var for var in selected_variables if var != group_by] or None
+
+    _report(progress, 0.0, "Sampling data")
+    with stage("preview.sample", bytes_read=dataset_size(file_path)) as timer:
+        summary = preview_dataset(file_path, columns=columns, group_by=group_by,
+                                  value_counts=['target'] if 'target' in present else [],
+                                  stratify=[col for col in ('target', 'year') if col in present],
+                                  sample_size=sample_size)
+        timer.add(rows=summary.n_rows)
+    df, _ = preprocess_frame(summary.sample, selected_variables)
+
+    _report(progress, 0.3, "Training model on sample")
+    X = df.drop("target", axis=1)
+    y = df["target"]
+    with stage("train.preview", rows=len(df)):
+        metrics = model.train(X, y, plot=False)
+    record_timings("train.preview", metrics["timings"])
+
+    _report(progress, 0.9, "Generating visualizations")
+    with stage("visualize"):
+        visualizations = generate_visualizations(df, selected_variables, model, summary=summary)
+    error_bounds = dict(summary.error_bounds(), model=model_error_bounds(metrics))
+    return {"preview": True, "metrics": metrics, "error_bounds": error_bounds,
+            "visualizations": visualizations, "cached": False}
+
+def run_incremental(file_paths, model_name=None, n_estimators=50, catalog=None, progress=None):
+    """
+    在已有模型上增量训练: 只使用该模型血缘中没见过的原始文件, 预处理参数沿用原模型
+    """
+    catalog = catalog or default_catalog
+    model_dir = "data/models"
+    base_path = os.path.join(model_dir, os.path.basename(
+        model_name or catalog.latest_model() or ModelRegistry(model_dir).latest()))
+    lineage = load_lineage(base_path)
+
+    # 只保留内容没有被训练过的文件
+    _report(progress, 0.0, "Collecting new data")
+    hashes = {path: file_hash(path) for path in file_paths}
+    seen = set(lineage["files"].values())
+    new_files = {path: h for path, h in hashes.items() if h not in seen}
+    if not new_files:
+        return {"model_path": base_path, "new_files": [], "metrics": None}
+
+    preprocessor = Preprocessor.load(preprocessor_path(base_path))
+    columns = preprocessor.fitted_columns + ["target"]
+    df = pd.concat(read_files(list(new_files), columns=columns), ignore_index=True)
+    X = preprocessor.transform(df)
+    y = df["target"]
+
+    _report(progress, 0.3, "Training model")
+    model = BigDataModel.from_file(base_path)
+    with stage("train.update", rows=len(df)):
+        metrics = model.update(X, y, n_estimators=n_estimators)
+    record_timings("train.update", metrics["timings"])
+
+    model_path = _new_model_path(model_dir)
+    model.save(model_path)
+    preprocessor.save(preprocessor_path(model_path))
+    save_lineage(model_path, dict(lineage["files"], **new_files), parent=os.path.basename(base_path),
+                 n_rows=lineage["n_rows"] + len(df))
+    for path in new_files:
+        catalog.register_dataset(path)
+    catalog.register_model(model_path, parents=[base_path, *new_files], metadata={"metrics": metrics})
+    return {"model_path": model_path, "parent": os.path.basename(base_path),
+            "new_files": list(new_files), "metrics": metrics}
+
+def _cached_visualizations(kind, file_path, build, catalog=None):
+    """
+    按数据集内容缓存可视化结果, 同一版本的数据集只聚合一次
+    """
+    result_cache = _result_cache(catalog or default_catalog)
+    key = cache_key(kind, file_hash(file_path))
+    visualizations = result_cache.get(key)
+    if visualizations is None:
+        visualizations = build(file_path)
+        result_cache.put(key, visualizations)
+    return visualizations
+
+# plotly 在生成图表时才导入, 只做增量训练等不需要图表的任务不加载它
+
+def _trend_figure(summary, col, title):
+    import plotly.express as px
+    means = summary.group_means[col]
+    return px.line(x=means.index, y=means.values, labels={'x': summary.group_by, 'y': col}, title=title)
+
+def _box_figure(summary, title):
+    import plotly.graph_objs as go
+    stats = summary.box_stats()
+    fig = go.Figure(go.Box(x=list(stats.index), q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+                           lowerfence=stats['lowerfence'], upperfence=stats['upperfence'],
+                           mean=stats['mean'], boxpoints=False))
+    fig.update_layout(title=title, xaxis_title='Variable', yaxis_title='Value')
+    return fig
+
+def _heatmap_figure(summary, title):
+    import plotly.express as px
+    corr = summary.correlation()
+    return px.imshow(corr, labels=dict(color="Correlation"), x=corr.columns, y=corr.columns, title=title)
+
+def preview_merge(file_path, merge_type, sample_size=PREVIEW_SAMPLE_SIZE, catalog=None):
+    """
+    合并结果的近似图表, 返回 (图表, 误差范围)
+
+    按年份合并的图表只用到精确的流式计数和均值, 与完整模式相同;
+    按变量合并时分位数来自 t-digest、相关系数来自样本, 并附加 HyperLogLog 估计的去重个数
+    """
+    if merge_type == 'by_year':
+        return visualize_merge_by_year(file_path, catalog), None
+    import plotly.express as px
+    summary = preview_dataset(file_path, distinct=True, sample_size=sample_size)
+    visualizations = _merge_by_variable_figures(summary)
+
+    distinct = summary.distinct_counts()
+    fig_distinct = px.bar(x=distinct.index, y=distinct.values, labels={'x': 'Variable', 'y': 'Distinct values'},
+                          title='Approximate Distinct Values')
+    visualizations['distinct_values'] = figure_payload(fig_distinct)
+    return visualizations, summary.error_bounds()
+
+def visualize_merge_by_year(file_path, catalog=None):
+    return _cached_visualizations('merge_by_year', file_path, _build_merge_by_year, catalog)
+
+def _build_merge_by_year(file_path):
+    import plotly.express as px
+    summary = summarize_dataset(file_path, group_by='year', correlation=False, sample_size=0)
+    visualizations = {}
+    
+    # 创建年度数据总量柱状图
+    sizes = summary.group_sizes.sort_index()
+    fig_yearly_data = px.bar(x=sizes.index, y=sizes.values, labels={'x': 'year', 'y': 'count'},
+                             title='Yearly Data Count')
+    visualizations['yearly_data_count'] = figure_payload(fig_yearly_data)
+    
+    # 为每个数值列创建年度趋势线图
+    for col in summary.columns:
+        fig_trend = _trend_figure(summary, col, f'{col} Yearly Trend')
+        visualizations[f'{col}_yearly_trend'] = figure_payload(fig_trend)
+    
+    return visualizations
+
+def visualize_merge_by_variable(file_path, catalog=None):
+    return _cached_visualizations('merge_by_variable', file_path, _build_merge_by_variable, catalog)
+
+def _build_merge_by_variable(file_path):
+    return _merge_by_variable_figures(summarize_dataset(file_path))
+
+def _merge_by_variable_figures(summary):
+    visualizations = {}
+    
+    # 创建变量数据分布箱型图
+    fig_distribution = _box_figure(summary, 'Variable Distribution')
+    visualizations['variable_distribution'] = figure_payload(fig_distribution)
+    
+    # 创建变量间相关性热力图
+    fig_heatmap = _heatmap_figure(summary, 'Variable Correlation Heatmap')
+    visualizations['correlation_heatmap'] = figure_payload(fig_heatmap)
+    
+    return visualizations
+
+def generate_visualizations(df, selected_variables, model, summary=None):
+    """
+    生成训练结果的图表; 传入 summary(如预览模式的 PreviewSummary)时直接使用, 否则在 df 上聚合
+    """
+    import plotly.express as px
+    visualizations = {}
+    group_by = 'year' if 'year' in df.columns else None
+    value_counts = ['target'] if 'target' in df.columns else []
+    columns = [var for var in selected_variables if var in df.columns and var != group_by][:MAX_PLOTTED_FEATURES]
+    if summary is None:
+        summary = DatasetSummary(columns, group_by=group_by, value_counts=value_counts, sample_size=0)
+        # df 为共享特征矩阵的视图时, 按行切片不复制数据
+        for start in range(0, len(df), SUMMARY_CHUNK_ROWS):
+            summary.update(df.iloc[start:start + SUMMARY_CHUNK_ROWS])
+    else:
+        columns = [var for var in columns if var in summary.columns]
+    
+    # 按年份分组的数据趋势
+    if group_by:
+        for var in columns:
+            fig = _trend_figure(summary, var, f'{var} Trend Over Years')
+            visualizations[f'{var}_trend'] = figure_payload(fig)
+    
+    # 相关性热力图
+    fig_heatmap = _heatmap_figure(summary, 'Feature Correlation Heatmap')
+    visualizations['heatmap'] = figure_payload(fig_heatmap)
+    
+    # 目标变量分布
+    if value_counts:
+        target_counts = summary.value_counts['target'].sort_index()
+        fig_target = px.bar(x=target_counts.index, y=target_counts.values, labels={'x': 'Target', 'y': 'Count'})
+        fig_target.update_layout(title='Target Variable Distribution')
+        visualizations['target_distribution'] = figure_payload(fig_target)
+    
+    # 特征重要性
+    if hasattr(model.model, 'feature_importances_'):
+        importance = pd.Series(model.model.feature_importances_, index=df.columns.drop('target'))
+        importance = importance.sort_values(ascending=False).head(MAX_PLOTTED_FEATURES)
+        fig_importance = px.bar(x=importance.index, y=importance.values, labels={'x': 'Features', 'y': 'Importance'})
+        fig_importance.update_layout(title='Feature Importance')
+        visualizations['feature_importance'] = figure_payload(fig_importance)
+    
+    return visualizations
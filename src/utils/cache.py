@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+
+def file_hash(path, block_size=1 << 20):
+    """计算文件内容的 SHA-256; 目录(分区数据集)按文件名顺序合并计算"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, name) for name in os.listdir(path))
+    else:
+        paths = [path]
+    for file_path in paths:
+        if file_path != path:
+            digest.update(os.path.basename(file_path).encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(*parts):
+    """由任意可 JSON 序列化的参数生成缓存键"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    内容寻址的结果缓存
+
+    每个条目是 cache_dir 下的一个 JSON 文件, 记录结果和对应的产物路径(文件或目录), 条目文件的
+    修改时间即最近访问时间。evict 按条目的 LRU 顺序整体删除条目和它记录的产物, 使缓存的总大小
+    不超过 max_bytes; 不属于任何条目的文件不会被删除。keep(产物列表) 返回淘汰条目时仍需保留的产物,
+    例如已被其他模型引用的模型文件
+    """
+    def __init__(self, cache_dir="data/cache", max_bytes=5 * 1024 ** 3, keep=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.keep = keep
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """命中时返回缓存的结果, 产物文件已被删除时视为未命中"""
+        entry = _read_entry(self._entry_path(key))
+        if entry is None:
+            return None
+        if not all(os.path.exists(path) for path in entry["artifacts"]):
+            _remove(self._entry_path(key))
+            return None
+        now = time.time()
+        try:
+            for path in [self._entry_path(key)] + entry["artifacts"]:
+                os.utime(path, (now, now))
+        except FileNotFoundError:
+            # 条目刚被其他进程淘汰
+            return None
+        return entry["result"]
+
+    def put(self, key, result, artifacts=()):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._entry_path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "result": result, "artifacts": list(artifacts)}, f)
+        os.replace(tmp_path, self._entry_path(key))
+        self.evict()
+
+    def evict(self):
+        """按最近访问时间从旧到新整体删除条目, 直到缓存的总大小不超过上限"""
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                entry_path = os.path.join(self.cache_dir, name)
+                entry = _read_entry(entry_path)
+                if entry is None:
+                    continue
+                try:
+                    mtime = os.stat(entry_path).st_mtime
+                except FileNotFoundError:
+                    continue
+                size = _size(entry_path) + sum(_size(path) for path in entry["artifacts"])
+                entries.append((mtime, size, entry_path, entry["artifacts"]))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, entry_path, artifacts in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # 先删除条目文件, 其他进程不会再命中一个产物不完整的条目
+            _remove(entry_path)
+            kept = set(self.keep(artifacts)) if self.keep is not None and artifacts else set()
+            for path in artifacts:
+                if path not in kept:
+                    _remove(path)
+            total -= size
+            logging.info(f"Evicted cache entry: {entry_path}")
+
+def _read_entry(entry_path):
+    try:
+        with open(entry_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _size(path):
+    """文件或目录的总字节数, 已被删除的视为 0"""
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        total = 0
+        for root, _, names in os.walk(path):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except FileNotFoundError:
+                    pass
+        return total
+    except FileNotFoundError:
+        return 0
+
+def _remove(path):
+    """删除文件或目录, 已被其他进程删除时忽略"""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,20 +1,48 @@
 import os
+import json
 import logging
 from datetime import datetime
+from .metrics import current_context
 
-def setup_logging(log_file="big_data_model.log"):
-    """设置日志"""
+class JsonFormatter(logging.Formatter):
+    """
+    每条日志输出一行 JSON, 附带当前的 request_id/job_id 和阶段指标(record.metrics)
+    """
+    def format(self, record):
+        entry = {"time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        entry.update(current_context())
+        entry.update(getattr(record, "metrics", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging(log_file="big_data_model.log", json_format=None):
+    """
+    设置日志
+
+    json_format 为 True(或环境变量 LOG_FORMAT=json)时输出结构化 JSON 日志, 便于按请求/任务 id 检索。
+    根日志已有处理器时(如从已配置的 gunicorn 主进程 fork 出的 worker 和任务进程)不再重复配置
+    """
+    if logging.getLogger().handlers:
+        return
     log_dir = "logs"
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
+    if json_format is None:
+        json_format = os.environ.get("LOG_FORMAT", "").lower() == "json"
     
+    handlers = [
+        logging.FileHandler(os.path.join(log_dir, log_file)),
+        logging.StreamHandler()
+    ]
+    if json_format:
+        for handler in handlers:
+            handler.setFormatter(JsonFormatter())
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[
-            logging.FileHandler(os.path.join(log_dir, log_file)),
-            logging.StreamHandler()
-        ]
+        handlers=handlers
     )
 
 def get_timestamp():
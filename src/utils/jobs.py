@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import uuid
+import logging
+import importlib
+import threading
+import traceback
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from . import metrics
+from .helpers import setup_logging
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+class JobQueueFull(Exception):
+    """排队中的任务数达到上限"""
+
+# 任务结束后的状态, 其余状态(queued、running)的任务仍在排队或运行
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+def _status_path(job_dir, job_id):
+    return os.path.join(job_dir, f"{job_id}.json")
+
+def _cancel_path(job_dir, job_id):
+    return os.path.join(job_dir, f"{job_id}.cancel")
+
+def _write_status(job_dir, job_id, **fields):
+    """更新任务状态文件, 先写临时文件再替换, 读取方不会看到半个文件"""
+    status = read_status(job_dir, job_id) or {"id": job_id}
+    status.update(fields, updated_at=time.time())
+    tmp_path = _status_path(job_dir, job_id) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, _status_path(job_dir, job_id))
+    return status
+
+def read_status(job_dir, job_id):
+    """读取任务状态, 任务不存在时返回 None"""
+    try:
+        with open(_status_path(job_dir, job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+class JobContext:
+    """在工作进程中向任务状态文件汇报进度, 并在检查点响应取消请求"""
+    def __init__(self, job_dir, job_id):
+        self.job_dir = job_dir
+        self.job_id = job_id
+
+    def cancelled(self):
+        return os.path.exists(_cancel_path(self.job_dir, self.job_id))
+
+    def progress(self, fraction, message=""):
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+        _write_status(self.job_dir, self.job_id, progress=fraction, message=message)
+
+def _resolve(func):
+    """任务函数可以写成 "模块:函数", 在工作进程中才导入, 提交任务的 Web 进程不必加载其依赖"""
+    if isinstance(func, str):
+        module, _, name = func.partition(":")
+        return getattr(importlib.import_module(module), name)
+    return func
+
+def _job_name(func):
+    if isinstance(func, str):
+        return func.rpartition(":")[2]
+    return getattr(func, "__name__", str(func))
+
+def _init_worker():
+    """任务进程的初始化: 不是从已配置日志的进程 fork 出来时(spawn/forkserver)在这里配置日志"""
+    setup_logging()
+
+def _run_job(job_dir, job_id, func, args, kwargs, trace_context=None):
+    """
+    在进程池中执行任务, 结果和异常都写入状态文件
+
+    任务期间的日志和阶段指标带上 job_id 和提交任务的 request_id, 结束后把本进程的指标写入快照
+    """
+    context = JobContext(job_dir, job_id)
+    name = _job_name(func)
+    state = "failed"
+    with metrics.trace(**dict(trace_context or {}, job_id=job_id)):
+        try:
+            if context.cancelled():
+                raise JobCancelled(job_id)
+            _write_status(job_dir, job_id, state="running", started_at=time.time(), pid=os.getpid())
+            with metrics.stage(f"job.{name}"):
+                result = _resolve(func)(*args, progress=context.progress, **kwargs)
+            _write_status(job_dir, job_id, state="succeeded", progress=1.0, result=result)
+            state = "succeeded"
+        except JobCancelled:
+            _write_status(job_dir, job_id, state="cancelled")
+            state = "cancelled"
+        except Exception as e:
+            logging.exception(f"Job {job_id} failed")
+            _write_status(job_dir, job_id, state="failed", error=str(e), traceback=traceback.format_exc())
+        finally:
+            if metrics.enabled():
+                metrics.registry().inc(f"{metrics.PREFIX}_jobs_total", name=name, state=state)
+                metrics.flush()
+
+class JobQueue:
+    """
+    基于本地进程池的后台任务队列
+
+    任务函数需接受 progress 关键字参数; 状态保存在 job_dir 下的 JSON 文件中,
+    因此同一台机器上的多个 gunicorn worker 都能查询和取消任务。
+
+    每个 gunicorn worker 有自己的队列和进程池: max_workers 和 max_pending 都是单个 worker 的上限,
+    整台机器上最多有 worker 数 * max_pending 个任务在排队或运行。
+
+    任务进程异常退出(进程池损坏)时任务标记为 failed, 之后提交的任务使用新的进程池;
+    创建队列时, 提交进程和任务进程都已退出的未结束任务(如 worker 被 gunicorn 回收)也标记为 failed
+    """
+    def __init__(self, job_dir="data/jobs", max_workers=2, max_pending=16):
+        self.job_dir = job_dir
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._futures = {}
+        # 多线程的 Web worker 中多个请求线程共用一个队列
+        self._lock = threading.RLock()
+        self.fail_orphaned()
+
+    def fail_orphaned(self):
+        """把提交进程和任务进程都已退出、却仍处于 queued/running 的任务标记为 failed, 返回这些任务 id"""
+        if not os.path.isdir(self.job_dir):
+            return []
+        orphaned = []
+        for name in os.listdir(self.job_dir):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            try:
+                status = read_status(self.job_dir, job_id)
+            except ValueError:
+                continue
+            if status is None or status.get("state") in FINISHED_STATES:
+                continue
+            if any(metrics.process_alive(pid) for pid in (status.get("owner"), status.get("pid")) if pid):
+                continue
+            _write_status(self.job_dir, job_id, state="failed", error="任务所在的进程已退出")
+            orphaned.append(job_id)
+        if orphaned:
+            logging.warning(f"Marked {len(orphaned)} orphaned jobs as failed")
+        return orphaned
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(self.job_dir, exist_ok=True)
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+            return self._executor
+
+    def pending_count(self):
+        with self._lock:
+            self._futures = {job_id: f for job_id, f in self._futures.items() if not f.done()}
+            return len(self._futures)
+
+    def submit(self, func, *args, **kwargs):
+        """提交任务并立即返回任务 id; func 可以是函数或 "模块:函数" 字符串"""
+        with self._lock:
+            if self.pending_count() >= self.max_pending:
+                raise JobQueueFull(f"已有 {self.max_pending} 个任务在排队或运行")
+            executor = self._get_executor()
+            job_id = uuid.uuid4().hex
+            _write_status(self.job_dir, job_id, state="queued", progress=0.0, message="",
+                          name=_job_name(func), created_at=time.time(), owner=os.getpid())
+            future = executor.submit(_run_job, self.job_dir, job_id, func, args, kwargs,
+                                     metrics.current_context())
+            self._futures[job_id] = future
+            future.add_done_callback(partial(self._job_done, job_id, executor))
+        logging.info(f"Submitted job {job_id}")
+        return job_id
+
+    def _job_done(self, job_id, executor, future):
+        """
+        _run_job 自己记录任务的结果和异常; future 带着异常结束说明任务没能正常执行完
+        (任务进程被杀死导致进程池损坏, 或参数无法序列化), 在这里把任务标记为 failed
+        """
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            return
+        if isinstance(error, BrokenProcessPool):
+            # 损坏的进程池不能再提交任务, 下次提交时重新创建
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+        status = self.status(job_id)
+        if status is not None and status["state"] not in FINISHED_STATES:
+            logging.error(f"Job {job_id} failed: {error!r}")
+            _write_status(self.job_dir, job_id, state="failed", error=f"{type(error).__name__}: {error}")
+
+    def status(self, job_id):
+        return read_status(self.job_dir, job_id)
+
+    def cancel(self, job_id):
+        """取消任务: 排队中的直接取消, 运行中的在下一个进度检查点停止"""
+        status = self.status(job_id)
+        if status is None or status["state"] in FINISHED_STATES:
+            return False
+        open(_cancel_path(self.job_dir, job_id), "w").close()
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            _write_status(self.job_dir, job_id, state="cancelled")
+        return True
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
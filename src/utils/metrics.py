@@ -0,0 +1,407 @@
+import os
+import json
+import re
+import glob
+import time
+import logging
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger("bigdata.metrics")
+
+# 指标名前缀
+PREFIX = "bigdata"
+
+# 设置环境变量 BIGDATA_METRICS=0 关闭指标; 关闭后 stage 返回空操作对象, 几乎没有开销
+_enabled = os.environ.get("BIGDATA_METRICS", "1") != "0"
+
+# 各进程把指标快照写到该目录, /metrics 汇总所有进程(gunicorn worker、任务进程)的快照;
+# 通过环境变量传给子进程
+_directory = os.environ.get("BIGDATA_METRICS_DIR")
+
+# 写快照的最小间隔(秒)
+FLUSH_INTERVAL = 1.0
+
+# 阶段进行期间采样常驻内存的间隔(秒)
+RSS_SAMPLE_INTERVAL = 0.05
+
+# 当前请求/任务的标识, 写入结构化日志
+_context = contextvars.ContextVar("bigdata_trace_context", default={})
+
+def configure(enabled=None, directory=None):
+    """设置是否记录指标以及快照目录, 子进程通过环境变量继承"""
+    global _enabled, _directory
+    if enabled is not None:
+        _enabled = bool(enabled)
+        os.environ["BIGDATA_METRICS"] = "1" if _enabled else "0"
+    if directory is not None:
+        _directory = directory
+        os.environ["BIGDATA_METRICS_DIR"] = directory
+
+def enabled():
+    return _enabled
+
+def current_context():
+    """返回当前的 request_id/job_id 等标识"""
+    return _context.get()
+
+def set_context(**ids):
+    """在当前上下文中追加标识, 返回用于 reset_context 的 token"""
+    return _context.set(dict(_context.get(), **{k: v for k, v in ids.items() if v is not None}))
+
+def reset_context(token):
+    _context.reset(token)
+
+@contextmanager
+def trace(**ids):
+    """在 with 块内为日志和阶段记录附加 request_id/job_id"""
+    token = set_context(**ids)
+    try:
+        yield current_context()
+    finally:
+        reset_context(token)
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class MetricsRegistry:
+    """
+    进程内的计数器、取最大值的仪表和摘要(次数与总和)
+
+    样本以 (指标族, 后缀, 标签) 为键; 多个进程的快照合并时计数器相加, 仪表取最大值
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._types = {}
+        self._values = {}
+        self._last_flush = 0.0
+
+    def _add(self, kind, family, suffix, labels, value):
+        key = (family, suffix, _labels_key(labels))
+        with self._lock:
+            self._types[family] = kind
+            if kind == "gauge":
+                self._values[key] = max(self._values.get(key, value), value)
+            else:
+                self._values[key] = self._values.get(key, 0) + value
+
+    def inc(self, metric, value=1, **labels):
+        self._add("counter", metric, "", labels, value)
+
+    def observe(self, metric, value, **labels):
+        self._add("summary", metric, "_count", labels, 1)
+        self._add("summary", metric, "_sum", labels, value)
+
+    def set_max(self, metric, value, **labels):
+        self._add("gauge", metric, "", labels, value)
+
+    def get(self, metric, suffix="", **labels):
+        return self._values.get((metric, suffix, _labels_key(labels)))
+
+    def snapshot(self):
+        with self._lock:
+            return {"types": dict(self._types),
+                    "values": [[family, suffix, list(map(list, labels)), value]
+                               for (family, suffix, labels), value in self._values.items()]}
+
+    def merge(self, snapshot):
+        for family, suffix, labels, value in snapshot["values"]:
+            self._add(snapshot["types"][family], family, suffix, dict(labels), value)
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            samples = sorted(self._values.items())
+            types = dict(self._types)
+        current = None
+        for (family, suffix, labels), value in samples:
+            if family != current:
+                lines.append(f"# TYPE {family} {types[family]}")
+                current = family
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{family}{suffix}{{{label_text}}} {value:.17g}" if label_text
+                         else f"{family}{suffix} {value:.17g}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+_registry = MetricsRegistry()
+
+def registry():
+    """
+    当前进程的指标注册表; fork 出的子进程第一次使用时换成空表, 避免重复计入父进程的指标
+    """
+    global _registry
+    if _registry.pid != os.getpid():
+        _registry = MetricsRegistry()
+    return _registry
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f"metrics-{pid}.json")
+
+def flush(force=True):
+    """把本进程的指标写入快照目录; force=False 时最多每 FLUSH_INTERVAL 秒写一次"""
+    if not _enabled or not _directory:
+        return
+    reg = registry()
+    now = time.monotonic()
+    if not force and now - reg._last_flush < FLUSH_INTERVAL:
+        return
+    reg._last_flush = now
+    os.makedirs(_directory, exist_ok=True)
+    path = _snapshot_path(_directory, reg.pid)
+    # 多线程 worker 中几个请求可能同时写快照, 临时文件按线程区分
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(reg.snapshot(), f)
+    os.replace(tmp_path, path)
+
+def discard_snapshot(pid=None):
+    """删除一个进程(默认本进程)的快照, 在 worker 退出时调用"""
+    if not _directory:
+        return
+    try:
+        os.remove(_snapshot_path(_directory, pid or os.getpid()))
+    except FileNotFoundError:
+        pass
+
+def process_alive(pid):
+    """本机上 pid 对应的进程是否仍在运行"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def collect():
+    """
+    汇总快照目录中其他进程的指标和本进程的最新指标; 已退出进程(如被替换的 worker、关闭的进程池)
+    的快照不再计入并被删除
+    """
+    combined = MetricsRegistry()
+    reg = registry()
+    if _directory:
+        for path in glob.glob(os.path.join(_directory, "metrics-*.json")):
+            if path == _snapshot_path(_directory, reg.pid):
+                continue
+            match = re.fullmatch(r"metrics-(\d+)\.json", os.path.basename(path))
+            if match is None:
+                continue
+            if not process_alive(int(match.group(1))):
+                discard_snapshot(int(match.group(1)))
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    combined.merge(json.load(f))
+            except (OSError, ValueError):
+                continue
+    combined.merge(reg.snapshot())
+    return combined
+
+def render():
+    return collect().render()
+
+def peak_rss_bytes():
+    """进程启动以来的峰值常驻内存(Linux 上 ru_maxrss 单位为 KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss_bytes():
+    """当前常驻内存, 读取 /proc/self/statm; 没有 /proc 的平台返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class _RssSampler:
+    """
+    有阶段进行时由后台线程每 RSS_SAMPLE_INTERVAL 秒采样一次常驻内存, 更新各进行中阶段的峰值;
+    没有阶段进行时线程阻塞等待, 不占用 CPU
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._stages = set()
+        self._thread = None
+
+    def add(self, stage):
+        with self._cond:
+            self._stages.add(stage)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def remove(self, stage):
+        with self._cond:
+            self._stages.discard(stage)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stages:
+                    self._cond.wait()
+                stages = list(self._stages)
+            rss = current_rss_bytes()
+            for stage in stages:
+                stage.sample_rss(rss)
+            time.sleep(RSS_SAMPLE_INTERVAL)
+
+_sampler = None
+
+def _rss_sampler():
+    """当前进程的采样器, fork 出的子进程中重新创建(父进程的采样线程不会被继承)"""
+    global _sampler
+    if _sampler is None or _sampler.pid != os.getpid():
+        _sampler = _RssSampler()
+    return _sampler
+
+class _NoopStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, rows=0, bytes_read=0, bytes_written=0):
+        pass
+
+_NOOP = _NoopStage()
+
+class Stage:
+    """
+    一个计时阶段: 记录耗时、CPU 时间、行数、读写字节数和峰值内存, 结束时写入指标并输出一条日志
+
+    阶段的峰值内存是阶段期间采样到的进程常驻内存的最大值(包括同一进程中并发执行的其他线程),
+    比采样间隔更短的峰值可能漏掉; 没有 /proc 的平台不记录
+    """
+    def __init__(self, name, rows=0, bytes_read=0, bytes_written=0):
+        self.name = name
+        self.rows = rows or 0
+        self.bytes_read = bytes_read or 0
+        self.bytes_written = bytes_written or 0
+        self.peak_rss = None
+
+    def add(self, rows=0, bytes_read=0, bytes_written=0):
+        self.rows += rows or 0
+        self.bytes_read += bytes_read or 0
+        self.bytes_written += bytes_written or 0
+
+    def sample_rss(self, rss):
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def __enter__(self):
+        self.peak_rss = current_rss_bytes()
+        if self.peak_rss is not None:
+            _rss_sampler().add(self)
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds, cpu_seconds = time.perf_counter() - self._start, time.process_time() - self._cpu_start
+        if self.peak_rss is not None:
+            _rss_sampler().remove(self)
+            self.sample_rss(current_rss_bytes())
+        record_stage(self.name, seconds, cpu_seconds=cpu_seconds, rows=self.rows,
+                     bytes_read=self.bytes_read, bytes_written=self.bytes_written,
+                     status="error" if exc_type else "ok", peak_rss=self.peak_rss)
+        return False
+
+def stage(name, rows=0, bytes_read=0, bytes_written=0):
+    """
+    用法: with stage("preprocess.read", bytes_read=size) as s: ...; s.add(rows=len(df))
+    """
+    if not _enabled:
+        return _NOOP
+    return Stage(name, rows, bytes_read, bytes_written)
+
+def record_stage(name, seconds, cpu_seconds=None, rows=0, bytes_read=0, bytes_written=0, status="ok",
+                 peak_rss=None):
+    """
+    记录一个已知耗时的阶段, 也用于汇报模型训练等自带计时的步骤
+
+    peak_rss 为阶段期间的峰值内存(由 stage 采样), 另外记录进程启动以来的峰值内存
+    """
+    if not _enabled:
+        return
+    reg = registry()
+    # ru_maxrss 与 /proc 的统计口径略有差异, 取两者较大值保证进程峰值不低于阶段峰值
+    process_peak = max(peak_rss_bytes(), peak_rss or 0)
+    reg.inc(f"{PREFIX}_stage_runs_total", stage=name, status=status)
+    reg.observe(f"{PREFIX}_stage_seconds", seconds, stage=name)
+    if cpu_seconds is not None:
+        reg.inc(f"{PREFIX}_stage_cpu_seconds_total", cpu_seconds, stage=name)
+    if rows:
+        reg.inc(f"{PREFIX}_stage_rows_total", rows, stage=name)
+    if bytes_read:
+        reg.inc(f"{PREFIX}_stage_bytes_read_total", bytes_read, stage=name)
+    if bytes_written:
+        reg.inc(f"{PREFIX}_stage_bytes_written_total", bytes_written, stage=name)
+    if peak_rss is not None:
+        reg.set_max(f"{PREFIX}_stage_peak_rss_bytes", peak_rss, stage=name)
+    reg.set_max(f"{PREFIX}_process_peak_rss_bytes", process_peak)
+
+    fields = {"stage": name, "status": status, "seconds": round(seconds, 6),
+              "process_peak_rss_mb": round(process_peak / 1024 ** 2, 1)}
+    if peak_rss is not None:
+        fields["peak_rss_mb"] = round(peak_rss / 1024 ** 2, 1)
+    if cpu_seconds is not None:
+        fields["cpu_seconds"] = round(cpu_seconds, 6)
+    if rows:
+        fields.update(rows=int(rows), rows_per_sec=round(rows / seconds, 1) if seconds > 0 else None)
+    if bytes_read:
+        fields["bytes_read"] = int(bytes_read)
+    if bytes_written:
+        fields["bytes_written"] = int(bytes_written)
+    logger.info(f"stage {name} {status} in {seconds:.3f}s", extra={"metrics": fields})
+
+def record_timings(prefix, timings):
+    """把 {步骤: 秒} 形式的耗时记录为 prefix.步骤 阶段"""
+    for step, seconds in (timings or {}).items():
+        record_stage(f"{prefix}.{step}", seconds)
+
+def timed_iter(name, iterable, count=len, bytes_read=0):
+    """
+    只统计从迭代器取下一块数据所花的时间(读取和解析), 不包括调用方处理数据块的时间
+
+    count 从每个元素计算行数; 迭代结束或中途退出时记录为一个阶段
+    """
+    if not _enabled:
+        return iterable
+    return _timed_iter(name, iterable, count, bytes_read)
+
+def _timed_iter(name, iterable, count, bytes_read):
+    iterator = iter(iterable)
+    seconds = cpu_seconds = 0.0
+    rows = 0
+    status = "ok"
+    try:
+        while True:
+            start, cpu_start = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+                cpu_seconds += time.process_time() - cpu_start
+            rows += count(item)
+            yield item
+    except GeneratorExit:
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_stage(name, seconds, cpu_seconds=cpu_seconds, rows=rows, bytes_read=bytes_read, status=status)
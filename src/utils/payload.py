@@ -0,0 +1,137 @@
+import base64
+import gzip
+import json
+import numpy as np
+from .metrics import stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 单条折线最多保留的点数, 超过时用 LTTB 降采样
+MAX_LINE_POINTS = 2000
+
+# 图表数据中按二进制编码的数组字段
+ARRAY_FIELDS = ("x", "y", "z", "q1", "median", "q3", "lowerfence", "upperfence", "mean")
+
+_DTYPE_CODES = {
+    np.dtype("float32"): "f4", np.dtype("float64"): "f8",
+    np.dtype("int8"): "i1", np.dtype("int16"): "i2", np.dtype("int32"): "i4",
+    np.dtype("uint8"): "u1", np.dtype("uint16"): "u2", np.dtype("uint32"): "u4",
+}
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样, 返回保留点的下标
+
+    首尾两点总是保留, 其余每个桶中选与前一个保留点和下一个桶均值构成三角形面积最大的点
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x = x[end:next_end].mean() if next_end > end else x[n - 1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[n - 1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.nanargmax(area)) if not np.all(np.isnan(area)) else start
+        selected[i + 1] = a
+    return selected
+
+def encode_array(values):
+    """
+    把数值数组编码为 {dtype, bdata, shape}; 浮点数降为 float32, 整数取能容纳的最小类型
+    """
+    array = np.asarray(values)
+    if array.dtype.kind == "f":
+        array = array.astype(np.float32)
+    elif array.dtype.kind in "iu":
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+                array = array.astype(dtype)
+                break
+    if array.dtype not in _DTYPE_CODES:
+        return values
+    encoded = {"dtype": _DTYPE_CODES[array.dtype],
+               "bdata": base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")}
+    if array.ndim > 1:
+        encoded["shape"] = ",".join(str(d) for d in array.shape)
+    return encoded
+
+def decode_array(value):
+    """
+    encode_array 的逆操作; 新版 plotly 的 to_plotly_json 也会输出这种编码
+    """
+    if not (isinstance(value, dict) and "bdata" in value):
+        return value
+    codes = {code: dtype for dtype, code in _DTYPE_CODES.items()}
+    codes.update({"i8": np.dtype("int64"), "u8": np.dtype("uint64")})
+    array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=codes[value["dtype"]])
+    if value.get("shape"):
+        array = array.reshape([int(d) for d in str(value["shape"]).split(",")])
+    return array
+
+def _is_numeric(values):
+    try:
+        return np.asarray(values).dtype.kind in "iuf"
+    except (TypeError, ValueError):
+        return False
+
+def figure_payload(fig, max_line_points=MAX_LINE_POINTS):
+    """
+    把 Plotly 图表转换为精简的 JSON 字符串: 长折线用 LTTB 降采样, 数值数组用二进制编码
+    """
+    with stage("plotly.serialize") as timer:
+        payload = _figure_json(fig, max_line_points)
+        timer.add(bytes_written=len(payload))
+    return payload
+
+def _figure_json(fig, max_line_points):
+    figure = fig.to_plotly_json()
+    for trace in figure.get("data", []):
+        for field in ARRAY_FIELDS:
+            trace[field] = decode_array(trace.get(field))
+        if trace.get("type") in ("scatter", "scattergl") and trace.get("y") is not None and len(trace["y"]) > max_line_points:
+            x = trace.get("x")
+            x_numeric = np.arange(len(trace["y"])) if x is None or not _is_numeric(x) else x
+            keep = lttb(x_numeric, trace["y"], max_line_points)
+            trace["y"] = np.asarray(trace["y"])[keep]
+            if x is not None:
+                trace["x"] = np.asarray(x)[keep]
+        for field in ARRAY_FIELDS:
+            if trace[field] is None:
+                del trace[field]
+            elif _is_numeric(trace[field]):
+                trace[field] = encode_array(trace[field])
+    return json.dumps(figure, cls=_PlotlyEncoder, separators=(",", ":"))
+
+class _PlotlyEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return super().default(obj)
+
+def compress(body, accept_encoding, min_size=1024):
+    """
+    按客户端的 Accept-Encoding 压缩响应体, 返回 (数据, Content-Encoding); 优先 brotli
+    """
+    accept_encoding = accept_encoding or ""
+    if len(body) < min_size:
+        return body, None
+    if brotli is not None and "br" in accept_encoding:
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
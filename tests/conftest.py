@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与 setup.py 的 package_dir 一致, 让 data/models/utils 等包可以按顶层包导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
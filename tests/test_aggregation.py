@@ -0,0 +1,51 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+import pandas as pd
+from data import aggregation
+from data.aggregation import DatasetSummary, summarize_dataset
+
+class TestDatasetSummary(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        self.df = pd.DataFrame(np.random.rand(500, 3) * 10, columns=['A', 'B', 'C'])
+        self.df.loc[::7, 'B'] = None
+        self.df['year'] = np.random.randint(2018, 2022, 500)
+        self.df['target'] = np.random.randint(0, 2, 500)
+
+    def test_chunked_summary_matches_pandas(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.parquet")
+            self.df.to_parquet(path, index=False)
+            summary = summarize_dataset(path, columns=['A', 'B', 'C'], group_by='year',
+                                        value_counts=['target'], chunksize=64)
+
+        columns = ['A', 'B', 'C']
+        pd.testing.assert_frame_equal(summary.correlation(), self.df[columns].corr())
+        pd.testing.assert_series_equal(summary.mean, self.df[columns].mean())
+        pd.testing.assert_frame_equal(summary.group_means, self.df.groupby('year')[columns].mean(),
+                                      check_names=False)
+        self.assertEqual(summary.group_sizes.sum(), 500)
+        self.assertEqual(summary.value_counts['target'].sum(), 500)
+        np.testing.assert_allclose(summary.quantiles([0.25, 0.5, 0.75]).to_numpy(),
+                                   self.df[columns].quantile([0.25, 0.5, 0.75]).to_numpy(), rtol=1e-6)
+
+    def test_sample_is_bounded(self):
+        summary = DatasetSummary(['A', 'B'], sample_size=50)
+        for start in range(0, 500, 100):
+            summary.update(self.df.iloc[start:start + 100])
+        stats = summary.box_stats()
+        self.assertEqual(summary._sample.shape, (50, 2))
+        self.assertEqual(summary._sample.dtype, np.float32)
+        self.assertTrue((stats['lowerfence'] <= stats['q1']).all())
+        self.assertTrue((stats['q3'] <= stats['upperfence']).all())
+
+    def test_sample_rows_are_capped_by_column_count(self):
+        wide = pd.DataFrame(np.ones((10, 4000)))
+        summary = DatasetSummary(sample_size=100000, correlation=False).update(wide)
+        self.assertLessEqual(summary._sample.nbytes, aggregation.MAX_SAMPLE_BYTES)
+        self.assertEqual(summary.quantiles([0.5]).iloc[0].tolist(), [1.0] * 4000)
+
+if __name__ == '__main__':
+    unittest.main()
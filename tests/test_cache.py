@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import time
+import os
+from utils.cache import ResultCache, cache_key, file_hash
+
+class TestResultCache(unittest.TestCase):
+    def write(self, path, size):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_key_depends_on_content(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            a = self.write(os.path.join(tmpdir, "a.csv"), 10)
+            b = self.write(os.path.join(tmpdir, "b.csv"), 10)
+            self.assertEqual(cache_key(file_hash(a), ["x"]), cache_key(file_hash(b), ["x"]))
+            self.write(b, 11)
+            self.assertNotEqual(cache_key(file_hash(a), ["x"]), cache_key(file_hash(b), ["x"]))
+            self.assertNotEqual(cache_key(file_hash(a), ["x"]), cache_key(file_hash(a), ["y"]))
+
+    def test_hit_miss_and_lru_eviction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            models = os.path.join(tmpdir, "models")
+            os.makedirs(models)
+            cache = ResultCache(os.path.join(tmpdir, "cache"), max_bytes=2500)
+
+            first = self.write(os.path.join(models, "first.joblib"), 1000)
+            cache.put("first", {"model_path": first}, artifacts=[first])
+            self.assertEqual(cache.get("missing"), None)
+
+            time.sleep(0.01)
+            second = self.write(os.path.join(models, "second.joblib"), 1000)
+            cache.put("second", {"model_path": second}, artifacts=[second])
+
+            # 访问 first 后, second 成为最久未使用的条目
+            time.sleep(0.01)
+            self.assertEqual(cache.get("first"), {"model_path": first})
+            time.sleep(0.01)
+            third = self.write(os.path.join(models, "third.joblib"), 1000)
+            cache.put("third", {"model_path": third}, artifacts=[third])
+
+            self.assertFalse(os.path.exists(second))
+            self.assertIsNone(cache.get("second"))
+            self.assertIsNotNone(cache.get("first"))
+            self.assertIsNotNone(cache.get("third"))
+
+    def test_evicts_whole_entries_only(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            models = os.path.join(tmpdir, "models")
+            matrix = os.path.join(tmpdir, "processed", "matrix")
+            os.makedirs(models)
+            os.makedirs(matrix)
+            cache = ResultCache(os.path.join(tmpdir, "cache"), max_bytes=1500)
+
+            # 不属于任何条目的文件(如 /tune 的模型)不计入也不会被删除
+            other = self.write(os.path.join(models, "tuned.joblib"), 5000)
+            old = [self.write(os.path.join(matrix, "X.npy"), 800), self.write(os.path.join(matrix, "matrix.json"), 10),
+                   self.write(os.path.join(models, "old.joblib"), 500)]
+            cache.put("old", {}, artifacts=[matrix, old[2]])
+            time.sleep(0.01)
+            new = self.write(os.path.join(models, "new.joblib"), 500)
+            cache.put("new", {}, artifacts=[new])
+
+            # 整个条目连同目录产物一起删除
+            self.assertFalse(os.path.exists(matrix))
+            self.assertFalse(os.path.exists(old[2]))
+            self.assertTrue(os.path.exists(other))
+            self.assertIsNotNone(cache.get("new"))
+
+            # 产物已被其他进程删除时不报错
+            os.remove(new)
+            cache.evict()
+            self.assertIsNone(cache.get("new"))
+
+    def test_keeps_artifacts_in_use(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResultCache(os.path.join(tmpdir, "cache"), max_bytes=100,
+                                keep=lambda artifacts: [path for path in artifacts if path.endswith(".joblib")])
+            model = self.write(os.path.join(tmpdir, "base.joblib"), 500)
+            data = self.write(os.path.join(tmpdir, "data.npy"), 500)
+            cache.put("base", {}, artifacts=[model, data])
+            self.assertIsNone(cache.get("base"))
+            self.assertTrue(os.path.exists(model))
+            self.assertFalse(os.path.exists(data))
+
+if __name__ == '__main__':
+    unittest.main()
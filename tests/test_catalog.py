@@ -0,0 +1,79 @@
+import unittest
+import pandas as pd
+import numpy as np
+import tempfile
+import os
+from data.catalog import Catalog
+from data.storage import write_dataset, partition_path
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.catalog = Catalog(os.path.join(self.tmpdir.name, "catalog.db"))
+        self.df = pd.DataFrame({
+            'year': np.repeat([2019, 2020, 2021], 10),
+            'feature1': np.arange(30, dtype=float),
+            'name': ['a'] * 30
+        })
+        self.df.loc[3, 'feature1'] = np.nan
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_register_dataset_stats(self):
+        path = self._path("raw.parquet")
+        write_dataset(self.df, path)
+        entry = self.catalog.register_dataset(path)
+        self.assertEqual(entry['kind'], 'raw')
+        self.assertEqual(entry['row_count'], 30)
+        self.assertEqual(entry['columns'], ['year', 'feature1', 'name'])
+        stats = self.catalog.column_stats(path)
+        self.assertEqual(stats['feature1']['null_count'], 1)
+        self.assertEqual(stats['feature1']['max'], 29.0)
+        self.assertAlmostEqual(stats['feature1']['mean'], self.df['feature1'].mean())
+        self.assertIsNone(stats['name']['mean'])
+
+    def test_recreates_schema_after_database_is_removed(self):
+        path = self._path("raw.parquet")
+        write_dataset(self.df, path)
+        self.catalog.register_dataset(path)
+        os.remove(self.catalog.db_path)
+        self.assertIsNone(self.catalog.get(path))
+        self.assertEqual(self.catalog.register_dataset(path)['row_count'], 30)
+
+    def test_register_partitioned_dataset(self):
+        path = self._path("merged")
+        os.makedirs(path)
+        for year, group in self.df.groupby('year'):
+            write_dataset(group, partition_path(path, 'year', year))
+        entry = self.catalog.register_dataset(path, "merged")
+        self.assertEqual(entry['row_count'], len(self.df))
+        self.assertEqual(self.catalog.column_stats(path)['feature1']['min'], 0.0)
+        self.assertEqual(self.catalog.column_stats(path)['year']['max'], self.df['year'].max())
+
+    def test_lineage_and_latest_model(self):
+        raw, merged = self._path("raw.parquet"), self._path("merged.parquet")
+        write_dataset(self.df, raw)
+        write_dataset(self.df, merged)
+        self.catalog.register_dataset(raw)
+        self.catalog.register_dataset(merged, "merged", parents=[raw])
+        self.assertIsNone(self.catalog.latest_model(raw))
+        models = []
+        for name in ("a.joblib", "b.joblib"):
+            models.append(self._path(name))
+            with open(models[-1], "wb") as f:
+                f.write(name.encode())
+            self.catalog.register_model(models[-1], parents=[merged])
+        self.assertEqual(self.catalog.latest_model(raw), os.path.normpath(models[1]))
+        self.assertEqual(self.catalog.lineage(models[0]), [os.path.normpath(merged), os.path.normpath(raw)])
+
+        # 被删除的模型文件不再返回
+        os.remove(models[1])
+        self.assertEqual(self.catalog.latest_model(), os.path.normpath(models[0]))
+        self.assertIsNone(self.catalog.get(models[1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,60 @@
 import unittest
 import pandas as pd
-from src.data.data_acquisition import fetch_data, save_data
+from src.data.data_acquisition import fetch_data, save_data, download, FetchError, zstandard
+from src.data.storage import read_dataset
 import os
+import gzip
 import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _SourceHandler(BaseHTTPRequestHandler):
+    """本地数据源: 支持 ETag 条件请求和 Range 续传, 可以让某次响应发送一部分后断开"""
+    files = {}
+    drop_after = {}
+    status_override = {}
+    requests = []
+
+    def do_GET(self):
+        if self.path in self.status_override:
+            self.send_error(self.status_override[self.path])
+            return
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        body, etag = self.files[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.requests.append((self.path, 304, 0))
+            self.send_response(304)
+            self.end_headers()
+            return
+        start, status = 0, 200
+        if self.headers.get("Range") and self.headers.get("If-Range") in (None, etag):
+            start, status = int(self.headers["Range"].split("=")[1].split("-")[0]), 206
+        self.send_response(status)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        payload = body[start:]
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        limit = self.drop_after.pop(self.path, None)
+        if limit is not None:
+            payload = payload[:limit]
+        # 先记录再发送, 客户端收到响应时记录一定已经存在
+        self.requests.append((self.path, status, len(payload)))
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
 
 class TestDataAcquisition(unittest.TestCase):
     def test_fetch_data(self):
         # 使用一个公开的CSV数据集URL进行测试
         url = "https://raw.githubusercontent.com/datasets/iris/master/data/iris.csv"
-        df = fetch_data(url)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = fetch_data(url, os.path.join(tmpdir, "iris.parquet"), os.path.join(tmpdir, "cache"))
+            df = read_dataset(output_path)
         self.assertIsInstance(df, pd.DataFrame)
         self.assertGreater(len(df), 0)
 
@@ -21,5 +67,74 @@ class TestDataAcquisition(unittest.TestCase):
             loaded_df = pd.read_csv(output_path)
             pd.testing.assert_frame_equal(df, loaded_df)
 
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'A': range(2000), 'B': [i * 0.5 for i in range(2000)]})
+        self.csv = self.df.to_csv(index=False).encode()
+        _SourceHandler.files = {"/data.csv": (self.csv, '"v1"')}
+        _SourceHandler.drop_after = {}
+        _SourceHandler.status_override = {}
+        _SourceHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SourceHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_resume_and_revalidate(self):
+        url = self.base_url + "/data.csv"
+        _SourceHandler.drop_after["/data.csv"] = 5000
+        path = download(url, self.tmpdir.name, backoff=0, chunk_size=1024)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.csv)
+        # 第一次连接在 5000 字节处断开, 第二次只请求剩余部分
+        self.assertEqual(_SourceHandler.requests, [("/data.csv", 200, 5000), ("/data.csv", 206, len(self.csv) - 5000)])
+
+        # 源文件未变化时不重新下载
+        self.assertEqual(download(url, self.tmpdir.name), path)
+        self.assertEqual(_SourceHandler.requests[-1], ("/data.csv", 304, 0))
+
+        # 源文件变化后重新下载完整内容
+        _SourceHandler.files["/data.csv"] = (self.csv + b"1,2.0\n", '"v2"')
+        download(url, self.tmpdir.name)
+        self.assertEqual(_SourceHandler.requests[-1], ("/data.csv", 200, len(self.csv) + 6))
+
+    def test_fetch_compressed_source(self):
+        _SourceHandler.files["/data.csv.gz"] = (gzip.compress(self.csv), '"gz"')
+        output_path = os.path.join(self.tmpdir.name, "out", "data.parquet")
+        fetch_data(self.base_url + "/data.csv.gz", output_path, self.tmpdir.name, chunksize=300)
+        pd.testing.assert_frame_equal(read_dataset(output_path), self.df)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_fetch_zstd_source(self):
+        _SourceHandler.files["/data.csv.zst"] = (zstandard.ZstdCompressor().compress(self.csv), '"zst"')
+        output_path = os.path.join(self.tmpdir.name, "out", "data.csv")
+        fetch_data(self.base_url + "/data.csv.zst", output_path, self.tmpdir.name)
+        pd.testing.assert_frame_equal(read_dataset(output_path), self.df)
+
+    def test_errors_and_stale_cache(self):
+        with self.assertRaises(FetchError):
+            download(self.base_url + "/missing.csv", self.tmpdir.name, backoff=0)
+
+        url = self.base_url + "/data.csv"
+        download(url, self.tmpdir.name)
+        _SourceHandler.status_override["/data.csv"] = 503
+        with self.assertRaises(FetchError):
+            download(url, self.tmpdir.name, retries=1, backoff=0)
+        # 源暂时不可用时 fetch_data 使用之前缓存的版本
+        output_path = os.path.join(self.tmpdir.name, "out", "data.parquet")
+        fetch_data(url, output_path, self.tmpdir.name, retries=1, backoff=0)
+        pd.testing.assert_frame_equal(read_dataset(output_path), self.df)
+
+        # 没有缓存可用时错误直接抛出, 不写出输出文件
+        missing_path = os.path.join(self.tmpdir.name, "out", "missing.parquet")
+        with self.assertRaises(FetchError):
+            fetch_data(self.base_url + "/missing.csv", missing_path, self.tmpdir.name, backoff=0)
+        self.assertFalse(os.path.exists(missing_path))
+
 if __name__ == '__main__':
     unittest.main()
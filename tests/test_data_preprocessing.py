@@ -2,7 +2,9 @@ import unittest
 import pandas as pd
 import tempfile
 import os
-from src.data.data_preprocessing import preprocess_data
+import numpy as np
+from src.data.data_preprocessing import preprocess_data, merge_files_by_year, merge_files_by_variable
+from src.data.storage import read_dataset, dataset_parts
 
 class TestDataPreprocessing(unittest.TestCase):
     def test_preprocess_data(self):
@@ -38,5 +40,143 @@ class TestDataPreprocessing(unittest.TestCase):
             self.assertTrue((processed_df['B'].mean() - 0).abs() < 1e-6)
             self.assertTrue((processed_df['B'].std() - 1).abs() < 1e-6)
 
+    def test_preprocess_data_chunked_matches_in_memory(self):
+        # 分块流式处理的结果应与整表处理一致
+        np.random.seed(0)
+        df = pd.DataFrame(np.random.rand(50, 3), columns=['A', 'B', 'C'])
+        df.loc[[3, 17, 41], 'A'] = None
+        df.loc[[8, 22], 'C'] = None
+        df['target'] = np.random.randint(0, 2, 50)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.csv")
+            full_path = os.path.join(tmpdir, "full.csv")
+            chunked_path = os.path.join(tmpdir, "chunked.csv")
+            df.to_csv(input_path, index=False)
+
+            preprocess_data(input_path, full_path, ['A', 'C'])
+            preprocess_data(input_path, chunked_path, ['A', 'C'], chunksize=7)
+
+            pd.testing.assert_frame_equal(pd.read_csv(full_path), pd.read_csv(chunked_path))
+
+    def test_preprocess_year_category_matches_in_memory(self):
+        # 'year' 列在两条路径上都转换为类别型, 输出的类型和取值一致
+        np.random.seed(1)
+        df = pd.DataFrame(np.random.rand(40, 2), columns=['A', 'B'])
+        df['year'] = np.random.choice([2019, 2020, 2021], 40)
+        df['target'] = np.random.randint(0, 2, 40)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.parquet")
+            full_path = os.path.join(tmpdir, "full.feather")
+            chunked_path = os.path.join(tmpdir, "chunked.feather")
+            df.to_parquet(input_path, index=False)
+
+            preprocess_data(input_path, full_path)
+            preprocess_data(input_path, chunked_path, chunksize=9)
+
+            full, chunked = read_dataset(full_path), read_dataset(chunked_path)
+            self.assertIsInstance(chunked['year'].dtype, pd.CategoricalDtype)
+            pd.testing.assert_series_equal(full['year'], chunked['year'])
+            # 整表读取会压缩 target 的整数类型, 其余列只比较取值
+            pd.testing.assert_frame_equal(full, chunked, check_dtype=False)
+
+    def test_preprocess_parquet_outputs_float32_features(self):
+        np.random.seed(0)
+        df = pd.DataFrame(np.random.rand(30, 2), columns=['A', 'B'])
+        df['target'] = np.random.randint(0, 2, 30)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.parquet")
+            output_path = os.path.join(tmpdir, "output.parquet")
+            df.to_parquet(input_path, index=False)
+
+            preprocess_data(input_path, output_path, ['A', 'B'], chunksize=10)
+            processed = read_dataset(output_path)
+            self.assertEqual(list(processed.dtypes), [np.float32, np.float32, np.int64])
+            self.assertAlmostEqual(float(processed['A'].mean()), 0.0, places=5)
+
+    def test_merge_files_by_year_streaming(self):
+        # 流式合并应与整表合并结果一致, 并支持按年份分区输出
+        df1 = pd.DataFrame({'date': ['2020-01-01', '2021-06-01', '2020-03-01'], 'A': [1.0, 2.0, 3.0]})
+        df2 = pd.DataFrame({'date': ['2022-02-01', '2021-07-01'], 'B': [4.0, 5.0]})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, "f1.csv"), os.path.join(tmpdir, "f2.csv")]
+            df1.to_csv(paths[0], index=False)
+            df2.to_csv(paths[1], index=False)
+
+            merged_path = merge_files_by_year(paths, os.path.join(tmpdir, "merged.parquet"), chunksize=2)
+            merged = read_dataset(merged_path)
+            expected = pd.concat([df1, df2], ignore_index=True)
+            self.assertEqual(list(merged.columns), ['date', 'A', 'B', 'year'])
+            self.assertEqual(merged['year'].tolist(), [2020, 2021, 2020, 2022, 2021])
+            pd.testing.assert_series_equal(merged['A'], expected['A'])
+
+            partitioned_path = merge_files_by_year(paths, os.path.join(tmpdir, "partitioned"),
+                                                   partition_by_year=True, chunksize=2)
+            parts = dataset_parts(partitioned_path)
+            self.assertEqual([os.path.basename(part) for part in parts],
+                             ['year=2020.parquet', 'year=2021.parquet', 'year=2022.parquet'])
+            self.assertEqual(len(read_dataset(parts[0])), 2)
+            self.assertEqual(len(read_dataset(partitioned_path)), 5)
+
+    def test_merge_files_by_year_unifies_schemas(self):
+        # 第一个文件没有的字符串列出现在后面的文件中
+        df1 = pd.DataFrame({'date': ['2020-01-01', '2021-06-01'], 'A': [1, 2]})
+        df2 = pd.DataFrame({'date': ['2022-02-01'], 'A': [0.5], 'S': ['x']})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, "f1.parquet"), os.path.join(tmpdir, "f2.csv")]
+            df1.to_parquet(paths[0], index=False)
+            df2.to_csv(paths[1], index=False)
+
+            merged = read_dataset(merge_files_by_year(paths, os.path.join(tmpdir, "merged.parquet"), chunksize=1))
+            self.assertEqual(list(merged.columns), ['date', 'A', 'S', 'year'])
+            self.assertEqual(merged['A'].tolist(), [1.0, 2.0, 0.5])
+            self.assertEqual(merged['S'].isna().tolist(), [True, True, False])
+
+    def test_merge_replaces_output_atomically(self):
+        # 合并失败时保留原有输出, 不留下临时文件; 成功时整体替换(包括分区目录)
+        df = pd.DataFrame({'date': ['2020-01-01', '2021-06-01'], 'A': [1.0, 2.0]})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            good, bad = os.path.join(tmpdir, "good.csv"), os.path.join(tmpdir, "bad.csv")
+            df.to_csv(good, index=False)
+            df.drop(columns='date').to_csv(bad, index=False)
+            output_path = os.path.join(tmpdir, "merged.parquet")
+            merge_files_by_year([good], output_path)
+            with self.assertRaises(KeyError):
+                merge_files_by_year([bad], output_path)
+            self.assertEqual(len(read_dataset(output_path)), 2)
+
+            partitioned_path = os.path.join(tmpdir, "partitioned")
+            merge_files_by_year([good], partitioned_path, partition_by_year=True)
+            merge_files_by_year([good, good], partitioned_path, partition_by_year=True)
+            self.assertEqual(len(read_dataset(partitioned_path)), 4)
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ["bad.csv", "good.csv", "merged.parquet", "partitioned"])
+
+    def test_merge_files_by_variable_on_key(self):
+        # 按键连接: 键列只出现一次, 内存预算很小时分区落盘的结果应与内存连接一致
+        df1 = pd.DataFrame({'id': [3, 1, 2, 4], 'feature1': [0.3, 0.1, 0.2, 0.4], 'target': [1, 0, 1, 0]})
+        df2 = pd.DataFrame({'id': [2, 3, 1, 5], 'feature2': [2.0, 3.0, 1.0, 5.0], 'target': [1, 1, 0, 1]})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, "f1.csv"), os.path.join(tmpdir, "f2.csv")]
+            df1.to_csv(paths[0], index=False)
+            df2.to_csv(paths[1], index=False)
+
+            in_memory = read_dataset(merge_files_by_variable(
+                paths, os.path.join(tmpdir, "joined.parquet"), key='id'))
+            spilled = read_dataset(merge_files_by_variable(
+                paths, os.path.join(tmpdir, "spilled.parquet"), key='id', memory_limit=16, chunksize=2))
+
+            self.assertEqual(list(in_memory.columns), ['id', 'feature1', 'target', 'feature2'])
+            self.assertEqual(in_memory['id'].tolist(), [1, 2, 3, 4, 5])
+            self.assertEqual(in_memory['target'].tolist(), [0, 1, 1, 0, 1])
+            spilled = spilled.sort_values('id', ignore_index=True)
+            pd.testing.assert_frame_equal(spilled, in_memory)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import pandas as pd
+import numpy as np
+import tempfile
+import os
+from data.dtypes import plan_dtypes, optimize_dtypes, profile_column, plan_from_profiles, read_optimized
+from data.ingest import ingest_file
+
+class TestDtypes(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 1000
+        self.df = pd.DataFrame({
+            'small': rng.integers(0, 100, n),
+            'large': rng.integers(0, 100000, n),
+            'value': rng.normal(size=n),
+            'whole': rng.integers(0, 1000, n).astype(float),
+            'city': rng.choice(['a', 'b', 'c'], n),
+            'id': [f'id{i}' for i in range(n)],
+        })
+
+    def test_plan(self):
+        plan = plan_dtypes(self.df)
+        self.assertEqual(plan['small'], 'int8')
+        self.assertEqual(plan['large'], 'int32')
+        self.assertEqual(plan['city'], 'category')
+        self.assertNotIn('id', plan)
+
+        # 默认不允许误差, 只有能被 float32 精确表示的浮点列降级
+        self.assertNotIn('value', plan)
+        self.assertEqual(plan['whole'], 'float32')
+        lossy = plan_dtypes(self.df, float_tolerance=1e-6)
+        self.assertEqual(lossy['value'], 'float32')
+
+    def test_tolerance_is_checked_against_round_trip_error(self):
+        df = pd.DataFrame({'half': [0.5, 0.25, -1.5], 'tiny': [1e-40, 1.0, 2.0], 'huge': [1e39, 1.0, 2.0]})
+        self.assertEqual(plan_dtypes(df), {'half': 'float32'})
+        self.assertEqual(plan_dtypes(df, float_tolerance=1e-6), {'half': 'float32'})
+
+    def test_optimize_is_lossless_within_tolerance(self):
+        optimized, report = optimize_dtypes(self.df, float_tolerance=1e-6)
+        self.assertLess(report['after_bytes'], report['before_bytes'])
+        self.assertEqual(report['columns']['small'], ['int64', 'int8'])
+        pd.testing.assert_frame_equal(optimized, self.df, check_dtype=False, check_categorical=False, rtol=1e-6)
+        self.assertEqual(self.df['small'].dtype, np.int64)
+
+    def test_profiles_combine_across_chunks(self):
+        profile = profile_column(pd.Series([1, 2, 3]))
+        profile = profile_column(pd.Series([1.0, None, 300.0]), profile)
+        plan = plan_from_profiles({'x': profile}, float_tolerance=0)
+        self.assertEqual(plan, {'x': 'float32'})
+        self.assertEqual(profile['count'], 5)
+
+    def test_ingest_records_dtype_plan(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "data.csv")
+            self.df.to_csv(input_path, index=False)
+            output_path, schema = ingest_file(input_path, os.path.join(tmpdir, "data"), block_size=5000)
+            self.assertEqual(schema['dtype_plan']['large'], 'int32')
+            df, report = read_optimized(output_path)
+            self.assertEqual(df['city'].dtype, 'category')
+            self.assertEqual(df['small'].dtype, np.int8)
+            self.assertGreater(report['ratio'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
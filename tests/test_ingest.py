@@ -0,0 +1,86 @@
+import unittest
+import pandas as pd
+import numpy as np
+import tempfile
+import random
+import io
+import os
+from data.ingest import CsvIngestor, IngestError, UploadSession, UploadTooLarge, ingest_file, ingest_stream
+from data.storage import read_dataset, read_schema
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({
+            'id': np.arange(500),
+            'feature1': rng.normal(size=500),
+            'feature2': rng.integers(0, 100, size=500),
+            'name': rng.choice(['a', 'b', 'c'], size=500)
+        })
+        # 后半部分出现缺失值, 整数列需要提升为浮点
+        self.df['feature2'] = self.df['feature2'].astype(float)
+        self.df.loc[300:310, 'feature2'] = np.nan
+        self.csv = self.df.to_csv(index=False).encode()
+
+    def test_ingest_file_matches_read_csv(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "data.csv")
+            with open(input_path, "wb") as f:
+                f.write(self.csv)
+            output_path, schema = ingest_file(input_path, os.path.join(tmpdir, "data"), block_size=1000)
+            loaded = read_dataset(output_path)
+            pd.testing.assert_frame_equal(loaded, pd.read_csv(input_path), check_dtype=False)
+            self.assertEqual(schema, read_schema(output_path))
+            self.assertEqual(schema['row_count'], 500)
+            self.assertEqual(schema['null_counts']['feature2'], 11)
+            self.assertEqual(schema['dtypes']['feature2'], 'float64')
+
+    def test_ingest_stream_reads_in_blocks(self):
+        stream = io.BytesIO(self.csv)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path, schema = ingest_stream(stream, os.path.join(tmpdir, "data"), block_size=1000)
+            pd.testing.assert_frame_equal(read_dataset(output_path), self.df, check_dtype=False)
+            self.assertEqual(schema['row_count'], 500)
+
+    def test_out_of_order_chunks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            session = UploadSession.create(os.path.join(tmpdir, "uploads"), "data.csv", len(self.csv), tmpdir)
+            offsets = list(range(0, len(self.csv), 997))
+            random.Random(0).shuffle(offsets)
+            for offset in offsets:
+                status = session.write_chunk(offset, self.csv[offset:offset + 997])
+            self.assertEqual(status['state'], 'complete')
+            self.assertEqual(status['schema']['row_count'], 500)
+            pd.testing.assert_frame_equal(read_dataset(status['path']), self.df, check_dtype=False)
+
+    def test_rejects_sizes_above_limit(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            upload_dir = os.path.join(tmpdir, "uploads")
+            with self.assertRaises(UploadTooLarge):
+                UploadSession.create(upload_dir, "data.csv", 2 ** 40, tmpdir, max_size=len(self.csv))
+            self.assertFalse(os.path.exists(upload_dir))
+            UploadSession.create(upload_dir, "data.csv", len(self.csv), tmpdir, max_size=len(self.csv))
+
+    def test_resume_reports_missing_ranges(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            upload_dir = os.path.join(tmpdir, "uploads")
+            session = UploadSession.create(upload_dir, "data.csv", len(self.csv), tmpdir)
+            session.write_chunk(0, self.csv[:4000])
+            status = UploadSession(upload_dir, session.upload_id).status()
+            self.assertEqual(status['state'], 'uploading')
+            self.assertEqual(status['received'], [[0, 4000]])
+            self.assertGreater(status['rows_parsed'], 0)
+            status = session.write_chunk(4000, self.csv[4000:])
+            self.assertEqual(status['state'], 'complete')
+
+    def test_invalid_rows_fail_upload(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ingestor = CsvIngestor(tmpdir)
+            ingestor.feed(b"a,b\n1,2\n")
+            with self.assertRaises(IngestError):
+                ingestor.feed(b"x,3\n", final=True)
+            with self.assertRaises(IngestError):
+                CsvIngestor(tmpdir).feed(b"a,a\n1,2\n", final=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+import os
+import time
+import signal
+from utils.jobs import JobQueue, JobQueueFull, _write_status
+
+def add(a, b, progress=None):
+    progress(0.5, "adding")
+    return {"sum": a + b}
+
+def fail(progress=None):
+    raise ValueError("boom")
+
+def slow(progress=None):
+    for i in range(100):
+        progress(i / 100, "step")
+        time.sleep(0.05)
+    return {}
+
+def crash(progress=None):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.queue = JobQueue(self.tmpdir.name, max_workers=1, max_pending=2)
+
+    def tearDown(self):
+        self.queue.shutdown()
+        self.tmpdir.cleanup()
+
+    def wait(self, job_id, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.queue.status(job_id)
+            if status["state"] in ("succeeded", "failed", "cancelled"):
+                return status
+            time.sleep(0.05)
+        self.fail("job did not finish")
+
+    def test_result_and_failure(self):
+        ok = self.queue.submit(add, 1, 2)
+        self.assertIn(self.queue.status(ok)["state"], ("queued", "running", "succeeded"))
+        status = self.wait(ok)
+        self.assertEqual(status["state"], "succeeded")
+        self.assertEqual(status["result"], {"sum": 3})
+
+        status = self.wait(self.queue.submit(fail))
+        self.assertEqual(status["state"], "failed")
+        self.assertEqual(status["error"], "boom")
+
+    def test_submit_by_module_path(self):
+        # 按 "模块:函数" 提交时由任务进程导入函数
+        status = self.wait(self.queue.submit("test_jobs:add", 2, 3))
+        self.assertEqual(status["state"], "succeeded")
+        self.assertEqual(status["name"], "add")
+        self.assertEqual(status["result"], {"sum": 5})
+
+    def test_cancel_and_pending_limit(self):
+        running = self.queue.submit(slow)
+        queued = self.queue.submit(slow)
+        with self.assertRaises(JobQueueFull):
+            self.queue.submit(slow)
+
+        self.assertTrue(self.queue.cancel(queued))
+        self.assertTrue(self.queue.cancel(running))
+        self.assertEqual(self.wait(running)["state"], "cancelled")
+        self.assertEqual(self.wait(queued)["state"], "cancelled")
+        self.assertFalse(self.queue.cancel(running))
+
+    def test_worker_crash_marks_job_failed(self):
+        status = self.wait(self.queue.submit(crash))
+        self.assertEqual(status["state"], "failed")
+        self.assertIn("BrokenProcessPool", status["error"])
+        # 损坏的进程池被替换, 之后的任务正常执行
+        self.assertEqual(self.wait(self.queue.submit(add, 1, 1))["state"], "succeeded")
+
+    def test_orphaned_jobs_are_failed_on_startup(self):
+        _write_status(self.tmpdir.name, "orphan", state="running", owner=2 ** 22 + 1, pid=2 ** 22 + 2)
+        _write_status(self.tmpdir.name, "live", state="queued", owner=os.getpid())
+        JobQueue(self.tmpdir.name)
+        self.assertEqual(self.queue.status("orphan")["state"], "failed")
+        self.assertEqual(self.queue.status("live")["state"], "queued")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+import pandas as pd
+from data.data_preprocessing import preprocess_data, preprocess_to_matrix
+from data.matrix import FeatureMatrix, MatrixWriter
+from data.storage import read_dataset
+from models.model import BigDataModel, contiguous_split, contiguous_folds
+
+class TestFeatureMatrix(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 1000
+        self.df = pd.DataFrame(rng.normal(size=(n, 3)), columns=['A', 'B', 'C'])
+        self.df.loc[::7, 'B'] = None
+        self.df['empty'] = np.nan
+        self.df['target'] = (self.df['A'] > 0).astype(int)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "data.parquet")
+        self.df.to_parquet(self.path, index=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_matches_preprocess_data(self):
+        directory = os.path.join(self.tmpdir.name, "matrix")
+        matrix, preprocessor = preprocess_to_matrix(self.path, directory, chunksize=300)
+        self.assertTrue(FeatureMatrix.exists(directory))
+        self.assertTrue(matrix.shuffled)
+        self.assertIsInstance(matrix.X, np.memmap)
+        self.assertEqual(matrix.columns, ['A', 'B', 'C'])
+        self.assertEqual(matrix.n_rows, 1000)
+
+        expected = read_dataset(self._preprocess_data())
+        # 行被随机重排, 但每一行仍与原始行一一对应
+        self.assertFalse(np.array_equal(matrix.y, expected['target'].to_numpy()))
+        actual = matrix.frame().sort_values('A', ignore_index=True)
+        pd.testing.assert_frame_equal(actual, expected.sort_values('A', ignore_index=True), check_dtype=False)
+        np.testing.assert_allclose(preprocessor.mean, self.df[['A', 'B', 'C']].mean())
+
+    def test_reuses_fitted_preprocessor(self):
+        _, preprocessor = preprocess_to_matrix(self.path, os.path.join(self.tmpdir.name, "first"))
+        matrix, reused = preprocess_to_matrix(self.path, os.path.join(self.tmpdir.name, "second"),
+                                              preprocessor=preprocessor, shuffle=False)
+        self.assertIs(reused, preprocessor)
+        self.assertFalse(matrix.shuffled)
+        np.testing.assert_array_equal(matrix.y, self.df['target'])
+
+    def test_views_share_the_buffer(self):
+        matrix, _ = preprocess_to_matrix(self.path, os.path.join(self.tmpdir.name, "matrix"))
+        train, test = contiguous_split(matrix.n_rows)
+        self.assertEqual((train, test), (slice(0, 800), slice(800, 1000)))
+        self.assertTrue(np.shares_memory(matrix.features(test).to_numpy(), matrix.X))
+        self.assertTrue(np.shares_memory(matrix.frame()[matrix.columns].to_numpy(), matrix.X))
+        folds = contiguous_folds(matrix.n_rows, 5)
+        self.assertEqual(sorted(np.concatenate([test for _, test in folds])), list(range(1000)))
+        self.assertTrue(all(len(train) + len(test) == 1000 for train, test in folds))
+
+    def test_parallel_training_on_shared_matrix(self):
+        matrix, _ = preprocess_to_matrix(self.path, os.path.join(self.tmpdir.name, "matrix"))
+        # 交叉验证的工作进程通过 joblib 按文件引用读取同一个矩阵, 得分与在原始数据上的一致
+        model = BigDataModel(n_jobs=2)
+        metrics = model.train(matrix.features(), matrix.target(), plot=False, shuffled=True)
+        self.assertGreater(min(metrics['cv_scores']), 0.95)
+        self.assertEqual(list(model.model.feature_names_in_), ['A', 'B', 'C'])
+
+    def test_writer_checks_row_count(self):
+        writer = MatrixWriter(os.path.join(self.tmpdir.name, "matrix"), ['A'], 3)
+        writer.write(np.zeros((2, 1)), np.zeros(2))
+        with self.assertRaises(ValueError):
+            writer.close()
+        self.assertFalse(FeatureMatrix.exists(os.path.join(self.tmpdir.name, "matrix")))
+        self.assertEqual(os.listdir(self.tmpdir.name), ["data.parquet"])
+
+    def test_writer_publishes_on_close(self):
+        directory = os.path.join(self.tmpdir.name, "matrix")
+        writer = MatrixWriter(directory, ['A'], 2)
+        writer.write(np.ones((2, 1)), np.zeros(2))
+        # 写完之前目标目录不存在
+        self.assertFalse(os.path.exists(directory))
+        writer.close()
+        self.assertEqual(sorted(os.listdir(directory)), ["X.npy", "matrix.json", "y.npy"])
+
+        # 目录中已有其他文件时逐个替换矩阵文件, 其他文件保留
+        open(os.path.join(directory, "trials.jsonl"), "w").close()
+        writer = MatrixWriter(directory, ['A', 'B'], 3)
+        writer.write(np.ones((3, 2)), np.zeros(3))
+        matrix = writer.close()
+        self.assertEqual(matrix.X.shape, (3, 2))
+        self.assertTrue(os.path.exists(os.path.join(directory, "trials.jsonl")))
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["data.parquet", "matrix"])
+
+    def _preprocess_data(self):
+        output_path = os.path.join(self.tmpdir.name, "processed.parquet")
+        preprocess_data(self.path, output_path)
+        return output_path
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import os
+import sys
+import json
+import logging
+import tempfile
+import subprocess
+from utils import metrics
+from utils.helpers import JsonFormatter
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        metrics.configure(enabled=True, directory=self.tmpdir.name)
+        metrics._registry = metrics.MetricsRegistry()
+
+    def tearDown(self):
+        metrics._registry = metrics.MetricsRegistry()
+        self.tmpdir.cleanup()
+
+    def test_stage_records_time_rows_and_bytes(self):
+        with metrics.stage("read", bytes_read=100) as timer:
+            timer.add(rows=10)
+        reg = metrics.registry()
+        self.assertEqual(reg.get("bigdata_stage_seconds", "_count", stage="read"), 1)
+        self.assertEqual(reg.get("bigdata_stage_rows_total", stage="read"), 10)
+        self.assertEqual(reg.get("bigdata_stage_bytes_read_total", stage="read"), 100)
+        self.assertGreater(reg.get("bigdata_stage_peak_rss_bytes", stage="read"), 0)
+        self.assertGreaterEqual(reg.get("bigdata_process_peak_rss_bytes"),
+                                reg.get("bigdata_stage_peak_rss_bytes", stage="read"))
+
+        with self.assertRaises(ValueError):
+            with metrics.stage("read"):
+                raise ValueError("boom")
+        self.assertEqual(reg.get("bigdata_stage_runs_total", stage="read", status="error"), 1)
+
+    def test_timed_iter_counts_rows(self):
+        items = list(metrics.timed_iter("parse", iter([[1, 2], [3]])))
+        self.assertEqual(items, [[1, 2], [3]])
+        self.assertEqual(metrics.registry().get("bigdata_stage_rows_total", stage="parse"), 3)
+
+    def test_disabled_records_nothing(self):
+        metrics.configure(enabled=False)
+        try:
+            iterable = iter([1])
+            self.assertIs(metrics.timed_iter("parse", iterable), iterable)
+            with metrics.stage("read") as timer:
+                timer.add(rows=5)
+            self.assertEqual(metrics.render(), "\n")
+        finally:
+            metrics.configure(enabled=True)
+
+    def test_render_merges_process_snapshots(self):
+        other = metrics.MetricsRegistry()
+        other.inc("bigdata_jobs_total", 2, name="run_merge", state="succeeded")
+        with open(f"{self.tmpdir.name}/metrics-{os.getppid()}.json", "w") as f:
+            json.dump(other.snapshot(), f)
+        metrics.registry().inc("bigdata_jobs_total", name="run_merge", state="succeeded")
+
+        text = metrics.render()
+        self.assertIn("# TYPE bigdata_jobs_total counter", text)
+        self.assertIn('bigdata_jobs_total{name="run_merge",state="succeeded"} 3', text)
+
+    def test_render_skips_and_removes_snapshots_of_exited_processes(self):
+        other = metrics.MetricsRegistry()
+        other.inc("bigdata_jobs_total", 2, name="run_merge", state="succeeded")
+        path = f"{self.tmpdir.name}/metrics-{2 ** 22 + 1}.json"
+        with open(path, "w") as f:
+            json.dump(other.snapshot(), f)
+
+        self.assertNotIn("bigdata_jobs_total", metrics.render())
+        self.assertFalse(os.path.exists(path))
+
+    def test_json_log_includes_context_and_stage_fields(self):
+        record = logging.LogRecord("bigdata.metrics", logging.INFO, __file__, 1, "stage done", None, None)
+        record.metrics = {"stage": "read", "rows": 10}
+        with metrics.trace(request_id="abc"):
+            entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["stage"], "read")
+        self.assertEqual(entry["message"], "stage done")
+
+    def test_gunicorn_worker_and_jobs_emit_stage_logs(self):
+        # 按 gunicorn 的方式加载: 执行配置文件的 on_starting 钩子, 再导入 app:app, 提交一个后台任务
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = (
+            "import logging, runpy, time\n"
+            f"conf = runpy.run_path({os.path.join(root, 'gunicorn.conf.py')!r})\n"
+            "conf['on_starting'](type('Server', (), {'log': logging.getLogger('gunicorn.error')})())\n"
+            "from app import app, job_queue\n"
+            "from utils import metrics\n"
+            "with metrics.trace(request_id='abc'):\n"
+            "    with metrics.stage('read'):\n"
+            "        pass\n"
+            "    job_id = job_queue.submit('test_jobs:add', 1, 2)\n"
+            "while job_queue.status(job_id)['state'] != 'succeeded':\n"
+            "    time.sleep(0.05)\n"
+            "job_queue.shutdown()\n")
+        env = dict(os.environ, LOG_FORMAT="json", BIGDATA_METRICS="1", BIGDATA_PRELOAD_APP="0",
+                   PYTHONPATH=os.pathsep.join([os.path.join(root, "src"), os.path.join(root, "tests")]))
+        output = subprocess.run([sys.executable, "-c", script], cwd=self.tmpdir.name, env=env,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(output.returncode, 0, output.stderr)
+        entries = [json.loads(line) for line in output.stderr.splitlines() if line.startswith("{")]
+        stages = {entry.get("stage"): entry for entry in entries}
+        self.assertEqual(stages["read"]["request_id"], "abc")
+        self.assertEqual(stages["job.add"]["request_id"], "abc")
+        self.assertIn("job_id", stages["job.add"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,6 +17,20 @@ class TestBigDataModel(unittest.TestCase):
         model.train(self.X, self.y)
         self.assertIsNotNone(model.model)
 
+    def test_train_returns_metrics(self):
+        model = BigDataModel()
+        metrics = model.train(self.X, self.y, plot=False)
+        self.assertEqual(len(metrics['cv_scores']), 5)
+        self.assertIn('auc', metrics)
+        self.assertEqual(set(metrics['timings']), {'fit', 'evaluate', 'cross_validation'})
+
+    def test_fast_train(self):
+        model = BigDataModel(fast=True, n_jobs=2)
+        metrics = model.train(self.X, self.y)
+        self.assertEqual(len(metrics['cv_scores']), 5)
+        self.assertLessEqual(metrics['n_iter'], 100)
+        self.assertEqual(model.model.predict(self.X).shape, (100,))
+
     def test_save_and_load(self):
         model = BigDataModel()
         model.train(self.X, self.y)
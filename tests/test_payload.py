@@ -0,0 +1,46 @@
+import unittest
+import base64
+import gzip
+import json
+import numpy as np
+import plotly.express as px
+from utils.payload import lttb, encode_array, figure_payload, compress
+
+class TestPayload(unittest.TestCase):
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        x = np.arange(10000)
+        y = np.sin(x / 100.0)
+        y[5000] = 10.0
+        keep = lttb(x, y, 500)
+        self.assertEqual(len(keep), 500)
+        self.assertEqual(keep[0], 0)
+        self.assertEqual(keep[-1], 9999)
+        self.assertIn(5000, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_encode_array_round_trip(self):
+        values = np.array([[1.5, 2.5], [3.5, 4.5]])
+        encoded = encode_array(values)
+        self.assertEqual(encoded['dtype'], 'f4')
+        self.assertEqual(encoded['shape'], '2,2')
+        decoded = np.frombuffer(base64.b64decode(encoded['bdata']), dtype=np.float32).reshape(2, 2)
+        np.testing.assert_array_equal(decoded, values)
+        self.assertEqual(encode_array(np.array([1, 2, 300]))['dtype'], 'i2')
+
+    def test_figure_payload_is_bounded(self):
+        x = np.arange(100000)
+        fig = px.line(x=x, y=np.random.rand(len(x)))
+        payload = figure_payload(fig, max_line_points=1000)
+        trace = json.loads(payload)['data'][0]
+        self.assertEqual(len(base64.b64decode(trace['y']['bdata'])), 1000 * 4)
+        self.assertLess(len(payload), len(fig.to_json()) / 20)
+
+    def test_compress(self):
+        body = b'{"a": 1}' * 1000
+        compressed, encoding = compress(body, 'gzip, deflate')
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(gzip.decompress(compressed), body)
+        self.assertEqual(compress(body, None), (body, None))
+
+if __name__ == '__main__':
+    unittest.main()
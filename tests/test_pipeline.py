@@ -0,0 +1,123 @@
+import unittest
+import tempfile
+import os
+from functools import partial
+import numpy as np
+import pandas as pd
+import pipeline
+from data.catalog import Catalog
+from models.model import load_lineage, preprocessor_path
+from utils.cache import ResultCache
+from utils.metrics import trace
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        os.makedirs("data/raw")
+        np.random.seed(0)
+        self.paths = []
+        for year in (2020, 2021):
+            df = pd.DataFrame(np.random.rand(120, 2), columns=['feature1', 'feature2'])
+            df['target'] = (df['feature1'] > 0.5).astype(int)
+            path = f"data/raw/data_{year}.csv"
+            df.to_csv(path, index=False)
+            self.paths.append(path)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_process_is_cached(self):
+        first = pipeline.run_process(self.paths[0], ['feature1', 'feature2'])
+        second = pipeline.run_process(self.paths[0], ['feature1', 'feature2'])
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(first['model_path'], second['model_path'])
+
+    def test_jobs_write_to_separate_paths(self):
+        results = []
+        for job_id in ("job1", "job2"):
+            with trace(job_id=job_id):
+                results.append(pipeline.run_process(self.paths[0], ['feature1', 'feature2'], use_cache=False))
+        self.assertTrue(results[0]['processed_path'].endswith("_job1"))
+        self.assertTrue(results[1]['processed_path'].endswith("_job2"))
+        self.assertNotEqual(results[0]['model_path'], results[1]['model_path'])
+
+    def test_merge_jobs_write_to_separate_paths(self):
+        paths = []
+        for job_id in ("job1", "job2"):
+            with trace(job_id=job_id):
+                paths.append(pipeline.run_merge(self.paths, 'by_variable', key='feature1')['path'])
+        self.assertNotEqual(paths[0], paths[1])
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_preview_trains_on_sample_without_saving(self):
+        result = pipeline.run_process(self.paths[0], ['feature1', 'feature2'], preview=True, sample_size=100)
+        self.assertTrue(result['preview'])
+        self.assertEqual(result['error_bounds']['total_rows'], 120)
+        self.assertEqual(result['error_bounds']['sample_rows'], 100)
+        low, high = result['error_bounds']['model']['accuracy']
+        self.assertLessEqual(low, result['metrics']['accuracy'])
+        self.assertIn('heatmap', result['visualizations'])
+        self.assertFalse(os.path.exists("data/models"))
+
+    def test_screening_selects_features_before_training(self):
+        df = pd.read_csv(self.paths[0])
+        df['constant'] = 1.0
+        df.to_csv(self.paths[0], index=False)
+        result = pipeline.run_process(self.paths[0], [], screen=True, use_cache=False)
+        self.assertNotIn('constant', result['screening']['shortlist'])
+        self.assertEqual(result['screening']['shortlist'][0], 'feature1')
+        self.assertIn('feature_importance', result['visualizations'])
+
+    def test_incremental_training_uses_only_new_files(self):
+        base = pipeline.run_process(self.paths[0], ['feature1', 'feature2'], use_cache=False)
+        result = pipeline.run_incremental(self.paths, n_estimators=10)
+
+        self.assertEqual(result['new_files'], [self.paths[1]])
+        self.assertEqual(result['metrics']['n_rows'], 120)
+        lineage = load_lineage(result['model_path'])
+        self.assertEqual(lineage['parent'], os.path.basename(base['model_path']))
+        self.assertEqual(sorted(lineage['files']), sorted(self.paths))
+        self.assertEqual(lineage['n_rows'], 240)
+
+        # 所有文件都已训练过时不再生成新模型
+        again = pipeline.run_incremental(self.paths, model_name=result['model_path'])
+        self.assertEqual(again['new_files'], [])
+
+    def test_cache_eviction_keeps_models_in_use(self):
+        base = pipeline.run_process(self.paths[0], ['feature1', 'feature2'])
+        pipeline.run_incremental(self.paths, n_estimators=10)
+        keep = partial(pipeline._artifacts_in_use, pipeline.default_catalog)
+        ResultCache("data/cache", max_bytes=0, keep=keep).evict()
+
+        # 增量训练的新模型以缓存的模型为上游, 模型和预处理器保留, 预处理后的矩阵随条目删除
+        self.assertTrue(os.path.exists(base['model_path']))
+        self.assertTrue(os.path.exists(preprocessor_path(base['model_path'])))
+        self.assertFalse(os.path.exists(base['processed_path']))
+        self.assertFalse(pipeline.run_process(self.paths[0], ['feature1', 'feature2'])['cached'])
+
+    def test_jobs_register_in_the_given_catalog(self):
+        catalog = Catalog("data/configured.db")
+        result = pipeline.run_process(self.paths[0], ['feature1', 'feature2'], catalog=catalog)
+        self.assertEqual(catalog.latest_model(self.paths[0]), os.path.normpath(result['model_path']))
+        self.assertIsNone(pipeline.default_catalog.get(result['model_path']))
+
+    def test_tuning_registers_best_model(self):
+        options = dict(n_candidates=3, min_resource=5, max_resource=15, eta=3, max_workers=1)
+        result = pipeline.run_tune(self.paths[0], ['feature1', 'feature2'], **options)
+        self.assertEqual(result['budget'], 15)
+        self.assertEqual(pipeline.default_catalog.latest_model(self.paths[0]), os.path.normpath(result['model_path']))
+        entry = pipeline.default_catalog.get(result['model_path'])
+        self.assertEqual(entry['metadata']['params'], result['best_params'])
+        self.assertEqual(load_lineage(result['model_path'])['n_rows'], 120)
+
+        # 相同设置再次提交时复用预处理结果和已完成的试验
+        again = pipeline.run_tune(self.paths[0], ['feature1', 'feature2'], **options)
+        self.assertEqual(again['resumed_trials'], again['n_trials'])
+        self.assertNotEqual(again['model_path'], result['model_path'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+import pandas as pd
+from data.preview import StratifiedSample, preview_dataset, proportion_interval, model_error_bounds
+
+class TestPreview(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 20000
+        self.df = pd.DataFrame(rng.normal(size=(n, 3)), columns=['A', 'B', 'C'])
+        self.df['B'] += self.df['A']
+        self.df.loc[::9, 'C'] = None
+        # 年份有序且正类稀少, 顺序读取的前若干行无法代表整体
+        self.df['year'] = np.sort(rng.integers(2015, 2020, n))
+        self.df['target'] = (rng.random(n) < 0.05).astype(int)
+
+    def test_stratified_sample_is_proportional(self):
+        sampler = StratifiedSample(1000, stratify=['target', 'year'])
+        for start in range(0, len(self.df), 3000):
+            sampler.update(self.df.iloc[start:start + 3000])
+        sample = sampler.sample()
+        self.assertEqual(len(sample), 1000)
+        self.assertEqual(list(sample.columns), list(self.df.columns))
+        expected = self.df.groupby(['target', 'year']).size() * 1000 / len(self.df)
+        actual = sample.groupby(['target', 'year']).size()
+        # 每层至少 10 行, 其余按层大小成比例; 候选不足的层与比例最多相差几行
+        self.assertTrue(((np.abs(actual - expected) <= 3) | (actual == 10)).all())
+        self.assertEqual(set(sample['year']), set(self.df['year']))
+
+    def test_small_input_is_kept_whole(self):
+        sampler = StratifiedSample(1000, stratify=['target']).update(self.df.head(50))
+        self.assertEqual(len(sampler.sample()), 50)
+
+    def test_summary_matches_exact_statistics(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.parquet")
+            self.df.to_parquet(path, index=False)
+            summary = preview_dataset(path, columns=['A', 'B', 'C'], group_by='year', value_counts=['target'],
+                                      stratify=['target', 'year'], distinct=['year'], sample_size=5000,
+                                      chunksize=4000)
+
+        columns = ['A', 'B', 'C']
+        pd.testing.assert_series_equal(summary.mean, self.df[columns].mean())
+        pd.testing.assert_frame_equal(summary.group_means, self.df.groupby('year')[columns].mean(),
+                                      check_names=False)
+        self.assertEqual(summary.distinct_counts()['year'].round(), 5)
+        quartiles = summary.quantiles([0.25, 0.5, 0.75])
+        np.testing.assert_allclose(quartiles.to_numpy(), self.df[columns].quantile([0.25, 0.5, 0.75]).to_numpy(),
+                                   atol=0.05)
+        stats = summary.box_stats()
+        self.assertTrue((stats['lowerfence'] <= stats['q1']).all())
+
+        low, high = summary.correlation_interval()
+        exact = self.df[columns].corr()
+        self.assertTrue(((low <= exact) & (exact <= high)).to_numpy().all())
+        bounds = summary.error_bounds()
+        self.assertEqual(bounds['total_rows'], 20000)
+        self.assertEqual(bounds['sample_rows'], 5000)
+        self.assertGreater(bounds['correlation_ci_halfwidth'], 0)
+
+    def test_model_error_bounds(self):
+        low, high = proportion_interval(0.9, 1000)
+        self.assertTrue(low < 0.9 < high)
+        self.assertLess(high - low, 0.05)
+        bounds = model_error_bounds({"accuracy": 0.9, "auc": 0.95, "n_test": 1000, "n_test_positive": 300,
+                                     "cv_scores": [0.88, 0.9, 0.91], "cv_mean": 0.8967})
+        self.assertTrue(bounds['auc'][0] < 0.95 < bounds['auc'][1])
+        self.assertIn('cv_mean', bounds)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import pandas as pd
+import numpy as np
+import tempfile
+import os
+from data.reader import read_files, iter_files, sample_schema
+from data.storage import write_dataset
+
+class TestReader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.paths = []
+        for i in range(4):
+            df = pd.DataFrame({
+                'date': pd.date_range(f'{2018 + i}-01-01', periods=50).astype(str),
+                'count': np.arange(50),
+                'value': rng.normal(size=50),
+            })
+            if i == 3:
+                df.loc[10, 'count'] = np.nan
+            path = os.path.join(self.tmpdir.name, f"data_{i}.csv")
+            df.to_csv(path, index=False)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sampled_schema_is_unified(self):
+        schema = sample_schema(self.paths)
+        self.assertEqual(schema['count'], 'float64')
+        self.assertEqual(schema['value'], 'float64')
+        self.assertEqual(schema['date'], 'object')
+
+    def test_parallel_read_matches_pandas(self):
+        for max_workers in (1, 2):
+            dfs = read_files(self.paths, max_workers=max_workers)
+            self.assertEqual(len(dfs), len(self.paths))
+            for path, df in zip(self.paths, dfs):
+                pd.testing.assert_frame_equal(df, pd.read_csv(path), check_dtype=False)
+                self.assertEqual(df['count'].dtype, np.float64)
+
+    def test_memory_limit_streams_large_files(self):
+        parquet_path = os.path.join(self.tmpdir.name, "data.parquet")
+        write_dataset(pd.read_csv(self.paths[0]), parquet_path)
+        paths = self.paths[:2] + [parquet_path]
+        chunks = list(iter_files(paths, max_workers=2, memory_limit=100, chunksize=20))
+        self.assertTrue(all(len(chunk) <= 20 for _, chunk in chunks))
+        self.assertEqual([path for path, _ in chunks][::3], paths)
+        self.assertEqual(sum(len(chunk) for _, chunk in chunks), 150)
+
+if __name__ == '__main__':
+    unittest.main()
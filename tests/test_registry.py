@@ -0,0 +1,78 @@
+import unittest
+import tempfile
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from data.data_preprocessing import preprocess_data
+from models.model import BigDataModel, preprocessor_path
+from models.registry import ModelRegistry, MicroBatcher, PredictionTimeout
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(42)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.raw = pd.DataFrame(np.random.rand(100, 3) * 10, columns=['A', 'B', 'C'])
+        self.raw.loc[[5, 9], 'B'] = None
+        self.raw['target'] = (self.raw['A'] > 5).astype(int)
+        raw_path = os.path.join(self.tmpdir.name, "raw.csv")
+        processed_path = os.path.join(self.tmpdir.name, "processed.parquet")
+        self.raw.to_csv(raw_path, index=False)
+
+        preprocessor = preprocess_data(raw_path, processed_path, ['A', 'B', 'C'])
+        processed = pd.read_parquet(processed_path)
+        self.model = BigDataModel()
+        self.model.model.fit(processed.drop('target', axis=1), processed['target'])
+        self.expected = self.model.model.predict_proba(processed.drop('target', axis=1))[:, 1]
+
+        self.model_dir = os.path.join(self.tmpdir.name, "models")
+        os.makedirs(self.model_dir)
+        self.model_path = os.path.join(self.model_dir, "big_data_model_1.joblib")
+        self.model.save(self.model_path)
+        preprocessor.save(preprocessor_path(self.model_path))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_registry_applies_training_preprocessing(self):
+        registry = ModelRegistry(self.model_dir, max_models=1)
+        self.assertEqual(registry.latest(), "big_data_model_1.joblib")
+        loaded = registry.get()
+        self.assertIs(registry.get("big_data_model_1.joblib"), loaded)
+        np.testing.assert_allclose(loaded.predict_proba(self.raw), self.expected)
+
+    def test_registry_only_loads_listed_models(self):
+        registry = ModelRegistry(self.model_dir)
+        for name in ["big_data_model_1.preprocessor.joblib", "missing.joblib", "../models/raw.csv"]:
+            with self.assertRaises(FileNotFoundError):
+                registry.get(name)
+
+    def test_micro_batcher_splits_results(self):
+        batcher = MicroBatcher(ModelRegistry(self.model_dir), max_delay=0.05)
+        results = {}
+
+        def worker(start):
+            results[start] = batcher.predict_proba(self.raw.iloc[start:start + 25])[1]
+
+        threads = [threading.Thread(target=worker, args=(start,)) for start in range(0, 100, 25)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        np.testing.assert_allclose(np.concatenate([results[s] for s in range(0, 100, 25)]), self.expected)
+
+    def test_micro_batcher_does_not_wait_alone_and_times_out(self):
+        batcher = MicroBatcher(ModelRegistry(self.model_dir), max_delay=5, timeout=0.2)
+        start = time.monotonic()
+        np.testing.assert_allclose(batcher.predict_proba(self.raw)[1], self.expected)
+        self.assertLess(time.monotonic() - start, 2)
+
+        # 批处理线程没有返回结果时请求不会一直挂起
+        stalled = MicroBatcher(ModelRegistry(self.model_dir), timeout=0.2)
+        stalled._run = lambda: None
+        with self.assertRaises(PredictionTimeout):
+            stalled.predict_proba(self.raw)
+
+if __name__ == '__main__':
+    unittest.main()
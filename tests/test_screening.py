@@ -0,0 +1,64 @@
+import unittest
+import tempfile
+import json
+import os
+import numpy as np
+import pandas as pd
+from data.screening import FeatureScreen, screen_features, screen_dataset, shortlist, report_records
+
+class TestFeatureScreen(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 5000
+        self.df = pd.DataFrame(rng.normal(size=(n, 6)), columns=[f'x{i}' for i in range(6)])
+        self.df['copy'] = self.df['x0'] * 2 + rng.normal(size=n) * 0.01
+        self.df['constant'] = 1.0
+        self.df['mostly_zero'] = np.where(rng.random(n) < 0.998, 0.0, 5.0)
+        self.df['sparse'] = self.df['x1'].where(rng.random(n) < 0.2)
+        self.df['target'] = ((self.df['x0'] + 0.5 * self.df['x1'] + rng.normal(size=n) * 0.5) > 0).astype(int)
+
+    def test_prunes_and_ranks(self):
+        report = screen_features(self.df, chunksize=700)
+        status = report['status']
+        self.assertEqual(status['constant'], 'constant')
+        self.assertEqual(status['mostly_zero'], 'near_constant')
+        self.assertEqual(status['sparse'], 'high_null')
+        # x0 与 copy 只保留得分更高的一个
+        self.assertEqual(sorted([status['x0'], status['copy']]), ['kept', 'redundant'])
+        self.assertEqual(shortlist(report)[1], 'x1')
+        self.assertIn(shortlist(report)[0], ('x0', 'copy'))
+        self.assertAlmostEqual(report.loc['sparse', 'null_rate'], self.df['sparse'].isna().mean())
+
+    def test_statistics_match_pandas(self):
+        screen = FeatureScreen(sample_size=1000)
+        for start in range(0, len(self.df), 999):
+            screen.update(self.df.iloc[start:start + 999])
+        expected = self.df[[f'x{i}' for i in range(6)]].corrwith(self.df['target'])
+        np.testing.assert_allclose(screen.target_correlation()[:6], expected.to_numpy())
+        self.assertEqual(len(screen._sample), 1000)
+
+    def test_max_features_and_blocks(self):
+        report = screen_features(self.df, max_features=3, block_size=2)
+        self.assertEqual(len(shortlist(report)), 3)
+        self.assertEqual(list(report['rank'].dropna()), [1.0, 2.0, 3.0])
+        self.assertIn('below_cutoff', set(report['status']))
+
+    def test_excludes_identifier_and_key_columns(self):
+        df = self.df.assign(id=np.arange(len(self.df)), station=np.arange(len(self.df)) % 7)
+        report = screen_features(df, exclude=['station'])
+        self.assertNotIn('id', report.index)
+        self.assertNotIn('station', report.index)
+        self.assertIn('x0', report.index)
+
+    def test_dataset_and_json_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.parquet")
+            self.df.to_parquet(path, index=False)
+            report = screen_dataset(path, columns=['x0', 'x1', 'constant'])
+        self.assertEqual(list(report.index[:2]), ['x0', 'x1'])
+        records = json.loads(json.dumps(report_records(report), allow_nan=False))
+        self.assertEqual(records[-1]['feature'], 'constant')
+        self.assertIsNone(records[-1]['rank'])
+
+if __name__ == '__main__':
+    unittest.main()
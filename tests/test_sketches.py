@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from data.sketches import TDigest, HyperLogLog
+
+class TestTDigest(unittest.TestCase):
+    def test_quantiles_within_rank_error(self):
+        values = np.random.default_rng(0).lognormal(size=200000)
+        digest = TDigest(compression=100)
+        for chunk in np.array_split(values, 7):
+            digest.update(chunk)
+        q = np.array([0.01, 0.25, 0.5, 0.75, 0.99])
+        ranks = np.searchsorted(np.sort(values), digest.quantile(q)) / len(values)
+        self.assertTrue(np.all(np.abs(ranks - q) <= digest.rank_error(q)))
+        self.assertLessEqual(digest.centroids, 100)
+        self.assertEqual(digest.quantile(0.0), values.min())
+        self.assertEqual(digest.quantile(1.0), values.max())
+
+    def test_merge_and_missing_values(self):
+        values = np.random.default_rng(1).normal(size=20000)
+        left = TDigest().update(values[:10000])
+        right = TDigest().update(np.append(values[10000:], np.nan))
+        left.merge(right)
+        self.assertEqual(left.count, 20000)
+        self.assertAlmostEqual(left.quantile(0.5), np.median(values), delta=0.02)
+        self.assertTrue(np.isnan(TDigest().quantile(0.5)))
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_count_within_error(self):
+        values = np.random.default_rng(2).integers(0, 10 ** 6, 300000)
+        sketch = HyperLogLog(precision=12)
+        for chunk in np.array_split(values, 3):
+            sketch.update(chunk)
+        exact = len(np.unique(values))
+        self.assertLess(abs(sketch.count() - exact) / exact, 4 * sketch.relative_error)
+
+    def test_small_counts_strings_and_merge(self):
+        left = HyperLogLog().update(['a', 'b', 'a', None])
+        right = HyperLogLog().update(['b', 'c'])
+        self.assertAlmostEqual(left.count(), 2, delta=0.1)
+        self.assertAlmostEqual(left.merge(right).count(), 3, delta=0.1)
+        with self.assertRaises(ValueError):
+            left.merge(HyperLogLog(precision=10))
+
+if __name__ == '__main__':
+    unittest.main()
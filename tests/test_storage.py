@@ -0,0 +1,71 @@
+import unittest
+import pandas as pd
+import numpy as np
+import tempfile
+import os
+import pyarrow as pa
+from src.data.storage import (read_dataset, read_columns, iter_dataset, write_dataset, DatasetWriter, convert_dataset,
+                            read_arrow_schema, unify_schemas)
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'id': np.arange(10),
+            'feature1': np.linspace(0, 1, 10),
+            'name': list('abcdefghij')
+        })
+
+    def test_round_trip_keeps_dtypes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for ext in ('parquet', 'feather', 'csv'):
+                path = os.path.join(tmpdir, f"data.{ext}")
+                write_dataset(self.df, path)
+                pd.testing.assert_frame_equal(read_dataset(path), self.df, check_dtype=(ext != 'csv'))
+
+    def test_column_pruning(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.parquet")
+            write_dataset(self.df, path)
+            self.assertEqual(read_columns(path), ['id', 'feature1', 'name'])
+            loaded = read_dataset(path, columns=['feature1'])
+            self.assertEqual(list(loaded.columns), ['feature1'])
+
+    def test_chunked_write_and_read(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.parquet")
+            with DatasetWriter(path) as writer:
+                writer.write(self.df.iloc[:4])
+                writer.write(self.df.iloc[4:])
+            chunks = list(iter_dataset(path, chunksize=3))
+            self.assertTrue(all(len(c) <= 3 for c in chunks))
+            pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), self.df)
+
+    def test_convert_csv(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_path = os.path.join(tmpdir, "data.csv")
+            self.df.to_csv(csv_path, index=False)
+            path = convert_dataset(csv_path, os.path.join(tmpdir, "data.feather"), chunksize=4)
+            pd.testing.assert_frame_equal(read_dataset(path), self.df, check_dtype=False)
+
+    def test_writer_fills_missing_columns_with_unified_types(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            numbers, names = os.path.join(tmpdir, "numbers.parquet"), os.path.join(tmpdir, "names.csv")
+            write_dataset(self.df[['id', 'feature1']], numbers)
+            self.df[['name', 'id']].assign(id=self.df['id'] + 0.5).to_csv(names, index=False)
+            schema = unify_schemas([read_arrow_schema(numbers), read_arrow_schema(names)])
+            self.assertEqual(schema.names, ['id', 'feature1', 'name'])
+            self.assertEqual(schema.field('id').type, pa.float64())
+            self.assertTrue(pa.types.is_string(schema.field('name').type)
+                            or pa.types.is_large_string(schema.field('name').type))
+
+            # 第一块中没有 name 列, 后面的块有字符串值
+            path = os.path.join(tmpdir, "merged.parquet")
+            with DatasetWriter(path, schema) as writer:
+                writer.write(self.df[['id', 'feature1']].head(3))
+                writer.write(self.df[['name']].head(2))
+            merged = read_dataset(path)
+            self.assertEqual(merged['name'].tolist()[3:], ['a', 'b'])
+            self.assertEqual(merged['feature1'].isna().sum(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
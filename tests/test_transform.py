@@ -0,0 +1,46 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+from data.transform import Preprocessor
+
+class TestPreprocessor(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.df = pd.DataFrame(np.random.rand(60, 3) * 5, columns=['A', 'B', 'C'])
+        self.df.loc[[1, 7, 30], 'A'] = None
+        self.df.loc[[12], 'C'] = None
+        self.df['D'] = 2.0
+
+    def test_matches_sklearn(self):
+        preprocessor = Preprocessor(self.df.columns).partial_fit(self.df)
+        expected = StandardScaler().fit_transform(SimpleImputer(strategy='mean').fit_transform(self.df))
+        np.testing.assert_allclose(preprocessor.transform(self.df).to_numpy(), expected, atol=1e-12)
+
+    def test_partial_fit_matches_full_fit(self):
+        full = Preprocessor(self.df.columns).partial_fit(self.df)
+        incremental = Preprocessor(self.df.columns)
+        for start in range(0, 60, 13):
+            incremental.partial_fit(self.df.iloc[start:start + 13])
+        np.testing.assert_allclose(incremental.mean, full.mean)
+        np.testing.assert_allclose(incremental.scale, full.scale)
+        self.assertEqual(incremental.revision, 5)
+
+    def test_save_load_and_transform_array(self):
+        preprocessor = Preprocessor(self.df.columns).partial_fit(self.df)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "model.preprocessor.joblib")
+            preprocessor.save(path)
+            loaded = Preprocessor.load(path)
+
+        values = self.df.to_numpy()
+        transformed = loaded.transform_array(values)
+        self.assertTrue(np.isnan(values).any())
+        np.testing.assert_allclose(transformed, preprocessor.transform(self.df).to_numpy())
+        self.assertEqual(loaded.revision, 1)
+
+if __name__ == '__main__':
+    unittest.main()
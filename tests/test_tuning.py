@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+import json
+import os
+import numpy as np
+import pandas as pd
+from data.data_preprocessing import preprocess_to_matrix
+from models.tuning import halving_schedule, successive_halving, fit_best
+
+class Interrupted(Exception):
+    pass
+
+class TestTuning(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 400
+        self.df = pd.DataFrame(rng.normal(size=(n, 4)), columns=['A', 'B', 'C', 'D'])
+        self.df['target'] = (self.df['A'] - self.df['B'] + rng.normal(size=n) * 0.5 > 0).astype(int)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        path = os.path.join(self.dir, "data.parquet")
+        self.df.to_parquet(path, index=False)
+        self.dir = os.path.join(self.dir, "matrix")
+        preprocess_to_matrix(path, self.dir, chunksize=150)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_halving_schedule(self):
+        self.assertEqual(halving_schedule(27, 10, 270, 3), [(27, 10), (9, 30), (3, 90), (1, 270)])
+        # 候选不够时提前结束, 最后一轮仍用满资源
+        self.assertEqual(halving_schedule(4, 10, 270, 3), [(4, 10), (1, 270)])
+
+    def test_search_resumes_after_interruption(self):
+        options = dict(n_candidates=4, min_resource=5, max_resource=20, eta=2, max_workers=2)
+
+        def interrupt(fraction, message):
+            if fraction >= 0.5:
+                raise Interrupted(message)
+
+        with self.assertRaises(Interrupted):
+            successive_halving(self.dir, progress=interrupt, **options)
+        with open(os.path.join(self.dir, "trials.jsonl")) as f:
+            completed = len(f.readlines())
+        self.assertGreaterEqual(completed, 4)
+
+        result = successive_halving(self.dir, **options)
+        self.assertEqual(result['n_trials'], 4 + 2 + 1)
+        self.assertEqual(result['resumed_trials'], completed)
+        self.assertEqual(result['budget'], 20)
+        self.assertEqual([r['budget'] for r in result['rounds']], [5, 10, 20])
+        self.assertEqual(result['rounds'][-1]['configs'], result['rounds'][-2]['configs'][:1])
+        self.assertGreater(result['best_score'], 0.8)
+        json.dumps(result)
+
+        # 全部完成后再次调用不再训练
+        again = successive_halving(self.dir, **options)
+        self.assertEqual(again['resumed_trials'], again['n_trials'])
+        self.assertEqual(again['best_params'], result['best_params'])
+
+        model = fit_best(self.dir, result['best_params'], result['budget'])
+        self.assertEqual(model.model.n_estimators, 20)
+        self.assertEqual(model.model.predict(self.df[['A', 'B', 'C', 'D']]).shape, (400,))
+
+if __name__ == '__main__':
+    unittest.main()